@@ -191,6 +191,56 @@ export const api = {
     }
   },
 
+  // Approve, reject or defer individual invoices at a gate
+  async approveInvoices(
+    gate: 'vendor' | 'po',
+    decisions: { key: string; status: 'approved' | 'rejected' | 'deferred'; data?: any }[]
+  ): Promise<{ success: boolean; counts?: Record<string, number>; message?: string }> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/approve-invoices`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ gate, decisions }),
+      });
+
+      const result = await response.json();
+
+      if (!response.ok) {
+        throw new Error(result.message || 'Failed to record invoice approvals');
+      }
+
+      return result;
+    } catch (error) {
+      console.error('Approve invoices error:', error);
+      return {
+        success: false,
+        message: error instanceof Error ? error.message : 'Failed to record invoice approvals'
+      };
+    }
+  },
+
+  // Live count of invoices waiting at each approval gate
+  async getApprovalQueue(): Promise<{ success: boolean; gates?: Record<string, { createdAt: string; counts: Record<string, number>; waiting: string[] }>; message?: string }> {
+    try {
+      const response = await fetch(`${API_BASE_URL}/approval-queue`);
+      const result = await response.json();
+
+      if (!response.ok) {
+        throw new Error(result.message || 'Failed to read approval queue');
+      }
+
+      return result;
+    } catch (error) {
+      console.error('Approval queue error:', error);
+      return {
+        success: false,
+        message: error instanceof Error ? error.message : 'Failed to read approval queue'
+      };
+    }
+  },
+
   // Check processing status
   async checkProcessingStatus(): Promise<{ success: boolean; isProcessingComplete?: boolean; isStillRunning?: boolean; message?: string }> {
     try {
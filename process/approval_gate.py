@@ -0,0 +1,145 @@
+# Approval Gates for Invoice Processing Pipeline
+# This file lets the pipeline wait for a human approval without polling every second.
+# server.js POSTs to a local endpoint as soon as it writes an approval, which wakes the
+# waiting gate immediately; the approval files are still checked as a fallback.
+
+import os
+import time
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+APPROVAL_GATE_CONFIG = {
+    "host": "127.0.0.1",
+    "port": int(os.environ.get("APPROVAL_NOTIFY_PORT", "8765")),
+    "fallback_poll_seconds": 5.0,      # file check interval while the notify endpoint is listening
+    "no_notify_poll_seconds": 1.0,     # file check interval when the endpoint could not start
+    "progress_seconds": 30,
+    "heartbeat_seconds": 60,           # server.js hides approvals whose CSV is older than 5 minutes
+}
+
+_gate_events = {}
+_gate_lock = threading.Lock()
+_notify_server = None
+
+def _gate_event(gate):
+    with _gate_lock:
+        return _gate_events.setdefault(gate, threading.Event())
+
+def notify_gate(gate):
+    """Wake anything waiting on a gate (called by the HTTP endpoint, or directly in-process)"""
+    _gate_event(gate).set()
+
+class _NotifyHandler(BaseHTTPRequestHandler):
+    """POST /notify/<gate> wakes the named gate"""
+
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "notify" and parts[1]:
+            notify_gate(parts[1])
+            self.send_response(204)
+        else:
+            self.send_response(404)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def start_notify_server():
+    """Start the local approval endpoint once per process; returns True if it is listening"""
+    global _notify_server
+    if _notify_server is not None:
+        return True
+    try:
+        _notify_server = ThreadingHTTPServer(
+            (APPROVAL_GATE_CONFIG["host"], APPROVAL_GATE_CONFIG["port"]), _NotifyHandler
+        )
+    except OSError as e:
+        print(f"WARNING: Approval notify endpoint unavailable ({e}); falling back to file polling")
+        return False
+    threading.Thread(target=_notify_server.serve_forever, name="approval-notify", daemon=True).start()
+    print(f"SUCCESS: Approval notify endpoint listening on "
+          f"http://{APPROVAL_GATE_CONFIG['host']}:{APPROVAL_GATE_CONFIG['port']}/notify/<gate>")
+    return True
+
+def _touch(paths):
+    for path in paths:
+        try:
+            if os.path.exists(path):
+                os.utime(path, None)
+        except OSError as e:
+            print(f"WARNING: Could not refresh {path}: {e}")
+
+def wait_for_gate(gate, check, timeout=None, description=None, heartbeat_paths=None):
+    """
+    Block until check() returns a truthy value and return it.
+    Wakes immediately on a notification for this gate; otherwise re-checks the
+    approval files on a fallback interval. Returns None if timeout (seconds) expires.
+    heartbeat_paths are touched periodically so the review UI keeps treating them as current.
+    """
+    listening = start_notify_server()
+    poll_seconds = APPROVAL_GATE_CONFIG["fallback_poll_seconds" if listening else "no_notify_poll_seconds"]
+    event = _gate_event(gate)
+    description = description or f"{gate} approval"
+
+    start_time = time.time()
+    last_progress = start_time
+    last_heartbeat = start_time
+    while True:
+        # Clear before checking so a notification arriving mid-check is not lost
+        event.clear()
+        try:
+            result = check()
+            if result:
+                return result
+        except Exception as e:
+            print(f"Error checking {description} status: {e}")
+
+        now = time.time()
+        if timeout is not None and now - start_time > timeout:
+            return None
+        if now - last_progress >= APPROVAL_GATE_CONFIG["progress_seconds"]:
+            print(f"INFO: Still waiting for {description}... ({int(now - start_time)} seconds elapsed)")
+            last_progress = now
+        if heartbeat_paths and now - last_heartbeat >= APPROVAL_GATE_CONFIG["heartbeat_seconds"]:
+            _touch(heartbeat_paths)
+            last_heartbeat = now
+
+        wait_seconds = poll_seconds
+        if timeout is not None:
+            wait_seconds = max(0.0, min(wait_seconds, timeout - (now - start_time)))
+        event.wait(wait_seconds)
+
+def run_in_background(wait, name="approval-wait"):
+    """
+    Run a blocking approval wait on a daemon thread and return a Future for its result.
+    Unlike a ThreadPoolExecutor worker, the thread does not keep the process alive if the
+    pipeline fails while the review is still open.
+    """
+    future = Future()
+
+    def runner():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(wait())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=runner, name=name, daemon=True).start()
+    return future
+
+def queue_batches(approved_queue):
+    """
+    Yield lists of the items waiting on approved_queue, blocking only when it is empty,
+    until the None sentinel arrives. Approvals made while a batch is processed come out together.
+    """
+    while True:
+        batch = [approved_queue.get()]
+        while batch[-1] is not None and not approved_queue.empty():
+            batch.append(approved_queue.get_nowait())
+        if batch[-1] is None:
+            if batch[:-1]:
+                yield batch[:-1]
+            return
+        yield batch
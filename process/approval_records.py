@@ -0,0 +1,142 @@
+# Per-Invoice Approval Records for Invoice Processing Pipeline
+# This file keeps one approval record per invoice and gate, so approved invoices can
+# move on while others are still under review. server.js writes the decisions
+# (see /api/approve-invoices) and the pipeline streams them as they arrive.
+#
+# Record file (outputs/excel_files/approvals/<gate>.json):
+#   {"gate": "vendor", "created_at": "...", "records": {"<key>": {"status": "pending", "data": {...}, "updated_at": "..."}}}
+
+import os
+import json
+import time
+from datetime import datetime
+
+from approval_gate import wait_for_gate
+
+APPROVAL_RECORDS_CONFIG = {
+    "records_folder": "outputs/excel_files/approvals",
+}
+
+PENDING = "pending"
+APPROVED = "approved"
+REJECTED = "rejected"
+DEFERRED = "deferred"      # held back by the reviewer; left for the next run
+DECIDED_STATUSES = (APPROVED, REJECTED, DEFERRED)
+
+def records_path(gate, records_folder=None):
+    return os.path.join(records_folder or APPROVAL_RECORDS_CONFIG["records_folder"], f"{gate}.json")
+
+def _write_records(path, payload):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+def init_records(gate, keys, data=None, records_folder=None):
+    """Start a gate with a pending record per invoice key; data optionally maps key -> proposed values"""
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    payload = {
+        "gate": gate,
+        "created_at": now,
+        "records": {
+            str(key): {"status": PENDING, "data": (data or {}).get(key, {}), "updated_at": now}
+            for key in keys
+        },
+    }
+    _write_records(records_path(gate, records_folder), payload)
+    return payload["records"]
+
+def load_records(gate, records_folder=None):
+    """Return key -> record for a gate; a missing or half-written file reads as no records"""
+    path = records_path(gate, records_folder)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("records", {})
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Could not read approval records {path}: {e}")
+        return {}
+
+def record_decisions(gate, decisions, records_folder=None):
+    """
+    Apply decisions (key -> status, or key -> {"status", "data"}) to a gate's records.
+    The pipeline normally only reads decisions; this is the Python side of what server.js writes.
+    """
+    path = records_path(gate, records_folder)
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for key, decision in decisions.items():
+        if isinstance(decision, str):
+            decision = {"status": decision}
+        record = payload["records"].setdefault(str(key), {"data": {}})
+        record["status"] = decision["status"]
+        if decision.get("data"):
+            record["data"] = decision["data"]
+        record["updated_at"] = now
+    _write_records(path, payload)
+
+def status_counts(records):
+    counts = {PENDING: 0, APPROVED: 0, REJECTED: 0, DEFERRED: 0}
+    for record in records.values():
+        counts[record.get("status", PENDING)] = counts.get(record.get("status", PENDING), 0) + 1
+    return counts
+
+def gate_counts(records_folder=None):
+    """Live count of invoices per status at every gate that has records"""
+    records_folder = records_folder or APPROVAL_RECORDS_CONFIG["records_folder"]
+    if not os.path.isdir(records_folder):
+        return {}
+    return {
+        os.path.splitext(name)[0]: status_counts(load_records(os.path.splitext(name)[0], records_folder))
+        for name in sorted(os.listdir(records_folder))
+        if name.endswith(".json")
+    }
+
+def stream_decisions(gate, timeout=None, description=None, heartbeat_paths=None, records_folder=None):
+    """
+    Yield (key, record) for each invoice as soon as it is decided, and stop once none are pending.
+    Waits on the approval gate between changes, so a decision written by server.js is picked up
+    immediately. On timeout the remaining invoices are left pending and the generator stops.
+    """
+    description = description or f"{gate} approvals"
+    seen = set()
+    last_pending = None
+    start_time = time.time()
+
+    while True:
+        records = load_records(gate, records_folder)
+        for key, record in records.items():
+            if key not in seen and record.get("status") in DECIDED_STATUSES:
+                seen.add(key)
+                yield key, record
+
+        pending = sum(1 for record in records.values() if record.get("status") not in DECIDED_STATUSES)
+        if pending == 0:
+            return
+        if pending != last_pending:
+            print(f"INFO: {pending} invoice(s) waiting at the {gate} gate")
+            last_pending = pending
+
+        def changed():
+            current = load_records(gate, records_folder)
+            return any(
+                key not in seen and record.get("status") in DECIDED_STATUSES
+                for key, record in current.items()
+            ) or not any(record.get("status") not in DECIDED_STATUSES for record in current.values())
+
+        remaining = None if timeout is None else max(0.0, timeout - (time.time() - start_time))
+        if not wait_for_gate(gate, changed, timeout=remaining, description=description,
+                             heartbeat_paths=heartbeat_paths):
+            print(f"WARNING: Timed out with {pending} invoice(s) still waiting at the {gate} gate")
+            return
+
+if __name__ == "__main__":
+    print("=== Approval Queue ===")
+    counts = gate_counts()
+    if not counts:
+        print("INFO: No approval records found")
+    for gate, gate_status in counts.items():
+        print(f"INFO: {gate}: " + ", ".join(f"{status} {count}" for status, count in gate_status.items()))
@@ -0,0 +1,75 @@
+# Directory Listing Cache for Invoice Processing Pipeline
+# This file caches directory listings of network folders and preview_storage, so each
+# directory is listed once per stage rather than once per invoice. Entries expire after
+# a per-path TTL, and code that renames or copies files into a folder invalidates it.
+
+import os
+import time
+import threading
+
+DIR_LISTING_CONFIG = {
+    "default_ttl_seconds": 300.0,
+    "ttl_seconds": {},              # normalized folder path -> TTL override
+}
+
+_cache = {}                         # (kind, normalized path) -> (expires_at, listing)
+_lock = threading.Lock()
+_stats = {"listings": 0, "hits": 0, "invalidations": 0}
+
+def _key(path):
+    return os.path.normcase(os.path.normpath(os.path.abspath(path)))
+
+def _ttl(path, ttl):
+    if ttl is not None:
+        return ttl
+    return DIR_LISTING_CONFIG["ttl_seconds"].get(_key(path), DIR_LISTING_CONFIG["default_ttl_seconds"])
+
+def _cached(kind, path, ttl, fetch):
+    key = (kind, _key(path))
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] > now:
+            _stats["hits"] += 1
+            return entry[1]
+    listing = fetch(path)
+    with _lock:
+        _stats["listings"] += 1
+        _cache[key] = (now + _ttl(path, ttl), listing)
+    return listing
+
+def list_dir(path, ttl=None):
+    """os.listdir(path) served from the cache while fresh; returns a new list the caller may change"""
+    return list(_cached("names", path, ttl, os.listdir))
+
+def _scan(path):
+    with os.scandir(path) as entries:
+        return {
+            entry.name: (entry.stat().st_size, int(entry.stat().st_mtime))
+            for entry in entries
+            if entry.is_file()
+        }
+
+def scan_dir(path, ttl=None):
+    """File name -> (size, mtime) for path, from one os.scandir served from the cache while fresh"""
+    return dict(_cached("stats", path, ttl, _scan))
+
+def invalidate(path=None):
+    """Forget the cached listing of path (after a rename, copy or delete there), or of every path"""
+    with _lock:
+        _stats["invalidations"] += 1
+        if path is None:
+            _cache.clear()
+            return
+        key = _key(path)
+        for kind in ("names", "stats"):
+            _cache.pop((kind, key), None)
+
+def listing_stats():
+    with _lock:
+        return dict(_stats)
+
+def report_listing_stats(label="Directory listings"):
+    stats = listing_stats()
+    print(f"INFO: {label}: {stats['listings']} listing call(s), {stats['hits']} served from cache, "
+          f"{stats['invalidations']} invalidation(s)")
@@ -0,0 +1,263 @@
+# GL Enrichment for Invoice Processing Pipeline
+# This file sets the Distribution GL account (and Phase_Code / Cost_Type) on approved
+# invoice JSONs. The vendor list and the PO results are indexed once, by Vendor_Code and
+# by file name; each batch of approved invoices is then joined against both tables and
+# the GL rules are applied to the whole batch at once, so the cost per invoice does not
+# grow with the size of the vendor list or of the PO results.
+
+import os
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+GL_ENRICHMENT_CONFIG = {
+    "shop_remarks": {"shop", "stock", "shop stock", "shop fab", "shop sab"},
+    "shop_gl_account": "1200",
+}
+
+_timings = []       # seconds per invoice, the batch time shared by its invoices
+
+def _gl_text(value):
+    """GL code as written to the JSON ("5000.0" -> "5000"), or None when it is not a number"""
+    try:
+        return str(int(float(value)))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+GL_COLUMNS = ["gl_normal", "gl_wo", "gl_normal_text", "gl_wo_text"]
+
+def vendor_gl_table(vendor_df):
+    """
+    The vendor list indexed by Vendor_Code (first row of each code) with its two GL codes added,
+    stripped (gl_normal, gl_wo) and as written to the JSON (gl_normal_text, gl_wo_text)
+    """
+    vendors = vendor_df.drop_duplicates("Vendor_Code").set_index("Vendor_Code")
+    for column, name in [("Distribution_GL_Account", "gl_normal"), ("WO_GL_Codes", "gl_wo")]:
+        values = vendors[column] if column in vendors.columns else pd.Series("", index=vendors.index)
+        vendors[name] = values.map(str).str.strip()
+        vendors[f"{name}_text"] = vendors[name].map(_gl_text)
+    return vendors
+
+def po_flag_table(pixtral_df):
+    """file_base -> PO/job, WO/remark and shop-remark flags, from the first row of each file"""
+    rows = pixtral_df.drop_duplicates("file_base").set_index("file_base")
+
+    def present(column):
+        return rows[column].notna() if column in rows.columns else pd.Series(False, index=rows.index)
+
+    remarks = rows["Remarks"].map(str).str.strip().str.lower() if "Remarks" in rows.columns else pd.Series("", index=rows.index)
+    return pd.DataFrame({
+        "has_po_or_job": present("PO_Number") | present("Job_Number"),
+        "has_wo_or_remark": present("WO_Number") | present("Remarks"),
+        "shop_remark": remarks.isin(GL_ENRICHMENT_CONFIG["shop_remarks"]),
+    }, index=rows.index)
+
+def assign_gl(joined):
+    """
+    GL decision for every row of a frame joined from vendor_gl_table and po_flag_table.
+    Returns a frame with decided (a rule applied), gl_account (missing when the chosen GL code is
+    not a number) and set_phase (Phase_Code and Cost_Type are copied from the vendor).
+    A vendor with only one GL code always gets it; with both (or neither), Rule 1 (shop/stock
+    remarks -> 1200) comes first, then PO/job -> normal GL with phase and cost type,
+    then WO/remark -> WO GL.
+    """
+    has_normal = joined["gl_normal"] != ""
+    has_wo = joined["gl_wo"] != ""
+    conditions = [
+        has_normal & ~has_wo,
+        has_wo & ~has_normal,
+        joined["shop_remark"],
+        joined["has_po_or_job"],
+        joined["has_wo_or_remark"],
+    ]
+    conditions = [c.to_numpy(dtype=bool) for c in conditions]
+    normal, wo = joined["gl_normal_text"].to_numpy(dtype=object), joined["gl_wo_text"].to_numpy(dtype=object)
+    shop = np.full(len(joined), GL_ENRICHMENT_CONFIG["shop_gl_account"], dtype=object)
+    return pd.DataFrame({
+        "decided": np.logical_or.reduce(conditions),
+        # object dtype: pandas 3 would infer a str column and turn the missing codes into NaN
+        "gl_account": pd.Series(np.select(conditions, [normal, wo, shop, normal, wo], default=None),
+                                index=joined.index, dtype=object),
+        "set_phase": ~conditions[0] & ~conditions[1] & ~conditions[2] & conditions[3],
+    }, index=joined.index)
+
+def enrich_invoices(files, vendor_table, po_table, json_folder="data/processed"):
+    """
+    Enrich a batch of invoice JSONs (file names in json_folder) and return how many were written.
+    Invoices with no Vendor_Code, an unknown vendor, no PO results row or a GL code that is not
+    a number are reported and skipped.
+    """
+    if not files:
+        return 0
+    start = time.perf_counter()
+
+    records = {}
+    for file in files:
+        with open(os.path.join(json_folder, file), "r", encoding="utf-8") as f:
+            records[file] = json.load(f)
+    batch = pd.DataFrame({
+        "file": list(records),
+        "file_base": [os.path.splitext(file)[0] for file in records],
+        "Vendor_Code": [str(data.get("Vendor_Code", "")).strip() for data in records.values()],
+    })
+    batch["has_vendor"] = batch["Vendor_Code"].isin(vendor_table.index)
+    batch["has_po_row"] = batch["file_base"].isin(po_table.index)
+    usable = (batch["Vendor_Code"] != "") & batch["has_vendor"] & batch["has_po_row"]
+    joined = batch[usable].join(vendor_table[GL_COLUMNS], on="Vendor_Code").join(po_table, on="file_base")
+    decisions = assign_gl(joined)
+
+    written = 0
+    for i, row in batch.iterrows():
+        file = row["file"]
+        if row["Vendor_Code"] == "":
+            print(f"ERROR: Skipping {file} — Vendor_Code missing")
+            continue
+        if not row["has_vendor"]:
+            print(f"ERROR: Skipping {file} — Vendor_Code not found in Vendor_List")
+            continue
+        if not row["has_po_row"]:
+            print(f"ERROR: Skipping {file} — Not found in pixtral_po_results.csv")
+            continue
+        data = records[file]
+        decision = decisions.loc[i]
+        if decision["decided"]:
+            if pd.isna(decision["gl_account"]):
+                print(f"ERROR: Skipping {file} — GL code for vendor {row['Vendor_Code']} is not a number")
+                continue
+            data["Distribution_GL_Account"] = decision["gl_account"]
+            if decision["set_phase"]:
+                # The whole vendor row, as the GL step always read it, so values keep their types
+                vendor_info = vendor_table.loc[row["Vendor_Code"]]
+                data["Phase_Code"] = vendor_info.get("Phase_Code", "")
+                data["Cost_Type"] = vendor_info.get("Cost_Type", "")
+        with open(os.path.join(json_folder, file), "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        print(f"SUCCESS: Enriched {file}")
+        written += 1
+
+    _timings.extend([(time.perf_counter() - start) / len(files)] * len(files))
+    return written
+
+def report_gl_timing():
+    if not _timings:
+        return
+    timings = np.array(_timings) * 1000
+    print(f"INFO: GL enrichment: {len(timings)} invoice(s), {timings.mean():.2f} ms per invoice "
+          f"(p95 {np.percentile(timings, 95):.2f} ms, max {timings.max():.2f} ms)")
+
+def _enrich_by_masks(file, vendor_df, pixtral_df, json_folder):
+    """The former per-invoice form (two boolean masks per file), kept for the benchmark"""
+    with open(os.path.join(json_folder, file), "r", encoding="utf-8") as f:
+        data = json.load(f)
+    vendor_row = vendor_df[vendor_df["Vendor_Code"] == str(data.get("Vendor_Code", "")).strip()]
+    pixtral_row = pixtral_df[pixtral_df["file_base"] == os.path.splitext(file)[0]]
+    if vendor_row.empty or pixtral_row.empty:
+        return
+    vendor_info, pixtral_row = vendor_row.iloc[0], pixtral_row.iloc[0]
+    gl_normal = str(vendor_info.get("Distribution_GL_Account", "")).strip()
+    gl_wo = str(vendor_info.get("WO_GL_Codes", "")).strip()
+    has_po_or_job = pd.notna(pixtral_row.get("PO_Number")) or pd.notna(pixtral_row.get("Job_Number"))
+    has_wo_or_remark = pd.notna(pixtral_row.get("WO_Number")) or pd.notna(pixtral_row.get("Remarks"))
+    remarks = str(pixtral_row.get("Remarks", "")).strip().lower()
+    # The former form raised on a GL code that is not a number; the JSON stayed as it was
+    try:
+        _apply_rules_by_row(data, vendor_info, gl_normal, gl_wo, remarks, has_po_or_job, has_wo_or_remark)
+    except ValueError:
+        return
+    with open(os.path.join(json_folder, file), "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+def _apply_rules_by_row(data, vendor_info, gl_normal, gl_wo, remarks, has_po_or_job, has_wo_or_remark):
+    if gl_normal and not gl_wo:
+        data["Distribution_GL_Account"] = str(int(float(gl_normal)))
+    elif gl_wo and not gl_normal:
+        data["Distribution_GL_Account"] = str(int(float(gl_wo)))
+    elif remarks in GL_ENRICHMENT_CONFIG["shop_remarks"]:
+        data["Distribution_GL_Account"] = GL_ENRICHMENT_CONFIG["shop_gl_account"]
+    elif has_po_or_job:
+        data["Distribution_GL_Account"] = str(int(float(gl_normal)))
+        data["Phase_Code"] = vendor_info.get("Phase_Code", "")
+        data["Cost_Type"] = vendor_info.get("Cost_Type", "")
+    elif has_wo_or_remark:
+        data["Distribution_GL_Account"] = str(int(float(gl_wo)))
+
+def _reject_constant(name):
+    raise ValueError(f"{name} is not valid JSON")
+
+def benchmark_enrichment(invoices=2000, vendors=3000, po_rows=20000, seed=0):
+    """
+    Enrich synthetic invoice JSONs with the former per-file masks and with the keyed join,
+    in two temporary folders, and check the written JSONs are identical and valid JSON
+    (vendors with a GL code that is not a number must leave their invoices unwritten)
+    """
+    import io
+    import random
+    import shutil
+    import tempfile
+    import contextlib
+
+    rng = random.Random(seed)
+    # One or both GL codes per vendor (with neither, the former form raised on PO/WO invoices)
+    gl_pairs = [rng.choice([("5000", ""), ("", "6100"), ("5010.0", "6100"), ("5000", "6100.0"), ("N/A", ""), ("5000", "TBD")])
+                for _ in range(vendors)]
+    vendor_df = pd.DataFrame({
+        "Vendor_Code": [f"V{i:05d}" for i in range(vendors)],
+        "Distribution_GL_Account": [normal for normal, _ in gl_pairs],
+        "WO_GL_Codes": [wo for _, wo in gl_pairs],
+        "Phase_Code": [rng.choice(["01-100", "02-200", ""]) for _ in range(vendors)],
+        "Cost_Type": [rng.choice(["M", "S", ""]) for _ in range(vendors)],
+    })
+    maybe = lambda value: value if rng.random() < 0.4 else None
+    pixtral_df = pd.DataFrame({
+        "file_name": [f"inv_{i}.pdf" for i in range(po_rows)],
+        "PO_Number": [maybe("1234") for _ in range(po_rows)],
+        "Job_Number": [maybe("24.60") for _ in range(po_rows)],
+        "WO_Number": [maybe("12345") for _ in range(po_rows)],
+        "Remarks": [maybe(rng.choice(["Shop", "stock ", "Joey", "shop fab"])) for _ in range(po_rows)],
+    })
+    pixtral_df["file_base"] = pixtral_df["file_name"].map(lambda x: os.path.splitext(x)[0])
+
+    folders = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+    files = [f"inv_{rng.randrange(po_rows + 100)}.json" for _ in range(invoices)]
+    files = list(dict.fromkeys(files))
+    for file in files:
+        data = {"Vendor_Code": rng.choice(vendor_df["Vendor_Code"].tolist() + ["", "V99999"])}
+        for folder in folders:
+            with open(os.path.join(folder, file), "w", encoding="utf-8") as f:
+                json.dump(data, f)
+
+    try:
+        start = time.perf_counter()
+        for file in files:
+            _enrich_by_masks(file, vendor_df, pixtral_df, folders[0])
+        mask_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            enrich_invoices(files, vendor_gl_table(vendor_df), po_flag_table(pixtral_df), folders[1])
+        join_seconds = time.perf_counter() - start
+
+        identical = True
+        for file in files:
+            texts = [open(os.path.join(folder, file), encoding="utf-8").read() for folder in folders]
+            try:
+                # NaN or Infinity would be written unquoted, which JSON.parse in server.js rejects
+                json.loads(texts[1], parse_constant=_reject_constant)
+            except ValueError:
+                identical = False
+            identical = identical and texts[0] == texts[1]
+    finally:
+        for folder in folders:
+            shutil.rmtree(folder, ignore_errors=True)
+
+    print(f"INFO: GL enrichment of {len(files)} invoices against {vendors} vendors and {po_rows} PO rows: "
+          f"per-file masks {mask_seconds:.2f} s, keyed join {join_seconds:.3f} s; JSON {'identical' if identical else 'DIFFERS'}")
+    return identical
+
+if __name__ == "__main__":
+    import sys
+
+    print("=== GL Enrichment Benchmark ===")
+    sys.exit(0 if benchmark_enrichment(*[int(arg) for arg in sys.argv[1:4]]) else 1)
@@ -1,7 +1,14 @@
 # Network Configuration for Invoice Processing Pipeline
-# This file contains network path settings and helper functions
+# This file contains network path settings and helper functions.
+# Nothing touches the network on import. Before a UNC path is checked, its server is
+# probed with a short TCP connect to the SMB port, so an offline server costs at most
+# probe_timeout_seconds instead of the OS SMB timeout on every os.path.exists.
 
 import os
+import time
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Network configuration settings
 NETWORK_CONFIG = {
@@ -15,9 +22,55 @@ NETWORK_CONFIG = {
     "job_uploaded_folder": "JOB UPLOADED",
     "enable_network": True,
     "local_fallback": "data/network_fallback/",
-    "network_ips": ["192.168.1.71", "192.168.1.130"]
+    "use_mirror": True,            # read the projects folder and Project List from the local mirror (share_mirror.py)
+    "network_ips": ["192.168.1.71", "192.168.1.130"],
+    "probe_port": 445,             # SMB
+    "probe_timeout_seconds": 1.5,
+    "probe_ttl_seconds": 60,       # how long a probe result is reused
 }
 
+_probe_results = {}                # server -> (reachable, probed_at, seconds)
+_probe_lock = threading.Lock()
+
+def _probe(server):
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((server, NETWORK_CONFIG["probe_port"]), timeout=NETWORK_CONFIG["probe_timeout_seconds"]):
+            reachable = True
+    except OSError:
+        reachable = False
+    return reachable, time.perf_counter() - start
+
+def probe_servers(servers=None, refresh=False):
+    """
+    Probe servers (default: every configured server and network IP) concurrently and return server -> reachable.
+    Results are cached for probe_ttl_seconds; the wait is bounded by one probe timeout however many servers are down.
+    """
+    servers = servers or list(dict.fromkeys(
+        [NETWORK_CONFIG["projects_server"], NETWORK_CONFIG["accounting_server"]] + NETWORK_CONFIG.get("network_ips", [])
+    ))
+    now = time.time()
+    with _probe_lock:
+        stale = [server for server in servers
+                 if refresh or server not in _probe_results
+                 or now - _probe_results[server][1] > NETWORK_CONFIG["probe_ttl_seconds"]]
+    if stale:
+        with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+            results = dict(zip(stale, executor.map(_probe, stale)))
+        with _probe_lock:
+            for server, (reachable, seconds) in results.items():
+                _probe_results[server] = (reachable, time.time(), seconds)
+    with _probe_lock:
+        return {server: _probe_results[server][0] for server in servers}
+
+def is_server_reachable(server):
+    return probe_servers([server])[server]
+
+def probe_report():
+    """server -> (reachable, seconds the last probe took)"""
+    with _probe_lock:
+        return {server: (reachable, seconds) for server, (reachable, _, seconds) in _probe_results.items()}
+
 def get_network_path():
     """Get the network path for projects folder"""
     return f"\\\\{NETWORK_CONFIG['projects_server']}\\{NETWORK_CONFIG['projects_share']}\\{NETWORK_CONFIG['projects_folder']}\\"
@@ -42,6 +95,9 @@ def test_network_access():
     """Test network accessibility"""
     try:
         projects_path = get_network_path()
+        if not is_server_reachable(NETWORK_CONFIG["projects_server"]):
+            print(f"❌ Projects server not reachable: {NETWORK_CONFIG['projects_server']}")
+            return False
         if os.path.exists(projects_path):
             print(f"✅ Projects folder accessible: {projects_path}")
             return True
@@ -56,6 +112,9 @@ def test_project_list_access():
     """Test Project List file accessibility"""
     try:
         project_list_path = get_project_list_path()
+        if not is_server_reachable(NETWORK_CONFIG["projects_server"]):
+            print(f"❌ Projects server not reachable: {NETWORK_CONFIG['projects_server']}")
+            return False
         if os.path.exists(project_list_path):
             print(f"✅ Project List file accessible: {project_list_path}")
             return True
@@ -70,6 +129,9 @@ def test_accounting_network_access():
     """Test Accounting network path accessibility"""
     try:
         accounting_path = get_accounting_network_path()
+        if not is_server_reachable(NETWORK_CONFIG["accounting_server"]):
+            print(f"❌ Accounting server not reachable: {NETWORK_CONFIG['accounting_server']}")
+            return False
         if os.path.exists(accounting_path):
             print(f"✅ Accounting network path accessible: {accounting_path}")
             return True
@@ -90,9 +152,21 @@ def get_accessible_project_list_path():
         print(f"Using local fallback path: {local_path}")
         return local_path
 
+def get_mirror_status():
+    """Freshness of the local mirror of the network shares (see share_mirror.py)"""
+    from share_mirror import mirror_status
+    return mirror_status()
+
 if __name__ == "__main__":
     print("=== Network Configuration Test ===")
     print(f"Network enabled: {is_network_enabled()}")
+
+    print("\n--- Server Probe ---")
+    start = time.perf_counter()
+    probe_servers()
+    print(f"Probed in {time.perf_counter() - start:.2f} s (bounded by {NETWORK_CONFIG['probe_timeout_seconds']} s)")
+    for server, (reachable, seconds) in probe_report().items():
+        print(f"{server}: {'reachable' if reachable else 'unreachable'} ({seconds:.2f} s)")
     
     print("\n--- Testing Projects Access ---")
     test_network_access()
@@ -106,4 +180,9 @@ if __name__ == "__main__":
     print("\n--- Accessible Paths ---")
     print(f"Projects folder: {get_network_path()}")
     print(f"Project List: {get_accessible_project_list_path()}")
-    print(f"Accounting network: {get_accounting_network_path()}") 
\ No newline at end of file
+    print(f"Accounting network: {get_accounting_network_path()}")
+
+    print("\n--- Local Mirror ---")
+    for name, status in get_mirror_status().items():
+        print(f"{name}: synced {status['synced_at']} ({status['age_seconds']} s ago), "
+              f"{'fresh' if status['fresh'] else 'stale'} -> {status['path']}")
\ No newline at end of file
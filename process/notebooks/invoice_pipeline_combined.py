@@ -14,7 +14,6 @@ import fitz  # PyMuPDF
 import numpy as np
 from PIL import Image
 import io
-from doctr.io import DocumentFile
 from doctr.models import ocr_predictor
 
 # ============================================================================
@@ -27,6 +26,7 @@ try:
     # Add the parent directory to the Python path to find network_config.py
     sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
     from network_config import NETWORK_CONFIG, get_network_path, get_local_fallback, is_network_enabled, get_accessible_project_list_path
+    from network_config import probe_servers, is_server_reachable
     print("SUCCESS: Loaded network configuration from network_config.py")
 except ImportError:
     print("WARNING: network_config.py not found, using default configuration")
@@ -49,10 +49,15 @@ except ImportError:
     def is_network_enabled():
         return NETWORK_CONFIG.get("enable_network", True)
 
-# Configure network paths
+    def probe_servers(servers=None, refresh=False):
+        return {}
+
+    def is_server_reachable(server):
+        return True
+
+# Configure network paths (the Project List path is resolved when it is read)
 NETWORK_PATHS = {
     "projects_folder": get_network_path(),
-    "project_list": get_accessible_project_list_path() if 'get_accessible_project_list_path' in globals() else "data/Project List -.xlsx",
     "local_fallback": get_local_fallback()
 }
 
@@ -72,8 +77,8 @@ def get_accessible_path(path_key):
             return local_path
         return None
     
-    # Try network path first
-    if network_path and os.path.exists(network_path):
+    # Try network path first; an unreachable server is skipped without waiting on the SMB timeout
+    if network_path and is_server_reachable(NETWORK_CONFIG["projects_server"]) and os.path.exists(network_path):
         print(f"SUCCESS: Using network path: {network_path}")
         return network_path
     
@@ -86,7 +91,15 @@ def get_accessible_path(path_key):
     print(f"ERROR: Neither network nor local path accessible for: {path_key}")
     return None
 
-# Test network connectivity
+# Test network connectivity: probe every server concurrently first, so an offline server
+# costs one short probe timeout rather than an SMB timeout per path
+import time
+_probe_start = time.perf_counter()
+_probe_results = probe_servers() if is_network_enabled() else {}
+if _probe_results:
+    _probe_summary = ", ".join(f"{server} {'up' if up else 'DOWN'}" for server, up in _probe_results.items())
+    print(f"INFO: Network probe: {_probe_summary} "
+          f"in {time.perf_counter() - _probe_start:.2f} s (worst case {NETWORK_CONFIG.get('probe_timeout_seconds', 0)} s)")
 PROJECTS_PATH = get_accessible_path("projects_folder")
 if not PROJECTS_PATH:
     print("WARNING: Network path not accessible. Some features may be limited.")
@@ -117,21 +130,43 @@ if not PROJECTS_PATH:
     
     create_sample_files()
 
+# Keep a local mirror of the projects folder and Project List; it syncs in the background
+# while OCR runs, and later stages read from it instead of the share (see share_mirror.py)
+USE_MIRROR = NETWORK_CONFIG.get("use_mirror", False)
+if USE_MIRROR:
+    from share_mirror import start_mirror_sync, mirrored
+    if PROJECTS_PATH and PROJECTS_PATH == NETWORK_PATHS["projects_folder"]:
+        start_mirror_sync()
+
+def projects_read_path():
+    """The fresh local mirror of the projects folder if there is one, else PROJECTS_PATH"""
+    return mirrored("projects_folder", PROJECTS_PATH) if USE_MIRROR else PROJECTS_PATH
+
 # Load OCR model (CPU or GPU)
 model = ocr_predictor(pretrained=True)
 
+# Page-one word boxes let the Pixtral PO step crop to the PO label
+from po_vision import save_word_boxes
+# Pages are rendered once and shared with the Pixtral PO step and PO logo detection
+from page_raster_cache import get_pages, get_page, page_count, report_cache_stats
+# Network folders and preview_storage are listed once per stage, not once per invoice
+from dir_listing import list_dir, invalidate, report_listing_stats
+DOCTR_DPI = 144  # DocumentFile.from_pdf's default scale of 2
+
 def pdf_to_text_doctr(pdf_path):
     """Extract text from PDF using DocTR."""
     text_output = ""
     try:
         # Load PDF as images
-        doc_images = DocumentFile.from_pdf(pdf_path)
+        doc_images = [np.asarray(page) for page in get_pages(pdf_path, dpi=DOCTR_DPI)]
 
         # Perform OCR
         result = model(doc_images)
 
         # Extract text from each page
         for i, page in enumerate(result.pages):
+            if i == 0:
+                save_word_boxes(pdf_path, page)
             page_text = ""
             for block in page.blocks:
                 for line in block.lines:
@@ -165,6 +200,7 @@ def process_pdf_folder_doctr(folder_path, output_folder):
 input_pdf_folder = "data/raw_pdfs"              
 output_text_folder = "data/OCR_text_Test"      
 process_pdf_folder_doctr(input_pdf_folder, output_text_folder)
+report_cache_stats("Page raster cache after DocTR OCR")
 
 # !pip install -U bitsandbytes
 # !pip install -U accelerate
@@ -511,19 +547,40 @@ import os
 import re
 import json
 import pandas as pd
-from fuzzywuzzy import fuzz
 import time
+import queue
+from vendor_index import (
+    normalize_digits, extract_contact_numbers, remove_company_address,
+    load_vendor_data, candidate_rows, match_vendor_fuzzy
+)
+from vendor_tfidf import tfidf_candidates
+from approval_gate import wait_for_gate, run_in_background
+from approval_records import init_records, stream_decisions, load_records, APPROVED, DEFERRED, DECIDED_STATUSES
+from vendor_memo import letterhead_fingerprint, load_memo, save_memo, vendor_rows_by_code, lookup_vendor, remember_vendor
 
 # --- Load and prepare vendor list ---
-vendor_df = pd.read_csv("data/Vendor_List.csv").dropna(subset=['Vendor_Name'])
-vendor_df['Vendor_Contact'] = vendor_df['Vendor_Contact'].fillna("")
-vendor_df['Vendor_Address'] = vendor_df['Vendor_Address'].fillna("")
-vendor_df["Vendor_Code"] = vendor_df["Vendor_Code"].astype(str).str.strip()
+# Served from data/cache/vendor_index.pkl unless Vendor_List.csv changed
+vendor_load_start = time.perf_counter()
+vendor_data = load_vendor_data("data/Vendor_List.csv")
+vendor_df = vendor_data["match_df"]
+print(f"INFO: Loaded {len(vendor_df)} vendors in {(time.perf_counter() - vendor_load_start) * 1000:.1f} ms")
+
+# Address-token blocking index: only vendors sharing a ZIP, house number,
+# rare street word or phone number with the document get fuzzy-scored
+vendor_index = vendor_data["index"]
+
+# "blocked" scores every vendor that survives address-token blocking;
+# "tfidf" scores only the character n-gram TF-IDF top-k (plus phone matches)
+VENDOR_MATCHER = os.environ.get("VENDOR_MATCHER", "blocked")
+
+# Letterhead fingerprints of previously approved invoices -> vendor code
+vendor_memo = load_memo()
+vendor_memo_rows = vendor_rows_by_code(vendor_df)
 
 # --- Prepare OCR and JSON folders ---
 ocr_txt_folder = "data/OCR_text_Test"
 json_folder = "data/processed"
-output_csv = "outputs/excel_files/matched_vendors_from_txt.csv"
+vendor_match_csv = "outputs/excel_files/matched_vendors_from_txt.csv"
 approval_flag_file = "outputs/excel_files/approval_needed.flag"
 approval_status_file = "outputs/excel_files/approval_status.json"
 
@@ -543,51 +600,88 @@ if os.path.exists(po_approval_flag_file):
     print("SUCCESS: Cleared existing PO approval flag")
 
 # --- Utility Functions ---
-def normalize_digits(text):
-    return re.sub(r'\D+', '', str(text))
+# normalize_digits, extract_contact_numbers and remove_company_address live in vendor_index.py
 
-def extract_contact_numbers(text):
-    return re.findall(r'\b\d{10,}\b', normalize_digits(text))
+def inject_approved_vendor(txt_file, vendor):
+    """Write the reviewer-approved vendor code and name into the invoice's JSON"""
+    base_name = os.path.splitext(txt_file)[0]
+    json_path = os.path.join(json_folder, base_name + ".json")
 
-def remove_company_address(text):
-    for block in ["535 railroad ave", "535 railroad avenue"]:
-        text = text.replace(block, "")
-    return text
+    if not os.path.exists(json_path):
+        print(f"ERROR: JSON not found for: {base_name}")
+        return False
 
-def wait_for_approval():
-    """Wait for user approval before continuing"""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    # Inject matched vendor info using the data the reviewer approved
+    data["Vendor_Code"] = vendor["Vendor_Code"]
+    data["Vendor_Name"] = vendor["Vendor_Name"]
+
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+
+    print(f"SUCCESS: Enriched {json_path} with updated vendor info: {vendor['Vendor_Code']} - {vendor['Vendor_Name']}")
+    return True
+
+def review_vendor_matches(matches, approved_queue):
+    """
+    Open a per-invoice vendor review and handle each invoice as soon as it is decided.
+    Approved invoices get their vendor injected and are put on approved_queue for GL
+    enrichment; None is queued once no invoice is left waiting.
+    Returns the set of TXT files the reviewer deferred to a later run.
+    """
     print("SUCCESS: Vendor matches created. Waiting for user approval...")
-    
-    # Create approval flag
+
+    # Create approval flag and the batch status file the approval dialog still reads
     with open(approval_flag_file, 'w') as f:
         f.write("approval_needed")
-    
-    # Initialize approval status
-    approval_status = {"approved": False, "approved_matches": []}
     with open(approval_status_file, 'w') as f:
-        json.dump(approval_status, f)
-    
-    # Wait for approval
-    while True:
-        try:
-            with open(approval_status_file, 'r') as f:
-                status = json.load(f)
-            
-            if status.get("approved", False):
-                print("SUCCESS: Approval received. Continuing with processing...")
-                # Remove approval flag
-                if os.path.exists(approval_flag_file):
-                    os.remove(approval_flag_file)
-                return status.get("approved_matches", [])
-            
-            time.sleep(1)  # Check every second
-            
-        except Exception as e:
-            print(f"Error checking approval status: {e}")
-            time.sleep(1)
+        json.dump({"approved": False, "approved_matches": []}, f)
+
+    init_records("vendor", [m["TXT_File"] for m in matches], {m["TXT_File"]: m for m in matches})
+
+    deferred = set()
+    approved_count = 0
+    try:
+        # server.js notifies the "vendor" gate after each decision. The review overlaps the
+        # PO stages, so keep the matches CSV fresh for server.js's 5-minute check.
+        for txt_file, record in stream_decisions("vendor", description="vendor approval",
+                                                 heartbeat_paths=[vendor_match_csv]):
+            if record["status"] == DEFERRED:
+                deferred.add(txt_file)
+                continue
+            if record["status"] != APPROVED:
+                continue
+
+            vendor = record.get("data") or {}
+            if not inject_approved_vendor(txt_file, vendor):
+                continue
+            approved_count += 1
+
+            # Remember approved letterheads so the same vendor skips scoring next time
+            txt_path = os.path.join(ocr_txt_folder, txt_file)
+            if os.path.exists(txt_path):
+                with open(txt_path, 'r', encoding='utf-8') as f:
+                    fingerprint = letterhead_fingerprint(f.read())
+                if remember_vendor(vendor_memo, fingerprint, vendor.get("Vendor_Code", ""), vendor_memo_rows,
+                                   vendor.get("Address_Match_Score", "")):
+                    save_memo(vendor_memo)
+            approved_queue.put(txt_file)
+    finally:
+        approved_queue.put(None)
+
+    print(f"SUCCESS: Vendor review finished: {approved_count} approved, {len(deferred)} deferred")
+    # Remove approval flag
+    if os.path.exists(approval_flag_file):
+        os.remove(approval_flag_file)
+    return deferred
 
 # --- Step 1: Match Vendors from .txt using address/contact ---
 final_matches = []
+vendors_scored = 0
+documents_matched = 0
+memo_hits = 0
 
 for txt_file in os.listdir(ocr_txt_folder):
     if not txt_file.endswith(".txt"):
@@ -598,37 +692,43 @@ for txt_file in os.listdir(ocr_txt_folder):
         normalized_txt = remove_company_address(txt_content.lower())
         txt_digits = extract_contact_numbers(txt_content)
 
-        best_match = None
-        best_score = 0
-
-        for _, row in vendor_df.iterrows():
-            contact = normalize_digits(row['Vendor_Contact'])
-            address = str(row['Vendor_Address']).lower()
-
-            contact_matched = any(contact in c for c in txt_digits) if contact else False
-            address_score = fuzz.token_set_ratio(address, normalized_txt) if address else 0
-            address_matched = address_score >= 80
-
-            if address_matched or contact_matched:
-                combined_score = address_score + (10 if contact_matched else 0)
-
-                if combined_score > best_score:
-                    best_score = combined_score
-                    best_match = {
-                        "TXT_File": txt_file,
-                        "Vendor_Code": row['Vendor_Code'],
-                        "Vendor_Name": row['Vendor_Name'],
-                        "Vendor_Contact": row['Vendor_Contact'],
-                        "Vendor_Address": row['Vendor_Address'],
-                        "Address_Match_Score": address_score,
-                        "Matched_Contact": contact if contact_matched else "",
-                        "Matched_By": "contact + address" if (contact_matched and address_matched)
-                                      else "address only" if address_matched else "contact only"
-                    }
+        # Repeat vendor: a human already approved this letterhead (and its phone/address is present), skip scoring
+        memo_row, memo_entry = lookup_vendor(vendor_memo, letterhead_fingerprint(txt_content), vendor_memo_rows,
+                                             normalized_txt, txt_digits)
+        if memo_row is not None:
+            memo_hits += 1
+            final_matches.append({
+                "TXT_File": txt_file,
+                "Vendor_Code": memo_row['Vendor_Code'],
+                "Vendor_Name": memo_row['Vendor_Name'],
+                "Vendor_Contact": memo_row['Vendor_Contact'],
+                "Vendor_Address": memo_row['Vendor_Address'],
+                "Address_Match_Score": memo_entry.get("Address_Match_Score", ""),
+                "Matched_Contact": "",
+                "Matched_By": "memo"
+            })
+            continue
+
+        # Company address is already stripped, so our own "535 railroad ave" never pulls in candidates
+        if VENDOR_MATCHER == "tfidf":
+            candidates = tfidf_candidates(vendor_data["tfidf"], vendor_index, normalized_txt, txt_digits)
+        else:
+            candidates = candidate_rows(vendor_index, normalized_txt, txt_digits)
+        vendors_scored += len(candidates)
+        documents_matched += 1
+
+        best_match = match_vendor_fuzzy(txt_file, normalized_txt, txt_digits, vendor_df, candidates)
 
         if best_match:
             final_matches.append(best_match)
 
+if documents_matched:
+    total_comparisons = documents_matched * len(vendor_df)
+    print(f"INFO: Vendor matcher '{VENDOR_MATCHER}' scored {vendors_scored} of {total_comparisons} vendor comparisons "
+          f"(pruned {1 - vendors_scored / max(total_comparisons, 1):.1%})")
+if memo_hits:
+    print(f"INFO: Matched {memo_hits} invoices from the approved vendor memo")
+
 # --- Step 2: Save Matches to CSV ---
 match_df = pd.DataFrame(final_matches)
 
@@ -637,141 +737,35 @@ if 'Vendor_Address' in match_df.columns:
     match_df['Vendor_Address'] = match_df['Vendor_Address'].astype(str).str.replace('\n', ' ').str.replace('\r', ' ')
 
 # Write CSV with proper quoting to handle any remaining special characters
-match_df.to_csv(output_csv, index=False, quoting=1)  # quoting=1 means quote all non-numeric fields
-print(f"SUCCESS: Best vendor matches saved to {output_csv}")
-
-# --- Step 3: Wait for User Approval ---
-approved_matches = wait_for_approval()
-
-# --- Step 4: Continue with approved matches only ---
-if approved_matches:
-    # Filter matches to only include approved ones
-    approved_txt_files = [match["TXT_File"] for match in approved_matches]
-    final_matches = [match for match in final_matches if match["TXT_File"] in approved_txt_files]
-    
-    print(f"SUCCESS: Processing {len(final_matches)} approved vendor matches...")
-    
-    # IMPORTANT: Re-read the CSV file to get the updated vendor information
-    print("SUCCESS: Reading updated vendor information from CSV file...")
-    updated_match_df = pd.read_csv(output_csv)
-    print(f"SUCCESS: Loaded {len(updated_match_df)} updated vendor matches from CSV")
-    
-else:
-    print("WARNING: No matches approved. Stopping processing.")
-    exit(0)
-
-# --- Step 5: Prepare Vendor Details Lookup ---
-vendor_lookup = {
-    str(row["Vendor_Code"]).strip(): {
-        "Distribution_GL_Account": row.get("Distribution_GL_Account", ""),
-        "Phase_Code": row.get("Phase_Code", ""),
-        "Cost_Type": row.get("Cost_Type", "")
-    }
-    for _, row in vendor_df.iterrows()
-}
-
-# --- Step 6: Inject only approved vendor info into JSON files ---
-for _, row in updated_match_df.iterrows():
-    if row["TXT_File"] not in approved_txt_files:
-        continue
-        
-    base_name = os.path.splitext(row["TXT_File"])[0]
-    json_path = os.path.join(json_folder, base_name + ".json")
-
-    if os.path.exists(json_path):
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-
-        # Inject matched vendor info using the UPDATED data from CSV
-        data["Vendor_Code"] = row["Vendor_Code"]
-        data["Vendor_Name"] = row["Vendor_Name"]
-
-        # ERROR: Remove logic for Distribution_GL_Account, Phase_Code, Cost_Type
-
-        # Save updated JSON
-        with open(json_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2)
-
-        print(f"SUCCESS: Enriched {json_path} with updated vendor info: {row['Vendor_Code']} - {row['Vendor_Name']}")
-    else:
-        print(f"ERROR: JSON not found for: {base_name}")
-
-print("SUCCESS: Processing complete!")
+match_df.to_csv(vendor_match_csv, index=False, quoting=1)  # quoting=1 means quote all non-numeric fields
+print(f"SUCCESS: Best vendor matches saved to {vendor_match_csv}")
+
+# --- Step 3: Start per-invoice User Approval ---
+# Only the JSON vendor/GL enrichment needs the approved vendors, so the review runs
+# in the background while Pixtral PO extraction, projects-folder verification and
+# PO table OCR proceed. Each invoice is enriched as soon as it is approved.
+approved_vendor_queue = queue.Queue()
+vendor_review_future = run_in_background(
+    lambda: review_vendor_matches(match_df.fillna("").astype(str).to_dict("records"), approved_vendor_queue),
+    name="vendor-approval"
+)
 
 import os
 os.environ["MISTRAL_API_KEY"] = "5GPPqcV6edATEGnl0w09ORmhu8zqIzUL"  # Replace with your actual key
 
 import os
-import base64
 import pandas as pd
-from pdf2image import convert_from_path
 from mistralai import Mistral
+from po_vision import (
+    PO_VISION_CONFIG, build_po_payloads, request_po, extract_pos_concurrently,
+    load_learned_boxes, save_learned_boxes
+)
 from dotenv import load_dotenv
 import re
 
 load_dotenv()
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
-# Get the absolute path to the poppler bin directory
-import os
-current_dir = os.path.dirname(os.path.abspath(__file__))
-POPPLER_PATH = os.path.join(current_dir, "..", "models", "poppler-24.08.0", "Library", "bin")
-
-def convert_pdf_to_image(pdf_path, page_number=0, poppler_path=POPPLER_PATH):
-    try:
-        # Debug: Check if poppler path exists
-        if not os.path.exists(poppler_path):
-            print(f"WARNING: Poppler path does not exist: {poppler_path}")
-            return None
-            
-        # Debug: Check if pdfinfo exists in the poppler path
-        pdfinfo_path = os.path.join(poppler_path, "pdfinfo.exe")
-        if not os.path.exists(pdfinfo_path):
-            print(f"WARNING: pdfinfo not found at: {pdfinfo_path}")
-            return None
-            
-        print(f"SEARCH: Using poppler path: {poppler_path}")
-        images = convert_from_path(pdf_path, dpi=200, poppler_path=poppler_path)
-        if not images:
-            raise ValueError("No images generated from PDF.")
-        image_path = f"{os.path.splitext(os.path.basename(pdf_path))[0]}_page.jpg"
-        images[page_number].save(image_path, "JPEG")
-        return image_path
-    except Exception as e:
-        print(f"Error converting {pdf_path} to image: {e}")
-        return None
-
-def encode_image(image_path):
-    try:
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    except Exception as e:
-        print(f"Error encoding image: {e}")
-        return None
-
-def extract_po_from_image(base64_image, client, model="pixtral-12b-2409"):
-    try:
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": (
-                        "Extract the Customer PO number from this invoice EXACTLY as it appears, preserving all formatting, punctuation, decimal points, spaces, and dashes. "
-                        "PO numbers can be: short phrases (e.g., 'SHOP', 'ELECTRIC WALL HTR'), numbers with decimals (e.g., '24.08', '22.82'), or plain numbers (e.g., '1234', '56789'). "
-                        "CRITICAL: Do NOT modify, combine, or change the format. If you see '24.08', return '24.08' NOT '2408'. "
-                        "Ignore invoice numbers, order numbers, totals, and dates. "
-                        "Only return the PO number exactly as written — do not guess, hallucinate, or reformat. If not visible, return 'NOT FOUND'."
-                    )},
-                    {"type": "image_url", "image_url": f"data:image/jpeg;base64,{base64_image}"}
-                ]
-            }
-        ]
-        response = client.chat.complete(model=model, messages=messages)
-        result = response.choices[0].message.content.strip()
-        return "" if result.strip().upper() == "NOT FOUND" else result
-    except Exception as e:
-        return f"ERROR: {e}"
-
 def extract_amount_before_tax(text):
     patterns = [r"(?:subtotal|amount\s*before\s*tax|total\s*before\s*tax)[:\s]*\$?\s*([0-9,]+\.\d{2})"]
     for pattern in patterns:
@@ -780,69 +774,9 @@ def extract_amount_before_tax(text):
             return match.group(1).replace(',', '')
     return ""
 
-def is_valid_po(candidate: str) -> bool:
-    COMMON_PO_SKIP_WORDS = {"description", "amount", "invoice", "sales", "total", "terms", "date"}
-    candidate = candidate.strip().upper()
-    if candidate.lower() in COMMON_PO_SKIP_WORDS:
-        return False
-    if re.fullmatch(r"\d{4,6}", candidate):
-        return True
-    if re.fullmatch(r"\d{2}\.\d{2,3}", candidate):
-        return True
-    if re.fullmatch(r"[A-Z0-9\- ]{3,}", candidate):
-        return True
-    return False
-
-def clean_po_value(raw_text):
-    if not raw_text:
-        return ""
-    text = raw_text.strip().upper()
-    
-    # Handle PO # pattern (with space) - extract just the number
-    po_hash_match = re.search(r"PO\s+#(\d+)", text, re.IGNORECASE)
-    if po_hash_match:
-        return po_hash_match.group(1)
-    
-    # Updated cleaning logic (safe)
-    text = re.sub(r"\bPO\s*NUMBER\s*[:\-]?\s*", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\bCUSTOMER\s*PO\s*[:\-]?\s*", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\bPURCHASE\s*ORDER\s*[:\-]?\s*", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\bCUSTOMER\s*ORDER\s*NUMBER\s*[:\-]?\s*", "", text, flags=re.IGNORECASE)
-
-    tokens = re.split(r"[\n,:;\-]+", text)
-    for token in tokens:
-        token = token.strip()
-        if is_valid_po(token):
-            return token
-    if is_valid_po(text):
-        return text
-    return ""
-
-
-def classify_po(value):
-    try:
-        val = str(value).strip()
-
-        # Case 1: 4-digit number → PO_Number
-        if re.fullmatch(r'\d{4}', val):
-            return val, '', '', ''
-
-        # Case 2: 5-digit number → WO_Number
-        if re.fullmatch(r'\d{5}', val):
-            return '', '', val, ''
-
-        # Case 3: Job number with optional suffix (e.g., 24.60, 24-60, 24 60, 24,01, 24, 01, 22.82-W, 24.09 - Joey Restaurant)
-        job_match = re.match(r'^(\d{2})[.\-,\s,]{1,3}(\d{2,3})([\s\-–]*[A-Za-z].*)?$', val)
-        if job_match:
-            part1 = job_match.group(1)
-            part2 = job_match.group(2)
-            return '', f'{part1}.{part2}', '', ''
-
-        # Case 4: Everything else → Remarks
-        return '', '', '', val
-
-    except Exception as e:
-        return '', '', '', value
+# is_valid_po, clean_po_value, classify_po and clean_identifier live in po_extraction.py
+from po_extraction import clean_po_value, classify_po_frame, clean_identifier, detect_po_from_text, load_ocr_text, audit_selected, same_po
+from po_vision import load_word_boxes
 
 def process_pdf_folder(folder_path, output_csv="outputs/excel_files/pixtral_po_results.csv"):
     # Check if folder exists
@@ -856,6 +790,13 @@ def process_pdf_folder(folder_path, output_csv="outputs/excel_files/pixtral_po_r
 
     client = Mistral(api_key=api_key)
     results = []
+    request_stats = []
+
+    # Suggested vendor per invoice (the review may still be open) selects a learned PO crop
+    vendor_codes = {
+        os.path.splitext(row["TXT_File"])[0]: row["Vendor_Code"] for row in match_df.to_dict("records")
+    } if "TXT_File" in match_df.columns else {}
+    learned_boxes = load_learned_boxes()
     
     # Count PDF files
     pdf_files = [f for f in os.listdir(folder_path) if f.lower().endswith('.pdf')]
@@ -869,21 +810,52 @@ def process_pdf_folder(folder_path, output_csv="outputs/excel_files/pixtral_po_r
             "clean_po_number": ""
         })
 
+    # Text first: take the PO from the DocTR text and word boxes when they name one confidently.
+    # Pixtral gets the rest, plus a small stable sample of text answers to measure agreement.
+    text_answers = {}
     for file in pdf_files:
-        full_path = os.path.join(folder_path, file)
-        print(f"FILE: Processing {file}...")
+        raw_po, source = detect_po_from_text(load_ocr_text(file), load_word_boxes(file))
+        if raw_po is not None:
+            text_answers[file] = (raw_po, source)
+    vision_files = [file for file in pdf_files if file not in text_answers or audit_selected(file)]
+    if pdf_files:
+        print(f"INFO: PO found in OCR text for {len(text_answers)} of {len(pdf_files)} invoices; "
+              f"{len(vision_files)} sent to Pixtral ({sum(f in text_answers for f in vision_files)} for audit)")
+
+    if PO_VISION_CONFIG["max_in_flight"] > 1 and len(vision_files) > 1:
+        # Render on a process pool while several Pixtral requests are in flight; rows keep pdf_files order
+        print(f"INFO: Extracting POs concurrently ({PO_VISION_CONFIG['max_in_flight']} requests in flight)")
+        extracted = extract_pos_concurrently(
+            [os.path.join(folder_path, file) for file in vision_files], client, vendor_codes, learned_boxes
+        )
+    else:
+        extracted = []
+        for file in vision_files:
+            full_path = os.path.join(folder_path, file)
+            print(f"FILE: Processing {file}...")
+            try:
+                payloads = build_po_payloads(full_path, vendor_codes.get(os.path.splitext(file)[0]), learned_boxes)
+            except Exception as e:
+                extracted.append((None, {"error": f"{type(e).__name__}: {e}"}))
+                continue
+            extracted.append(request_po(payloads, client, vendor_codes.get(os.path.splitext(file)[0]), learned_boxes))
 
-        img_path = convert_pdf_to_image(full_path)
-        if not img_path:
-            results.append({"file_name": file, "extracted_po_number": "ERROR: image conversion failed", "clean_po_number": ""})
-            continue
+    vision_answers = dict(zip(vision_files, extracted))
 
-        base64_img = encode_image(img_path)
-        if not base64_img:
-            results.append({"file_name": file, "extracted_po_number": "ERROR: base64 encode failed", "clean_po_number": ""})
+    for file in pdf_files:
+        raw_po, stats = vision_answers.get(file, (None, {}))
+        if file in text_answers:
+            text_po, text_source = text_answers[file]
+            stats = dict(stats, po_source="text", text_source=text_source, text_po=text_po, vision_po=raw_po or "")
+            raw_po = text_po
+        else:
+            stats = dict(stats, po_source="vision", vision_po=raw_po or "")
+        request_stats.append(dict(file_name=file, **stats))
+        if raw_po is None:
+            print(f"Error converting {os.path.join(folder_path, file)} to image: {stats['error']}")
+            results.append({"file_name": file, "extracted_po_number": "ERROR: image conversion failed", "clean_po_number": ""})
             continue
 
-        raw_po = extract_po_from_image(base64_img, client)
         clean_po = clean_po_value(raw_po if raw_po.lower() not in ["not found", "not visible"] else "")
 
         results.append({
@@ -892,7 +864,33 @@ def process_pdf_folder(folder_path, output_csv="outputs/excel_files/pixtral_po_r
             "clean_po_number": clean_po
         })
 
-        os.remove(img_path)
+    completed = [s for s in request_stats if "roi_source" in s]
+    if completed:
+        save_learned_boxes(learned_boxes)
+        sources = pd.Series([s["roi_source"] for s in completed]).value_counts().to_dict()
+        print(f"INFO: PO requests: {sum(s['payload_bytes'] for s in completed) / len(completed) / 1024:.1f} KB avg payload, "
+              f"{sum(s['latency_ms'] for s in completed) / len(completed):.0f} ms avg latency, "
+              f"{sum(s['fallback'] for s in completed)} full-page fallback(s), crops by source: {sources}")
+    if request_stats:
+        # Per-request latency and failures, kept beside the results CSV so slow outliers are visible
+        request_log = pd.DataFrame(request_stats)
+        # A failed audit render or request does not fail an invoice whose PO came from the text
+        request_log["failed"] = [
+            str(r["extracted_po_number"]).startswith("ERROR:") or (s["po_source"] == "vision" and "error" in s)
+            for s, r in zip(request_stats, results)
+        ]
+        audited = [s for s in request_stats if s["po_source"] == "text" and s["vision_po"]
+                   and not s["vision_po"].startswith("ERROR:")]
+        if audited:
+            agreed = sum(same_po(s["text_po"], s["vision_po"]) for s in audited)
+            print(f"INFO: Text cascade agreement with Pixtral on audited invoices: {agreed} of {len(audited)}")
+        request_log_csv = os.path.splitext(output_csv)[0] + "_requests.csv"
+        request_log.to_csv(request_log_csv, index=False)
+        # No latency column when no Pixtral request completed (all failed, or all answered from text)
+        if "latency_ms" in request_log.columns:
+            for _, row in request_log.dropna(subset=["latency_ms"]).nlargest(3, "latency_ms").iterrows():
+                print(f"INFO: Slow PO request: {row['file_name']} {row['latency_ms']:.0f} ms")
+        print(f"SUCCESS: PO request log saved to {request_log_csv}")
 
     # SUCCESS: Create DataFrame from extracted results
     df = pd.DataFrame(results)
@@ -909,9 +907,7 @@ def process_pdf_folder(folder_path, output_csv="outputs/excel_files/pixtral_po_r
     
     # SUCCESS: Perform PO Classification using extracted_po_number
     try:
-        df[['PO_Number', 'Job_Number', 'WO_Number', 'Remarks']] = df['extracted_po_number'].apply(
-            lambda x: pd.Series(classify_po(x))
-        )
+        df[['PO_Number', 'Job_Number', 'WO_Number', 'Remarks']] = classify_po_frame(df['extracted_po_number'])
     except Exception as e:
         print(f"ERROR: Error during PO classification: {e}")
         # Create empty columns if classification fails
@@ -931,68 +927,39 @@ process_pdf_folder(pdf_folder, output_csv)
 # Explicitly treat PO_Number and Job_Number as string to preserve formatting like '24.60'
 df_po = pd.read_csv(output_csv, dtype={"PO_Number": str, "Job_Number": str})
 
-def clean_identifier(val):
-    try:
-        if pd.isna(val) or val == "":
-            return ""
-        val = str(val).strip()
-
-        # Fix for numbers like 13511.0 → "13511"
-        if re.fullmatch(r"\d+\.0", val):
-            val = val.split(".")[0]
-
-        return val
-    except:
-        return str(val)
-
 df_po["PO_Number"] = df_po["PO_Number"].apply(clean_identifier)
 df_po["Job_Number"] = df_po["Job_Number"].apply(clean_identifier)
 df_po["WO_Number"] = df_po["WO_Number"].apply(clean_identifier)
 
-import os
+from projects_share import find_in_filenames, round_trips
 
-def extract_info(value, mode, directory_path):
-    """
-    Simulate extraction by checking for a matching filename or content in files.
-    Parameters:
-    - value: the PO or Job number to search for.
-    - mode: either "po" or "job".
-    - directory_path: where the files are located.
-    
-    Returns:
-    - Tuple: (match_string or None, file_name or None)
-    """
-    try:
-        # Check if directory exists
-        if not os.path.exists(directory_path):
-            print(f"WARNING: Directory not accessible: {directory_path}")
-            return (None, None)
-            
-        for filename in os.listdir(directory_path):
-            if filename.endswith(".pdf") or filename.endswith(".txt"):
-                if value in filename:
-                    return (f"SUCCESS: Found in {filename}", filename)
-        return (None, None)
-    except Exception as e:
-        return (f"ERROR: Error: {str(e)}", None)
+# One listing of the projects folder (mirror or share) and one pass over its filenames for every PO and Job number
+share_round_trips = round_trips()
+found_files = find_in_filenames(
+    [value for value in df_po["PO_Number"].tolist() + df_po["Job_Number"].tolist() if pd.notna(value) and value != ""],
+    projects_read_path(),
+)
 
 po_verified_by = []
 job_verified_by = []
+per_row_lookups = 0
 
 for _, row in df_po.iterrows():
     match_found = False
 
     if pd.notna(row["PO_Number"]) and row["PO_Number"] != "":
-        result = extract_info(row["PO_Number"], "po", PROJECTS_PATH)
-        if result[0]:
-            po_verified_by.append(result[0])
+        per_row_lookups += 1
+        filename = found_files.get(row["PO_Number"])
+        if filename:
+            po_verified_by.append(f"SUCCESS: Found in {filename}")
             job_verified_by.append("")
             match_found = True
 
     if not match_found and pd.notna(row["Job_Number"]) and row["Job_Number"] != "":
-        result = extract_info(row["Job_Number"], "job", PROJECTS_PATH)
-        if result[0]:
-            job_verified_by.append(result[0])
+        per_row_lookups += 1
+        filename = found_files.get(row["Job_Number"])
+        if filename:
+            job_verified_by.append(f"SUCCESS: Found in {filename}")
             po_verified_by.append("")
             match_found = True
 
@@ -1000,6 +967,10 @@ for _, row in df_po.iterrows():
         po_verified_by.append("ERROR: Not Found")
         job_verified_by.append("ERROR: Not Found")
 
+# The per-row lookup it replaces checked and listed the share on every call (2 round trips each)
+print(f"INFO: Projects share filename check: {round_trips() - share_round_trips} SMB round trip(s) "
+      f"for {per_row_lookups} lookup(s), previously {2 * per_row_lookups}")
+
 df_po["po_verified_by"] = po_verified_by
 df_po["job_verified_by"] = job_verified_by
 
@@ -1045,32 +1016,23 @@ def wait_for_po_approval():
     # Create PO approval flag
     with open(po_approval_flag_file, 'w') as f:
         f.write("po_approval_needed")
+    init_records("po", df_po["file_name"].tolist())
     
-    # Wait for approval with timeout and better error handling
+    def flag_cleared():
+        # server.js deletes the flag on approval, or empties it if the delete fails.
+        # Per-invoice decisions release the gate once no PO is left pending.
+        if not os.path.exists(po_approval_flag_file) or os.path.getsize(po_approval_flag_file) == 0:
+            return True
+        records = load_records("po")
+        return bool(records) and all(r.get("status") in DECIDED_STATUSES for r in records.values())
+
+    # Wait for approval with timeout: server.js notifies the "po" gate right after clearing the flag
     max_wait_time = 3600  # 1 hour timeout
-    start_time = time.time()
-    
-    while True:
-        try:
-            current_time = time.time()
-            if current_time - start_time > max_wait_time:
-                print("ERROR: Timeout waiting for PO approval (1 hour). Continuing anyway...")
-                return True
-            
-            if not os.path.exists(po_approval_flag_file):
-                print("SUCCESS: PO approval received. Continuing with processing...")
-                return True
-            
-            # Print progress every 30 seconds
-            elapsed = int(current_time - start_time)
-            if elapsed % 30 == 0:
-                print(f"INFO: Still waiting for PO approval... ({elapsed} seconds elapsed)")
-            
-            time.sleep(1)  # Check every second
-            
-        except Exception as e:
-            print(f"ERROR: Error checking PO approval status: {e}")
-            time.sleep(1)
+    if wait_for_gate("po", flag_cleared, timeout=max_wait_time, description="PO approval"):
+        print("SUCCESS: PO approval received. Continuing with processing...")
+    else:
+        print("ERROR: Timeout waiting for PO approval (1 hour). Continuing anyway...")
+    return True
 
 # Wait for PO approval
 wait_for_po_approval()
@@ -1080,87 +1042,18 @@ print("SUCCESS: Reading updated PO information from CSV file...")
 updated_pixtral_df = pd.read_csv("outputs/excel_files/pixtral_po_results.csv")
 print(f"SUCCESS: Loaded {len(updated_pixtral_df)} updated PO matches from CSV")
 
-import pandas as pd
-import json
-import os
+# Apply edits from per-invoice PO approvals and note the invoices held back for a later run
+deferred_po_invoices = set()
+for file_name, record in load_records("po").items():
+    if record.get("status") == DEFERRED:
+        deferred_po_invoices.add(os.path.splitext(file_name)[0])
+    elif record.get("status") == APPROVED and record.get("data"):
+        mask = updated_pixtral_df["file_name"] == file_name
+        for column in ["PO_Number", "Job_Number", "WO_Number", "Remarks"]:
+            if column in record["data"] and column in updated_pixtral_df.columns:
+                updated_pixtral_df[column] = updated_pixtral_df[column].astype(object)
+                updated_pixtral_df.loc[mask, column] = record["data"][column] or None
 
-# === File paths ===
-vendor_csv_path = "data/Vendor_List.csv"
-pixtral_csv_path = "outputs/excel_files/pixtral_po_results.csv"
-json_folder = "data/processed"
-
-# === Load CSVs ===
-vendor_df = pd.read_csv(vendor_csv_path)
-vendor_df["Vendor_Code"] = vendor_df["Vendor_Code"].astype(str).str.strip()
-
-# Use the updated PO data instead of the original
-pixtral_df = updated_pixtral_df
-pixtral_df["file_base"] = pixtral_df["file_name"].apply(lambda x: os.path.splitext(x)[0])
-
-# === Process each JSON in the folder ===
-for file in os.listdir(json_folder):
-    if not file.endswith(".json"):
-        continue
-
-    json_path = os.path.join(json_folder, file)
-    file_base = os.path.splitext(file)[0]
-
-    # Load JSON
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    vendor_code = str(data.get("Vendor_Code", "")).strip()
-    if not vendor_code:
-        print(f"ERROR: Skipping {file} — Vendor_Code missing")
-        continue
-
-    # Look up vendor info
-    vendor_row = vendor_df[vendor_df["Vendor_Code"] == vendor_code]
-    if vendor_row.empty:
-        print(f"ERROR: Skipping {file} — Vendor_Code not found in Vendor_List")
-        continue
-
-    vendor_info = vendor_row.iloc[0]
-    gl_normal = str(vendor_info.get("Distribution_GL_Account", "")).strip()
-    gl_wo = str(vendor_info.get("WO_GL_Codes", "")).strip()
-
-    # Look up corresponding row in pixtral results
-    pixtral_row = pixtral_df[pixtral_df["file_base"] == file_base]
-    if pixtral_row.empty:
-        print(f"ERROR: Skipping {file} — Not found in pixtral_po_results.csv")
-        continue
-
-    pixtral_row = pixtral_row.iloc[0]
-
-    # Extract decision fields
-    has_po_or_job = pd.notna(pixtral_row.get("PO_Number")) or pd.notna(pixtral_row.get("Job_Number"))
-    has_wo_or_remark = pd.notna(pixtral_row.get("WO_Number")) or pd.notna(pixtral_row.get("Remarks"))
-
-    # Extract and normalize remarks
-    remarks = str(pixtral_row.get("Remarks", "")).strip().lower()
-
-    # === If only one of the GL values is available, use it directly ===
-    if gl_normal and not gl_wo:
-        data["Distribution_GL_Account"] = str(int(float(gl_normal)))
-    elif gl_wo and not gl_normal:
-        data["Distribution_GL_Account"] = str(int(float(gl_wo)))
-    
-    # === If both GL values are present, apply conditional logic ===
-    else:
-        if remarks in {"shop", "stock", "shop stock", "shop fab", "shop sab"}:
-            data["Distribution_GL_Account"] = "1200"  # Rule 1
-        elif has_po_or_job:
-            data["Distribution_GL_Account"] = str(int(float(gl_normal)))
-            data["Phase_Code"] = vendor_info.get("Phase_Code", "")
-            data["Cost_Type"] = vendor_info.get("Cost_Type", "")
-        elif has_wo_or_remark:
-            data["Distribution_GL_Account"] = str(int(float(gl_wo)))
-
-    # Save updated JSON
-    with open(json_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-
-    print(f"SUCCESS: Enriched {file}")
 
 # !pip install pymupdf xlrd
 
@@ -1170,93 +1063,39 @@ import pandas as pd
 import fitz  # PyMuPDF
 from tqdm import tqdm
 
-pdf_folder = PROJECTS_PATH if PROJECTS_PATH else "data/network_fallback/"
+pdf_folder = projects_read_path() or "data/network_fallback/"
 input_path = "outputs/excel_files/pixtral_po_results.csv"
 output_path = "outputs/excel_files/po_verified.csv"
 routing_path = "data/Routing_Code.xls"
 
 # NEW: point to the new Projects list file (xlsx) - using network configuration
 pm_file_path = get_accessible_project_list_path()
+if USE_MIRROR:
+    pm_file_path = mirrored("project_list", pm_file_path)
 print(f"INFO: Using Project List file: {pm_file_path}")
 
 df_po = pd.read_csv(input_path)
 
-def clean_number(val):
-    try:
-        return str(int(float(val))) if float(val).is_integer() else str(val)
-    except:
-        return str(val)
-
-df_po["PO_Number"] = df_po["PO_Number"].apply(clean_number)
-df_po["Job_Number"] = df_po["Job_Number"].apply(clean_number)
-df_po["WO_Number"] = df_po["WO_Number"].apply(clean_number)
+# Whole numbers read back as floats lose their ".0" (po_extraction.normalize_numbers)
+from po_extraction import normalize_numbers
+for column in ["PO_Number", "Job_Number", "WO_Number"]:
+    df_po[column] = normalize_numbers(df_po[column])
 
-# Cache for PDF content to avoid re-processing the same files
-pdf_cache = {}
+from projects_share import resolve_identifiers, pdf_text
+from reference_data import project_managers, routing_codes, assign_ordered_by, assign_routing_codes
 
 def extract_info_optimized(identifiers, id_types, pdf_folder):
     """
-    Optimized function that processes all identifiers at once using PDF caching
+    Resolve all identifiers against the persistent PO folder index (see projects_share.py);
+    PDFs are only read from the share when new or changed, and only until every identifier is found
     """
     if not os.path.exists(pdf_folder):
         print(f"ERROR: Network path not accessible: {pdf_folder}")
         return {identifier: (None, "", "", "") for identifier in identifiers}
-    
-    # Get all PDF files once
-    pdf_files = [f for f in os.listdir(pdf_folder) if f.lower().endswith('.pdf')]
-    print(f"INFO: Processing {len(pdf_files)} PDF files for {len(identifiers)} identifiers...")
-    
-    # Initialize results
-    results = {identifier: (None, "", "", "") for identifier in identifiers}
-    
-    # Process each PDF file once and cache the results
-    for pdf_file in tqdm(pdf_files, desc="Processing PDFs"):
-        pdf_path = os.path.join(pdf_folder, pdf_file)
-        
-        try:
-            # Check if PDF is already cached
-            if pdf_file in pdf_cache:
-                pdf_text = pdf_cache[pdf_file]
-            else:
-                # Process PDF and cache the result
-                doc = fitz.open(pdf_path)
-                pdf_text = ""
-                for page in doc:
-                    pdf_text += page.get_text()
-                doc.close()
-                
-                # Cache the extracted text
-                pdf_cache[pdf_file] = pdf_text
-            
-            pdf_text = pdf_cache[pdf_file]
-            
-            # Check all identifiers against this PDF
-            for identifier, id_type in zip(identifiers, id_types):
-                if results[identifier][0] is not None:
-                    continue  # Already found a match for this identifier
-                
-                # Create pattern for this identifier
-                pattern = re.compile(rf"{'Purchase Order' if id_type == 'po' else 'Job'}[:\s]*{re.escape(str(identifier))}", re.IGNORECASE)
-                
-                if pattern.search(pdf_text):
-                    # Extract ordered_by and distribution_code
-                    ordered_by_pattern = re.compile(r"Ordered By:\s*(.+)", re.IGNORECASE)
-                    distribution_pattern = re.compile(r"\d{4}\s+([EMS])\b")
-                    
-                    ordered_by = ""
-                    distribution_code = ""
-                    
-                    if (m := ordered_by_pattern.search(pdf_text)):
-                        ordered_by = m.group(1).strip()
-                    if (d := distribution_pattern.findall(pdf_text)):
-                        distribution_code = d[0]
-                    
-                    results[identifier] = (pdf_file, ordered_by, distribution_code)
-                    
-        except Exception as e:
-            print(f"ERROR: Error processing {pdf_file}: {e}")
-            continue
-    
+
+    share_round_trips = round_trips()
+    results = resolve_identifiers(pdf_folder, identifiers, id_types)
+    print(f"INFO: Verified {len(identifiers)} identifiers with {round_trips() - share_round_trips} SMB round trip(s)")
     return results
 
 # Get unique identifiers and their types
@@ -1334,9 +1173,6 @@ df_po["job_verified_by"] = job_verified_by
 df_po["ordered_by"] = ordered_by_final
 df_po["distribution_code"] = distribution_code_final
 
-# Clear the cache to free memory
-pdf_cache.clear()
-
 print("INFO: PDF verification completed. Processing additional data...")
 
 # Process job numbers from PO files (if needed)
@@ -1348,64 +1184,22 @@ for i, row in tqdm(df_po.iterrows(), desc="Extracting job numbers from PO files"
     
     if (not job_num or job_num.lower() in ["", "nan", "none"]) and \
        (po_file and not po_file.startswith("ERROR:")):
-        pdf_path = os.path.join(pdf_folder, po_file)
         try:
-            # Use cached PDF if available
-            if po_file in pdf_cache:
-                pdf_text = pdf_cache[po_file]
-            else:
-                doc = fitz.open(pdf_path)
-                pdf_text = ""
-                for page in doc:
-                    pdf_text += page.get_text()
-                doc.close()
-                # Cache for potential reuse
-                pdf_cache[po_file] = pdf_text
-            
-            match = job_number_pattern.search(pdf_text)
+            # Verification already put this PO's text in the PDF text store
+            match = job_number_pattern.search(pdf_text(pdf_folder, po_file))
             if match:
                 df_po.at[i, "Job_Number"] = match.group(1).strip()
         except Exception as e:
             print(f"ERROR: Error reading PDF {po_file}: {e}")
 
-# Clear cache again
-pdf_cache.clear()
-
 # -------------------------------
 # PM NAME LOOKUP (USING NEW PROJECTS LIST) AND REPLACE ordered_by
 # -------------------------------
 # Ensure Job_Number is formatted consistently as xx.xx
-def format_job_number(val):
-    try:
-        num = float(val)
-        return f"{num:.2f}"
-    except:
-        return str(val)
+df_po["Job_Number"] = normalize_numbers(df_po["Job_Number"], decimals=2)
 
-df_po["Job_Number"] = df_po["Job_Number"].astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
-df_po["Job_Number"] = df_po["Job_Number"].apply(format_job_number)
-
-# Read the new Projects list file which contains "Job No." and "PM" (first names)
-df_pm = pd.read_excel(pm_file_path)
-
-# Normalize its Job No. to match xx.xx strings
-def norm_job_no(v):
-    try:
-        return f"{float(v):.2f}"
-    except:
-        s = str(v).strip()
-        return s
-
-df_pm_cols = {c.strip(): c for c in df_pm.columns}  # tolerant to stray spaces/newlines
-job_no_col = next((df_pm_cols[k] for k in df_pm_cols if k.lower().replace(" ", "") in ["jobno.", "jobno", "job#","jobnumber"]), None)
-pm_col = next((df_pm_cols[k] for k in df_pm_cols if k.strip().lower() in ["pm", "projectmgr.", "projectmgr", "project manager"]), None)
-
-if job_no_col is None or pm_col is None:
-    raise ValueError("Could not find 'Job No.' and 'PM' columns in Projects list file.")
-
-df_pm = df_pm[[job_no_col, pm_col]].copy()
-df_pm[job_no_col] = df_pm[job_no_col].apply(norm_job_no).astype(str).str.strip()
-df_pm[pm_col] = df_pm[pm_col].astype(str).str.strip().str.title()
+# Projects list "Job No." (normalized to xx.xx) -> "PM" first name, parsed once and cached (reference_data.py)
+pm_first_names = project_managers(pm_file_path)
 
 # Map first names to the same full names you currently output
 first_name_to_full = {
@@ -1418,56 +1212,27 @@ first_name_to_full = {
 }
 
 # Build lookup: Job No. (xx.xx) -> PM full name
-pm_dict = {}
-for _, r in df_pm.iterrows():
-    job_no = r[job_no_col]
-    pm_first = r[pm_col]
-    full = first_name_to_full.get(pm_first, pm_first)  # if unknown, leave as-is
-    pm_dict[job_no] = full
+pm_dict = {
+    job_no: first_name_to_full.get(pm_first, pm_first)  # if unknown, leave as-is
+    for job_no, pm_first in pm_first_names.items()
+}
 
 print("INFO: Processing PM assignments from Projects list...")
 
 # Replace ordered_by with PM Full Name from Projects list (fallback to existing if not found)
-df_po["ordered_by"] = df_po["Job_Number"].map(pm_dict).fillna(df_po["ordered_by"]).fillna("")
+df_po["ordered_by"] = assign_ordered_by(df_po, pm_dict)
 
 # -------------------------------
 # ROUTING CODE BASED ON NEW ordered_by
 # -------------------------------
 print("INFO: Processing routing codes...")
-df_routing = pd.read_excel(routing_path)
-
-df_routing["Ordered By"] = df_routing["Ordered By"].astype(str).str.strip().str.upper()
-df_routing["Distribution"] = df_routing["Distribution"].astype(str).str.strip().str.upper()
-df_routing["Code"] = df_routing["Code"].astype(str).str.strip()
-
-# Build routing lookup dictionary
-routing_dict = {}
-for _, row in df_routing.iterrows():
-    ordered_by = row["Ordered By"]
-    distribution = row["Distribution"]
-    code = row["Code"]
-    
-    if ordered_by and distribution and code:
-        key = (ordered_by, distribution)
-        routing_dict[key] = code
+# (ORDERED BY, DISTRIBUTION) -> Code, parsed once and cached (reference_data.py)
+routing_dict = routing_codes(routing_path)
 
 print(f"INFO: Built routing lookup with {len(routing_dict)} entries")
 
-# Apply routing codes
-routing_codes = []
-for _, row in tqdm(df_po.iterrows(), desc="Applying routing codes", total=len(df_po)):
-    ordered_by = str(row["ordered_by"]).strip().upper()
-    distribution_code = str(row["distribution_code"]).strip().upper()
-    
-    if ordered_by and distribution_code:
-        key = (ordered_by, distribution_code)
-        routing_code = routing_dict.get(key, "")
-    else:
-        routing_code = ""
-    
-    routing_codes.append(routing_code)
-
-df_po["routing_code"] = routing_codes
+# Apply routing codes: one left join of (ordered_by, distribution_code) against the lookup
+df_po["routing_code"] = assign_routing_codes(df_po, routing_dict)
 
 # -------------------------------
 # SAVE THE FINAL PO VERIFIED FILE
@@ -1541,7 +1306,8 @@ logo_template = cv2.imread(logo_template_path, 0)
 
 # Cell 3: Detect Logo Using Template Matching
 def page_has_logo_template(image_path, template=logo_template, threshold=0.20):
-    image = cv2.imread(image_path, 0)
+    # Accepts a file path or an already decoded grayscale page
+    image = cv2.imread(image_path, 0) if isinstance(image_path, str) else image_path
     if image is None or template is None:
         return False
 
@@ -1554,24 +1320,22 @@ def pdf_to_images_logo_filtered(pdf_folder, output_folder, valid_files_list):
     os.makedirs(output_folder, exist_ok=True)
     valid_image_paths = []
 
-    for file in os.listdir(pdf_folder):
+    for file in list_dir(pdf_folder):
         if file not in valid_files_list:
             continue
 
         if file.lower().endswith(".pdf"):
             pdf_path = os.path.join(pdf_folder, file)
-            doc = fitz.open(pdf_path)
             base_name = os.path.splitext(file)[0]
 
-            for i, page in enumerate(doc):
+            # Pages come from the shared raster cache; only pages with the logo are written out
+            for i in range(page_count(pdf_path)):
                 img_path = os.path.join(output_folder, f"{base_name}_page_{i+1}.png")
-                pix = page.get_pixmap(dpi=250)
-                pix.save(img_path)
+                page_image = get_page(pdf_path, i, dpi=250)
 
-                if page_has_logo_template(img_path):
+                if page_has_logo_template(np.asarray(page_image.convert("L"))):
+                    page_image.save(img_path)
                     valid_image_paths.append(img_path)
-                else:
-                    os.remove(img_path)
 
     return valid_image_paths
 
@@ -1688,11 +1452,12 @@ def process_po_folder(pdf_folder, image_folder, cropped_folder, text_output_fold
 
 # Cell 7: Example Run (Updated paths)
 process_po_folder(
-    pdf_folder=PROJECTS_PATH if PROJECTS_PATH else "data/network_fallback/",
+    pdf_folder=projects_read_path() or "data/network_fallback/",
 image_folder=r"data/image_of_pos",
 cropped_folder=r"data/cropped_images",
 text_output_folder=r"data/po_ocr_output"
 )
+report_cache_stats("Page raster cache after PO table OCR")
 
 import os
 import re
@@ -1793,6 +1558,47 @@ df = pd.DataFrame(results)
 df.to_csv(output_path, index=False)
 print(f"SUCCESS: Extraction completed. Results saved to {output_path}")
 
+
+import pandas as pd
+import json
+import os
+
+# === File paths ===
+vendor_csv_path = "data/Vendor_List.csv"
+pixtral_csv_path = "outputs/excel_files/pixtral_po_results.csv"
+json_folder = "data/processed"
+
+# === Load CSVs ===
+# Same parsed vendor list the matching step used (cached in vendor_index.py)
+vendor_df = load_vendor_data(vendor_csv_path)["vendor_df"]
+
+# Use the updated PO data instead of the original
+pixtral_df = updated_pixtral_df
+pixtral_df["file_base"] = pixtral_df["file_name"].apply(lambda x: os.path.splitext(x)[0])
+
+# === Index the vendor list by Vendor_Code and the PO results by file once (gl_enrichment.py) ===
+from gl_enrichment import vendor_gl_table, po_flag_table, enrich_invoices, report_gl_timing
+from approval_gate import queue_batches
+vendor_gl = vendor_gl_table(vendor_df)
+po_flags = po_flag_table(pixtral_df)
+
+# === Enrich each invoice as soon as its vendor is approved ===
+print("INFO: PO stages finished. Enriching invoices as their vendors are approved...")
+enriched_count = 0
+for txt_files in queue_batches(approved_vendor_queue):
+    json_files = [os.path.splitext(txt_file)[0] + ".json" for txt_file in txt_files]
+    enriched_count += enrich_invoices(json_files, vendor_gl, po_flags, json_folder)
+report_gl_timing()
+deferred_invoices = {os.path.splitext(f)[0] for f in vendor_review_future.result()}
+deferred_invoices.update(deferred_po_invoices)
+
+if not any(record.get("status") == APPROVED for record in load_records("vendor").values()):
+    print("WARNING: No matches approved. Stopping processing.")
+    exit(0)
+if deferred_invoices:
+    print(f"INFO: {len(deferred_invoices)} deferred invoice(s) are left out of this run: {sorted(deferred_invoices)}")
+print("SUCCESS: Processing complete!")
+
 import os
 import json
 import pandas as pd
@@ -1805,7 +1611,7 @@ json_folder = 'data/processed'  # Change path if needed
 all_data = []
 
 for file_name in tqdm(os.listdir(json_folder)):
-    if file_name.endswith('.json'):
+    if file_name.endswith('.json') and os.path.splitext(file_name)[0] not in deferred_invoices:
         with open(os.path.join(json_folder, file_name), 'r') as f:
             data = json.load(f)
             if isinstance(data, dict):
@@ -2114,7 +1920,7 @@ else:
             print(f"Found {len(df_for_renaming)} invoice records")
             
             # Get list of files in preview_storage
-            preview_files = [f for f in os.listdir(preview_storage) if f.lower().endswith(('.pdf', '.PDF'))]
+            preview_files = [f for f in list_dir(preview_storage) if f.lower().endswith(('.pdf', '.PDF'))]
             print(f"Found {len(preview_files)} PDF files in preview_storage")
             
             renamed_count = 0
@@ -2175,6 +1981,7 @@ else:
                             counter += 1
                     
                     os.rename(old_file_path, new_file_path)
+                    invalidate(preview_storage)
                     print(f"✅ Renamed: {matching_file} → {new_filename}")
                     renamed_count += 1
 
@@ -2223,7 +2030,9 @@ import os
 # Load required files
 invoice_df = pd.read_excel("outputs/excel_files/final_invoice_data.xlsx")
 po_verified_df = pd.read_csv("outputs/excel_files/po_verified.csv")
-tax_code_df = pd.read_excel("outputs/excel_files/filtered_tax_percentages_with_codes.xlsx")
+# Tax % (4 places) -> Tax Code, parsed once and cached (reference_data.py)
+from reference_data import tax_codes
+tax_code_map = tax_codes("outputs/excel_files/filtered_tax_percentages_with_codes.xlsx")
 
 # Check if PO lines file exists and has data
 po_lines_file = "data/po_ocr_extracted/final_extracted.csv"
@@ -2296,7 +2105,7 @@ for _, inv_row in invoice_df.iterrows():
         header_filename = expected_name_hdr2
         try:
             if os.path.isdir(preview_storage_hdr2):
-                files_hdr2 = [fn for fn in os.listdir(preview_storage_hdr2) if fn.lower().endswith(('.pdf', '.PDF'))]
+                files_hdr2 = [fn for fn in list_dir(preview_storage_hdr2) if fn.lower().endswith(('.pdf', '.PDF'))]
                 if expected_name_hdr2 not in files_hdr2:
                     candidates2 = [fn for fn in files_hdr2 if fn.startswith(expected_name_hdr2[:-4])]
                     if candidates2:
@@ -2347,8 +2156,7 @@ for _, inv_row in invoice_df.iterrows():
     else:
         tax_percent = 0.00
     
-    tax_code_lookup = tax_code_df.loc[round(tax_code_df["Tax %"], 4) == round(tax_percent, 4), "Tax Code"]
-    tax_code = tax_code_lookup.iloc[0] if not tax_code_lookup.empty else f"{tax_percent:.4f}%"
+    tax_code = tax_code_map.get(round(tax_percent, 4), f"{tax_percent:.4f}%")
 
     # Header Line
     header = [
@@ -2500,15 +2308,9 @@ source_df = pd.read_excel(source_path)
 po_verified_df = pd.read_csv("outputs/excel_files/po_verified.csv")
 print(f"Loaded po_verified.csv with {len(po_verified_df)} records for routing codes")
 
-# Build GL→Item map (robust to single-column CSV)
-gl_item_df = pd.read_csv(gl_item_code_path, sep=",", header=0)
-gl_item_df.columns = gl_item_df.columns.str.strip()
-if gl_item_df.shape[1] == 1:
-    gl_item_df = gl_item_df.iloc[:, 0].str.split(",", expand=True)
-    gl_item_df.columns = ["G/L Code", "Item_Code"]
-gl_item_df["G/L Code"] = gl_item_df["G/L Code"].astype(str).str.strip()
-gl_item_df["Item_Code"] = gl_item_df["Item_Code"].astype(str).str.strip()
-gl_to_item_map = dict(zip(gl_item_df["G/L Code"], gl_item_df["Item_Code"]))
+# GL→Item map (robust to single-column CSV), parsed once and cached (reference_data.py)
+from reference_data import gl_item_codes
+gl_to_item_map = gl_item_codes(gl_item_code_path)
 
 # Defaults
 for cc_col, default in [("Liability_Cost_Center","1000"), ("Expense_Cost_Center","1000")]:
@@ -2688,7 +2490,7 @@ with open(out_txt_path, "w", newline="", encoding="utf-8") as f:
             # If exact file not present (e.g., dedup suffix), try to find closest match
             try:
                 if os.path.isdir(preview_storage_hdr):
-                    files_hdr = [fn for fn in os.listdir(preview_storage_hdr) if fn.lower().endswith(('.pdf', '.PDF'))]
+                    files_hdr = [fn for fn in list_dir(preview_storage_hdr) if fn.lower().endswith(('.pdf', '.PDF'))]
                     if expected_name_hdr not in files_hdr:
                         candidates = [fn for fn in files_hdr if fn.startswith(expected_name_hdr[:-4])]
                         if candidates:
@@ -2815,6 +2617,7 @@ import os
 # List of folders to clear
 folders_to_clear = [
     "data/cropped_images",
+    "data/OCR_word_boxes",
     "data/image_of_pos",
     "data/OCR_text_Test",
     "data/po_ocr_output",
@@ -2828,6 +2631,9 @@ for folder in folders_to_clear:
         print(f"Clearing folder: {folder}")
         for filename in os.listdir(folder):
             file_path = os.path.join(folder, filename)
+            if folder == "data/raw_pdfs" and os.path.splitext(filename)[0] in deferred_invoices:
+                print(f"Kept deferred invoice for the next run: {file_path}")
+                continue
             try:
                 if os.path.isfile(file_path):
                     os.remove(file_path)
@@ -2897,7 +2703,7 @@ def rename_preview_storage_files():
         print(f"Found {len(df)} invoice records")
         
         # Get list of files in preview_storage
-        preview_files = [f for f in os.listdir(preview_storage) if f.lower().endswith(('.pdf', '.PDF'))]
+        preview_files = [f for f in list_dir(preview_storage) if f.lower().endswith(('.pdf', '.PDF'))]
         print(f"Found {len(preview_files)} PDF files in preview_storage")
         
         renamed_count = 0
@@ -2958,6 +2764,7 @@ def rename_preview_storage_files():
                         counter += 1
                 
                 os.rename(old_file_path, new_file_path)
+                invalidate(preview_storage)
                 print(f"✅ Renamed: {matching_file} → {new_filename}")
                 renamed_count += 1
 
@@ -3038,7 +2845,8 @@ def save_invoices_to_network():
     try:
         # Read the vendor mapping file
         print(f"Reading vendor mapping file: {vendor_mapping_file}")
-        vendor_df = pd.read_excel(vendor_mapping_file)
+        from reference_data import load_reference, vendor_folders
+        vendor_df = load_reference("vendor_folders", vendor_mapping_file)
         print(f"Found {len(vendor_df)} vendor mappings")
         
         # Read the invoice data file
@@ -3063,12 +2871,7 @@ def save_invoices_to_network():
             return False
         
         # Create vendor code to folder mapping
-        vendor_mapping = {}
-        for index, row in vendor_df.iterrows():
-            vendor_code = str(row['vendor_code']).strip()
-            folder_name = str(row['folder_name']).strip()
-            if vendor_code and folder_name and vendor_code != 'nan' and folder_name != 'nan':
-                vendor_mapping[vendor_code] = folder_name
+        vendor_mapping = vendor_folders(vendor_mapping_file)
         
         print(f"Created mapping for {len(vendor_mapping)} vendors")
         
@@ -3080,9 +2883,13 @@ def save_invoices_to_network():
         except ImportError:
             print("WARNING: Could not import network_config, using default path")
             network_base_path = "\\\\192.168.1.130\\Accounting\\Accounts Payable\\JOB UPLOADED\\"
+
+        if not is_server_reachable(NETWORK_CONFIG.get("accounting_server", "192.168.1.130")):
+            print(f"❌ Accounting server not reachable, invoices not saved to {network_base_path}")
+            return False
         
         # Get list of files in preview_storage
-        preview_files = [f for f in os.listdir(preview_storage) if f.lower().endswith(('.pdf', '.PDF'))]
+        preview_files = [f for f in list_dir(preview_storage) if f.lower().endswith(('.pdf', '.PDF'))]
         print(f"Found {len(preview_files)} PDF files in preview_storage")
         
         saved_count = 0
@@ -3156,6 +2963,7 @@ def save_invoices_to_network():
                 # Copy file to network location
                 source_file = os.path.join(preview_storage, matching_file)
                 shutil.copy2(source_file, network_dest_file)
+                invalidate(network_dest_folder)
                 
                 print(f"✅ Saved to network: {matching_file} → {vendor_folder}/{os.path.basename(network_dest_file)}")
                 saved_count += 1
@@ -3194,4 +3002,7 @@ print("\n" + "="*60)
 print("FINAL EXECUTION SUMMARY")
 print("="*60)
 print(f"Network Storage: {'✅ SUCCESS' if network_success else '❌ FAILED'}")
+report_listing_stats("Directory listings this run")
+from reference_data import report_reference_loads
+report_reference_loads()
 print("="*60)
@@ -0,0 +1,225 @@
+# Page Raster Cache for Invoice Processing Pipeline
+# This file renders each PDF page once at a base DPI and serves every stage from it:
+# DocTR OCR, the Pixtral PO request and PO logo detection. Lower DPIs are derived by
+# downsampling the base render. Pages are kept in a bounded in-memory LRU and as PNG
+# files under data/cache/rasters, keyed by (PDF content hash, page, DPI).
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+PAGE_RASTER_CONFIG = {
+    "cache_folder": "data/cache/rasters",
+    "base_dpi": 250,                       # highest DPI any stage asks for (logo detection)
+    "memory_bytes": 512 * 1024 * 1024,
+    "disk_bytes": 2 * 1024 * 1024 * 1024,
+    "png_compress_level": 1,               # fast PNG; document pages still compress well
+}
+
+_memory = OrderedDict()        # (digest, page, dpi) -> Image ("L" when the page has no color)
+_memory_bytes = 0
+_digests = {}                  # (abspath, size, mtime_ns) -> sha256
+_disk_bytes = None
+_lock = threading.RLock()
+_stats = {"memory_hits": 0, "derived": 0, "disk_hits": 0, "renders": 0, "render_seconds": 0.0}
+
+def pdf_digest(pdf_path):
+    """Content hash of a PDF, memoized on path, size and mtime"""
+    stat = os.stat(pdf_path)
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns)
+    digest = _digests.get(key)
+    if digest is None:
+        with open(pdf_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        _digests[key] = digest
+    return digest
+
+def page_count(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+def _compact(image):
+    """Store pages without color as single-channel images (a third of the memory and disk)"""
+    pixels = np.asarray(image)
+    if (pixels[..., 0] == pixels[..., 1]).all() and (pixels[..., 1] == pixels[..., 2]).all():
+        return Image.fromarray(pixels[..., 0], "L")
+    return image
+
+def _image_bytes(image):
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+def _remember(key, image):
+    global _memory_bytes
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return
+        _memory[key] = image
+        _memory_bytes += _image_bytes(image)
+        while _memory_bytes > PAGE_RASTER_CONFIG["memory_bytes"] and len(_memory) > 1:
+            _, evicted = _memory.popitem(last=False)
+            _memory_bytes -= _image_bytes(evicted)
+
+def _recall(key):
+    with _lock:
+        image = _memory.get(key)
+        if image is not None:
+            _memory.move_to_end(key)
+        return image
+
+def _disk_path(digest, page_number, dpi):
+    return os.path.join(PAGE_RASTER_CONFIG["cache_folder"], digest[:2], f"{digest}_p{page_number}_{dpi}.png")
+
+def _disk_usage():
+    global _disk_bytes
+    if _disk_bytes is None:
+        _disk_bytes = 0
+        for root, _, files in os.walk(PAGE_RASTER_CONFIG["cache_folder"]):
+            _disk_bytes += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return _disk_bytes
+
+def _trim_disk():
+    """Delete the least recently used PNGs until the cache fits its disk budget"""
+    global _disk_bytes
+    if _disk_usage() <= PAGE_RASTER_CONFIG["disk_bytes"]:
+        return
+    entries = []
+    for root, _, files in os.walk(PAGE_RASTER_CONFIG["cache_folder"]):
+        for name in files:
+            path = os.path.join(root, name)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()
+    _disk_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in entries:
+        if _disk_bytes <= PAGE_RASTER_CONFIG["disk_bytes"] * 0.9:
+            break
+        try:
+            os.remove(path)
+            _disk_bytes -= size
+        except OSError:
+            pass
+
+def _load_disk(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with Image.open(path) as image:
+            image.load()
+        os.utime(path, None)   # mtime doubles as the LRU clock
+        return image
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable cached page {path}: {e}")
+        return None
+
+def _save_disk(path, image):
+    global _disk_bytes
+    try:
+        _disk_usage()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        image.save(tmp_path, "PNG", compress_level=PAGE_RASTER_CONFIG["png_compress_level"])
+        os.replace(tmp_path, path)
+        with _lock:
+            _disk_bytes += os.path.getsize(path)
+            _trim_disk()
+    except OSError as e:
+        print(f"WARNING: Could not cache page raster {path}: {e}")
+
+def _render(pdf_path, page_number, dpi):
+    start = time.perf_counter()
+    with fitz.open(pdf_path) as doc:
+        if page_number >= doc.page_count:
+            raise ValueError(f"Page {page_number + 1} requested, PDF has {doc.page_count} page(s).")
+        pix = doc.load_page(page_number).get_pixmap(dpi=dpi, colorspace=fitz.csRGB, alpha=False)
+    image = _compact(Image.frombytes("RGB", (pix.width, pix.height), pix.samples))
+    with _lock:
+        _stats["renders"] += 1
+        _stats["render_seconds"] += time.perf_counter() - start
+    return image
+
+def _base_page(pdf_path, digest, page_number):
+    """The base-DPI render of a page from memory, disk or a fresh render; returns (image, source)"""
+    base_dpi = PAGE_RASTER_CONFIG["base_dpi"]
+    key = (digest, page_number, base_dpi)
+    image = _recall(key)
+    if image is not None:
+        return image, "memory"
+
+    path = _disk_path(digest, page_number, base_dpi)
+    image = _load_disk(path)
+    source = "disk"
+    if image is None:
+        image = _render(pdf_path, page_number, base_dpi)
+        _save_disk(path, image)
+        source = "render"
+    _remember(key, image)
+    return image, source
+
+def get_page(pdf_path, page_number=0, dpi=200, return_source=False):
+    """
+    Return page page_number of a PDF as an RGB PIL image at dpi.
+    DPIs up to the base DPI are cut from the cached base render; higher DPIs are rendered directly.
+    With return_source, returns (image, source) where source is memory, derived, disk or render.
+    """
+    digest = pdf_digest(pdf_path)
+    key = (digest, page_number, dpi)
+    image = _recall(key)
+    source = "memory"
+
+    if image is None:
+        if dpi > PAGE_RASTER_CONFIG["base_dpi"]:
+            image, source = _render(pdf_path, page_number, dpi), "render"
+        else:
+            image, source = _base_page(pdf_path, digest, page_number)
+            if dpi != PAGE_RASTER_CONFIG["base_dpi"]:
+                scale = dpi / PAGE_RASTER_CONFIG["base_dpi"]
+                image = image.resize((max(1, round(image.size[0] * scale)), max(1, round(image.size[1] * scale))),
+                                     Image.LANCZOS)
+                source = "derived" if source == "memory" else source
+        _remember(key, image)
+
+    if source != "render":   # renders are counted in _render
+        with _lock:
+            _stats[{"memory": "memory_hits", "derived": "derived", "disk": "disk_hits"}[source]] += 1
+
+    image = image.convert("RGB") if image.mode != "RGB" else image
+    return (image, source) if return_source else image
+
+def get_pages(pdf_path, dpi=200):
+    """Every page of a PDF at dpi, in order"""
+    return [get_page(pdf_path, page_number, dpi) for page_number in range(page_count(pdf_path))]
+
+def cache_stats():
+    with _lock:
+        lookups = _stats["memory_hits"] + _stats["derived"] + _stats["disk_hits"] + _stats["renders"]
+        return dict(_stats, lookups=lookups, memory_bytes=_memory_bytes, disk_bytes=_disk_usage(),
+                    hit_rate=(lookups - _stats["renders"]) / lookups if lookups else 0.0)
+
+def report_cache_stats(label="Page raster cache"):
+    stats = cache_stats()
+    if not stats["lookups"]:
+        return
+    print(f"INFO: {label}: {stats['lookups']} page lookups, hit rate {stats['hit_rate']:.1%} "
+          f"(memory {stats['memory_hits']}, derived {stats['derived']}, disk {stats['disk_hits']}, "
+          f"renders {stats['renders']} in {stats['render_seconds']:.1f} s); "
+          f"memory {stats['memory_bytes'] / 1024 / 1024:.0f} MB, disk {stats['disk_bytes'] / 1024 / 1024:.0f} MB")
+
+if __name__ == "__main__":
+    import sys
+
+    print("=== Page Raster Cache Report ===")
+    pdf_folder = sys.argv[1] if len(sys.argv) > 1 else "data/raw_pdfs"
+    pdfs = [os.path.join(pdf_folder, f) for f in sorted(os.listdir(pdf_folder)) if f.lower().endswith(".pdf")]
+    # The pipeline's access pattern: DocTR (144 dpi, every page), Pixtral (200 dpi, page one), logo scan (250 dpi)
+    for dpi, pages in [(144, None), (200, [0]), (250, None)]:
+        for pdf_path in pdfs:
+            for page_number in pages if pages is not None else range(page_count(pdf_path)):
+                get_page(pdf_path, page_number, dpi)
+    report_cache_stats()
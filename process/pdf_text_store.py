@@ -0,0 +1,92 @@
+# PDF Text Store for Invoice Processing Pipeline
+# This file keeps the extracted text of the PO PDFs on the projects share, so each file
+# version is read from the share and extracted at most once across runs. Texts are stored
+# zlib-compressed, one blob per (path, size, mtime), under data/cache/pdf_text and read
+# back through mmap; nothing is held in memory between calls, so resident memory does not
+# grow with the size of the share. PO verification and the job-number backfill both read it.
+
+import os
+import zlib
+import mmap
+import hashlib
+
+import fitz  # PyMuPDF
+
+PDF_TEXT_STORE_CONFIG = {
+    "store_folder": "data/cache/pdf_text",
+    "compress_level": 6,
+}
+
+_stats = {"hits": 0, "extracted": 0}
+
+def text_key(pdf_path, size, mtime):
+    return hashlib.sha1(f"{os.path.normcase(os.path.abspath(pdf_path))}|{size}|{int(mtime)}".encode("utf-8")).hexdigest()
+
+def _blob_path(key):
+    return os.path.join(PDF_TEXT_STORE_CONFIG["store_folder"], key[:2], f"{key}.z")
+
+def extract_pdf_text(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return "".join(page.get_text() for page in doc)
+
+def load_text(pdf_path, size, mtime):
+    """Stored text for this version of the PDF, or None"""
+    path = _blob_path(text_key(pdf_path, size, mtime))
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as blob:
+            return zlib.decompress(blob).decode("utf-8")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, zlib.error) as e:
+        print(f"WARNING: Ignoring unreadable stored text {path}: {e}")
+        return None
+
+def save_text(pdf_path, size, mtime, text):
+    path = _blob_path(text_key(pdf_path, size, mtime))
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(text.encode("utf-8"), PDF_TEXT_STORE_CONFIG["compress_level"]))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARNING: Could not store PDF text {path}: {e}")
+
+def discard_text(pdf_path, size, mtime):
+    """Remove the stored text of a PDF version that was changed or deleted"""
+    try:
+        os.remove(_blob_path(text_key(pdf_path, size, mtime)))
+    except OSError:
+        pass
+
+def get_text(pdf_path, size=None, mtime=None, return_source=False):
+    """
+    Text of a PDF from the store, extracting and storing it when this version is not stored yet.
+    Pass size and mtime from a directory listing to avoid a stat on the share.
+    With return_source, returns (text, source) where source is "store" or "extracted".
+    """
+    if size is None or mtime is None:
+        stat = os.stat(pdf_path)
+        size, mtime = stat.st_size, stat.st_mtime
+    text = load_text(pdf_path, size, mtime)
+    source = "store"
+    if text is None:
+        text = extract_pdf_text(pdf_path)
+        save_text(pdf_path, size, mtime, text)
+        source = "extracted"
+    _stats["hits" if source == "store" else "extracted"] += 1
+    return (text, source) if return_source else text
+
+def store_stats():
+    """Lookups in this process, and the store's size on disk"""
+    blobs = disk_bytes = 0
+    for root, _, files in os.walk(PDF_TEXT_STORE_CONFIG["store_folder"]):
+        blobs += len(files)
+        disk_bytes += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return dict(_stats, blobs=blobs, disk_bytes=disk_bytes)
+
+if __name__ == "__main__":
+    print("=== PDF Text Store ===")
+    stats = store_stats()
+    print(f"INFO: {stats['blobs']} stored texts, {stats['disk_bytes'] / 1024 / 1024:.1f} MB on disk "
+          f"in {PDF_TEXT_STORE_CONFIG['store_folder']}")
@@ -0,0 +1,338 @@
+# PO Extraction Rules for Invoice Processing Pipeline
+# This file holds the PO cleaning and classification rules, and a text-first detector
+# that reads the customer PO from the DocTR OCR text and word boxes. Pixtral is only
+# asked when the text gives no confident candidate.
+
+import os
+import re
+import zlib
+
+import numpy as np
+import pandas as pd
+
+PO_TEXT_CONFIG = {
+    "ocr_text_folder": "data/OCR_text_Test",
+    "max_line_gap": 1,             # a label alone on its line may have its value on the next line
+    "audit_fraction": 0.10,        # share of text-resolved invoices still sent to Pixtral to measure agreement
+}
+
+COMMON_PO_SKIP_WORDS = {"description", "amount", "invoice", "sales", "total", "terms", "date"}
+
+# Customer PO labels in OCR text; longer forms first so "PO Number" is consumed whole
+PO_LABEL_PATTERN = re.compile(
+    r"\b(?:customer\s*p\.?\s*o\.?|cust\.?\s*p\.?\s*o\.?|purchase\s*order|p\.?\s*o\.?(?=\s*(?:#|no\b|num|number\b|:)))"
+    r"(?:\s*(?:#|no\.?|num(?:ber)?\.?))?\s*[:#\-]*\s*",
+    re.IGNORECASE,
+)
+LABEL_FILLER_WORDS = {"#", "no", "no.", "num", "number", ":", "-"}
+PAGE_MARKER = re.compile(r"^-+\s*page\s+\d+\s*-+$", re.IGNORECASE)
+
+# PO rule patterns, compiled once and shared by the per-value and DataFrame versions
+VALID_PO_PATTERNS = [re.compile(r"\d{4,6}"), re.compile(r"\d{2}\.\d{2,3}"), re.compile(r"[A-Z0-9\- ]{3,}")]
+PO_HASH_PATTERN = re.compile(r"PO\s+#(\d+)", re.IGNORECASE)
+PO_LABEL_PREFIXES = [
+    re.compile(r"\bPO\s*NUMBER\s*[:\-]?\s*", re.IGNORECASE),
+    re.compile(r"\bCUSTOMER\s*PO\s*[:\-]?\s*", re.IGNORECASE),
+    re.compile(r"\bPURCHASE\s*ORDER\s*[:\-]?\s*", re.IGNORECASE),
+    re.compile(r"\bCUSTOMER\s*ORDER\s*NUMBER\s*[:\-]?\s*", re.IGNORECASE),
+]
+PO_TOKEN_SEPARATORS = re.compile(r"[\n,:;\-]+")
+PO_NUMBER_PATTERN = re.compile(r"\d{4}")
+WO_NUMBER_PATTERN = re.compile(r"\d{5}")
+JOB_NUMBER_PATTERN = re.compile(r"^(\d{2})[.\-,\s,]{1,3}(\d{2,3})([\s\-–]*[A-Za-z].*)?$")
+FLOAT_IDENTIFIER_PATTERN = re.compile(r"(\d+)\.0")
+FLOAT_SUFFIX_PATTERN = re.compile(r"\.0$")
+
+# --- Existing PO rules (formerly inline in the pipeline script) ---
+def is_valid_po(candidate: str) -> bool:
+    candidate = candidate.strip().upper()
+    if candidate.lower() in COMMON_PO_SKIP_WORDS:
+        return False
+    return any(pattern.fullmatch(candidate) for pattern in VALID_PO_PATTERNS)
+
+def clean_po_value(raw_text):
+    if not raw_text:
+        return ""
+    text = raw_text.strip().upper()
+
+    # Handle PO # pattern (with space) - extract just the number
+    po_hash_match = PO_HASH_PATTERN.search(text)
+    if po_hash_match:
+        return po_hash_match.group(1)
+
+    # Updated cleaning logic (safe)
+    for prefix in PO_LABEL_PREFIXES:
+        text = prefix.sub("", text)
+
+    tokens = PO_TOKEN_SEPARATORS.split(text)
+    for token in tokens:
+        token = token.strip()
+        if is_valid_po(token):
+            return token
+    if is_valid_po(text):
+        return text
+    return ""
+
+
+def classify_po(value):
+    try:
+        val = str(value).strip()
+
+        # Case 1: 4-digit number → PO_Number
+        if PO_NUMBER_PATTERN.fullmatch(val):
+            return val, '', '', ''
+
+        # Case 2: 5-digit number → WO_Number
+        if WO_NUMBER_PATTERN.fullmatch(val):
+            return '', '', val, ''
+
+        # Case 3: Job number with optional suffix (e.g., 24.60, 24-60, 24 60, 24,01, 24, 01, 22.82-W, 24.09 - Joey Restaurant)
+        job_match = JOB_NUMBER_PATTERN.match(val)
+        if job_match:
+            part1 = job_match.group(1)
+            part2 = job_match.group(2)
+            return '', f'{part1}.{part2}', '', ''
+
+        # Case 4: Everything else → Remarks
+        return '', '', '', val
+
+    except Exception as e:
+        return '', '', '', value
+
+def classify_po_frame(values):
+    """
+    classify_po over a whole column at once: returns a DataFrame with PO_Number, Job_Number,
+    WO_Number and Remarks, row for row identical to applying classify_po to each value.
+    """
+    vals = pd.Series(values, dtype=object).map(str).str.strip()
+    is_po = vals.str.fullmatch(PO_NUMBER_PATTERN)
+    is_wo = ~is_po & vals.str.fullmatch(WO_NUMBER_PATTERN)
+    job = vals.str.extract(JOB_NUMBER_PATTERN)
+    is_job = ~is_po & ~is_wo & job[0].notna()
+    return pd.DataFrame({
+        "PO_Number": vals.where(is_po, ""),
+        "Job_Number": (job[0] + "." + job[1]).where(is_job, ""),
+        "WO_Number": vals.where(is_wo, ""),
+        "Remarks": vals.where(~(is_po | is_wo | is_job), ""),
+    }, index=vals.index)
+
+def clean_identifier(val):
+    try:
+        if pd.isna(val) or val == "":
+            return ""
+        val = str(val).strip()
+
+        # Fix for numbers like 13511.0 → "13511"
+        if FLOAT_IDENTIFIER_PATTERN.fullmatch(val):
+            val = val.split(".")[0]
+
+        return val
+    except:
+        return str(val)
+
+def _number_text(val, decimals):
+    if decimals is None:
+        # Whole numbers lose their ".0" ("13511.0" -> "13511"); anything else is kept as is
+        try:
+            num = float(val)
+        except (TypeError, ValueError):
+            return str(val)
+        return str(int(num)) if num.is_integer() else str(val)
+    # Fixed decimals ("24.6" -> "24.60"); text that is not a number is kept, stripped
+    text = FLOAT_SUFFIX_PATTERN.sub("", str(val).strip())
+    try:
+        return f"{float(text):.{decimals}f}"
+    except (TypeError, ValueError):
+        return text
+
+def normalize_numbers(values, decimals=None):
+    """
+    Normalize a column of PO, job or WO numbers to strings in one pass.
+    decimals=None drops the ".0" of whole numbers (PO, job and WO numbers read from CSV);
+    decimals=2 formats job numbers as xx.xx for the Project List lookup.
+    Each distinct value is formatted once and the results are spread back with pd.factorize,
+    so the cost grows with the number of distinct values, not with the number of rows.
+    """
+    values = pd.Series(values, dtype=object)
+    codes, uniques = pd.factorize(values)
+    formatted = pd.Index(uniques, dtype=object).map(lambda v: _number_text(v, decimals))
+    # The trailing slot is picked by missing values (code -1), which are formatted one by one below:
+    # factorize folds None and NaN together, and they format differently ("None" vs "nan")
+    lookup = np.append(formatted.to_numpy(dtype=object), None)
+    result = pd.Series(lookup[codes], index=values.index, dtype=object)
+    missing = codes == -1
+    result[missing] = values[missing].map(lambda v: _number_text(v, decimals))
+    return result
+
+# --- Text-first detection ---
+def _first_value(text):
+    """First token after a label, skipping label filler such as '#', 'No.' or 'Number'"""
+    for token in text.split():
+        token = token.strip(":#")
+        if token and token.lower() not in LABEL_FILLER_WORDS:
+            return token
+    return ""
+
+def text_po_candidates(ocr_text):
+    """Values written after a PO label in the OCR text, in reading order, with where they were found"""
+    lines = [line.strip() for line in str(ocr_text).splitlines()]
+    lines = [line for line in lines if line and not PAGE_MARKER.match(line)]
+    candidates = []
+    for i, line in enumerate(lines):
+        for match in PO_LABEL_PATTERN.finditer(line):
+            value = _first_value(line[match.end():])
+            if value:
+                candidates.append((value, "text-line"))
+                continue
+            # Header tables put the value under the label
+            for next_line in lines[i + 1:i + 1 + PO_TEXT_CONFIG["max_line_gap"]]:
+                value = _first_value(next_line)
+                if value:
+                    candidates.append((value, "text-below"))
+                    break
+    return candidates
+
+def box_po_candidates(words):
+    """Values to the right of (or directly under) a PO label in DocTR page-one word boxes"""
+    candidates = []
+    texts = [str(w["text"]).strip() for w in words]
+    for i, text in enumerate(texts):
+        # Word boxes hold single words, so match labels against a short window of following words
+        window = " ".join(texts[i:i + 3])
+        match = PO_LABEL_PATTERN.match(window)
+        if not match or match.start() != 0:
+            continue
+        used = len(window[:match.end()].split())
+        label_box = words[min(i + max(used, 1) - 1, len(words) - 1)]["box"]
+        row_height = label_box[3] - label_box[1]
+
+        right = [w for w in words[i + used:]
+                 if w["box"][0] >= label_box[2] - 0.005 and abs(w["box"][1] - label_box[1]) < row_height * 0.6]
+        below = [w for w in words
+                 if w["box"][1] > label_box[3] and w["box"][1] - label_box[3] < row_height * 2.5
+                 and w["box"][0] < words[i]["box"][2] and w["box"][2] > words[i]["box"][0]]
+        for found, source in [(right, "box-right"), (below, "box-below")]:
+            found = sorted(found, key=lambda w: (w["box"][1], w["box"][0]))
+            value = _first_value(" ".join(str(w["text"]) for w in found[:3]))
+            if value:
+                candidates.append((value, source))
+    return candidates
+
+def detect_po_from_text(ocr_text, words=None):
+    """
+    Return (raw PO, source) when the OCR text names one confident PO, else (None, reason).
+    A candidate is confident when it survives clean_po_value and classify_po files it as a
+    PO, Job or WO number; free-text remarks are left to Pixtral. Conflicting candidates are
+    not resolved here.
+    """
+    candidates = text_po_candidates(ocr_text) + box_po_candidates(words or [])
+    if not candidates:
+        return None, "no label"
+
+    confident = {}
+    for value, source in candidates:
+        if not clean_po_value(value):
+            continue
+        po, job, wo, _ = classify_po(value)
+        if po or job or wo:
+            confident.setdefault((po, job, wo), (value, source))
+    if len(confident) == 1:
+        return next(iter(confident.values()))
+    return None, "conflicting candidates" if confident else "no confident candidate"
+
+def load_ocr_text(pdf_name, ocr_text_folder=None):
+    path = os.path.join(ocr_text_folder or PO_TEXT_CONFIG["ocr_text_folder"], os.path.splitext(pdf_name)[0] + ".txt")
+    if not os.path.exists(path):
+        return ""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+def audit_selected(pdf_name):
+    """Stable sample of text-resolved invoices that still go to Pixtral for the agreement report"""
+    return zlib.crc32(pdf_name.encode("utf-8")) % 1000 < PO_TEXT_CONFIG["audit_fraction"] * 1000
+
+def same_po(a, b):
+    """Two raw PO answers agree when they classify to the same PO/Job/WO/Remarks"""
+    return classify_po(str(a).strip().upper()) == classify_po(str(b).strip().upper())
+
+def report_text_cascade(csv_path, ocr_text_folder=None, word_box_folder=None):
+    """
+    Skip rate of the text cascade and how often it agrees with Pixtral.
+    csv_path is either the PO request log written by the pipeline (po_source, text_po, vision_po)
+    or a pixtral_po_results.csv from a run without the cascade, which is replayed against the OCR text.
+    """
+    from po_vision import load_word_boxes
+
+    rows = pd.read_csv(csv_path, dtype=str).fillna("")
+    if "po_source" not in rows.columns:
+        rows["text_po"] = [
+            detect_po_from_text(load_ocr_text(name, ocr_text_folder), load_word_boxes(name, word_box_folder))[0] or ""
+            for name in rows["file_name"]
+        ]
+        rows["vision_po"] = rows["extracted_po_number"]
+        rows["po_source"] = ["text" if text_po else "vision" for text_po in rows["text_po"]]
+
+    total = len(rows)
+    skipped = int((rows["po_source"] == "text").sum())
+    both = rows[(rows["text_po"] != "") & (rows["vision_po"] != "") & ~rows["vision_po"].str.startswith("ERROR:")]
+    agreed = sum(same_po(t, v) for t, v in zip(both["text_po"], both["vision_po"]))
+
+    print(f"INFO: Invoices: {total}")
+    if total:
+        print(f"INFO: Text cascade skip rate: {skipped / total:.1%} ({skipped} of {total} vision calls avoided)")
+    if len(both):
+        print(f"INFO: Agreement with Pixtral: {agreed / len(both):.1%} ({agreed} of {len(both)})")
+        for t, v, name in zip(both["text_po"], both["vision_po"], both["file_name"]):
+            if not same_po(t, v):
+                print(f"WARNING: {name}: text {t!r} vs Pixtral {v!r}")
+
+def synthetic_po_values(count, seed=0):
+    """Random PO strings shaped like Pixtral answers, including the edge cases of each classify_po rule"""
+    import random
+
+    rng = random.Random(seed)
+    trailers = ["", " ", "\t", ".0"]
+    digits = lambda n: "".join(rng.choice("0123456789") for _ in range(n))
+    shapes = [
+        lambda: digits(rng.choice([3, 4, 5, 6])),
+        lambda: f"{digits(2)}{rng.choice(['.', '-', ',', ' ', ', ', ' - ', '..', '.-.', '....'])}{digits(rng.choice([1, 2, 3, 4]))}",
+        lambda: f"{digits(2)}.{digits(2)}{rng.choice(['-W', ' - Joey Restaurant', ' -', 'A', ' 7', '–B', ''])}",
+        lambda: rng.choice(["", " ", "  "]) + digits(4) + rng.choice(trailers),
+        lambda: rng.choice(["Not Found", "not visible", "", " ", "PO# 1234", "WO 12345", "nan", "١٢٣٤", "24.60\nA"]),
+        lambda: "".join(rng.choice("ABCXYZ0123456789-. #") for _ in range(rng.randint(1, 12))),
+    ]
+    return [rng.choice(shapes)() for _ in range(count)]
+
+def check_classifier(count=100000, seed=0):
+    """Compare classify_po_frame with the per-row classify_po apply on synthetic values and time both"""
+    import time
+
+    values = synthetic_po_values(count, seed)
+    values[:4] = [None, float("nan"), 1234, 24.6]
+
+    start = time.perf_counter()
+    # The pipeline's previous form: one pd.Series per row
+    expected = pd.Series(values, dtype=object).apply(lambda x: pd.Series(classify_po(x)))
+    row_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = classify_po_frame(values)
+    frame_seconds = time.perf_counter() - start
+
+    mismatches = [(v, tuple(e), tuple(a)) for v, e, a in zip(values, expected.values, actual.values)
+                  if [str(x) for x in e] != [str(x) for x in a]]
+    print(f"INFO: classify_po: {len(values) - len(mismatches)} of {len(values)} rows identical; "
+          f"per-row apply {row_seconds:.2f} s, vectorized {frame_seconds:.3f} s ({row_seconds / frame_seconds:.0f}x)")
+    for mismatch in mismatches[:5]:
+        print(f"WARNING: classify_po mismatch: {mismatch}")
+
+    return not mismatches
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--check-classifier":
+        print("=== PO Classifier Check ===")
+        sys.exit(0 if check_classifier(int(sys.argv[2]) if len(sys.argv) > 2 else 100000) else 1)
+
+    print("=== PO Text Cascade Report ===")
+    report_text_cascade(sys.argv[1] if len(sys.argv) > 1 else "outputs/excel_files/pixtral_po_results_requests.csv")
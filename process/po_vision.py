@@ -0,0 +1,412 @@
+# PO Vision Requests for Invoice Processing Pipeline
+# This file renders page one of an invoice, crops it to the region that holds the
+# customer PO, fits the crop to a pixel and JPEG byte budget, and asks Pixtral for
+# the PO number. The full page is sent only when the crop yields nothing.
+
+import os
+import io
+import json
+import time
+import base64
+import asyncio
+import threading
+
+from PIL import Image
+
+from page_raster_cache import get_page
+
+PO_VISION_CONFIG = {
+    "model": "pixtral-12b-2409",
+    "dpi": 200,
+    "word_box_folder": "data/OCR_word_boxes",          # DocTR page-one word boxes, one JSON per PDF
+    "learned_box_path": "data/cache/po_roi_boxes.json",
+    "learned_box_history": 5,                          # union of the last N label boxes per vendor
+    "header_fraction": 0.40,                           # default crop: top of page one
+    "label_pad_left": 0.05,                            # padding around a PO label, as page fractions
+    "label_pad_right": 0.45,                           # values sit to the right of the label...
+    "label_pad_top": 0.03,
+    "label_pad_bottom": 0.10,                          # ...or below it in a header table
+    "max_pixels": 1_200_000,
+    "max_bytes": 180_000,
+    "jpeg_qualities": [85, 75, 65, 55, 45],
+    "max_in_flight": int(os.environ.get("PO_VISION_MAX_IN_FLIGHT", "4")),   # 1 = one PDF at a time
+}
+
+# Word sequences that label the customer PO on vendor invoices
+PO_LABELS = [
+    ["customer", "po"], ["cust", "po"], ["po", "number"], ["po", "#"], ["po#"], ["p.o."], ["p.o"],
+    ["purchase", "order"], ["your", "order"], ["customer", "order"], ["po"],
+]
+
+PO_PROMPT = (
+    "Extract the Customer PO number from this invoice EXACTLY as it appears, preserving all formatting, punctuation, decimal points, spaces, and dashes. "
+    "PO numbers can be: short phrases (e.g., 'SHOP', 'ELECTRIC WALL HTR'), numbers with decimals (e.g., '24.08', '22.82'), or plain numbers (e.g., '1234', '56789'). "
+    "CRITICAL: Do NOT modify, combine, or change the format. If you see '24.08', return '24.08' NOT '2408'. "
+    "Ignore invoice numbers, order numbers, totals, and dates. "
+    "Only return the PO number exactly as written — do not guess, hallucinate, or reformat. If not visible, return 'NOT FOUND'."
+)
+
+# fitz is not thread-safe: page renders done in this process run one at a time
+_local_render = threading.Lock()
+
+# --- Rendering ---
+def render_page(pdf_path, page_number=0, dpi=None, return_source=False):
+    """One PDF page as an RGB PIL image, from the shared page raster cache"""
+    return get_page(pdf_path, page_number, dpi or PO_VISION_CONFIG["dpi"], return_source=return_source)
+
+def jpeg_bytes(image, quality=None):
+    buffer = io.BytesIO()
+    if quality is None:
+        image.save(buffer, "JPEG")
+    else:
+        image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+# --- Word boxes from DocTR ---
+def _word_box_path(pdf_path, folder=None):
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(folder or PO_VISION_CONFIG["word_box_folder"], f"{name}.json")
+
+def save_word_boxes(pdf_path, doctr_page, folder=None):
+    """Store a DocTR page's words with their relative boxes ((x0, y0), (x1, y1) in 0..1)"""
+    words = [
+        {"text": word.value, "box": [word.geometry[0][0], word.geometry[0][1], word.geometry[1][0], word.geometry[1][1]]}
+        for block in doctr_page.blocks
+        for line in block.lines
+        for word in line.words
+    ]
+    path = _word_box_path(pdf_path, folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(words, f)
+
+def load_word_boxes(pdf_path, folder=None):
+    path = _word_box_path(pdf_path, folder)
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable word boxes {path}: {e}")
+        return []
+
+def _box_center(box):
+    return (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+
+def find_label_box(words, near=None):
+    """
+    Region around a PO label found in page-one words, as a relative (x0, y0, x1, y1) box,
+    or None. Longer labels are tried first; a bare "PO" is used only when nothing else matches,
+    and a label followed by "box" (a PO Box address) is skipped. Of several hits, the one
+    closest to the near box (the vendor's learned box) is used, else the topmost.
+    """
+    tokens = [str(w["text"]).strip().lower().rstrip(":") for w in words]
+    for label in PO_LABELS:
+        hits = []
+        for i in range(len(tokens) - len(label) + 1):
+            if tokens[i:i + len(label)] == label and tokens[i + len(label):i + len(label) + 1] != ["box"]:
+                boxes = [words[j]["box"] for j in range(i, i + len(label))]
+                hits.append([min(b[0] for b in boxes), min(b[1] for b in boxes),
+                             max(b[2] for b in boxes), max(b[3] for b in boxes)])
+        if hits:
+            if near is not None:
+                cx, cy = _box_center(near)
+                hit = min(hits, key=lambda h: (_box_center(h)[0] - cx) ** 2 + (_box_center(h)[1] - cy) ** 2)
+            else:
+                hit = min(hits, key=lambda h: (h[1], h[0]))
+            return (
+                max(0.0, hit[0] - PO_VISION_CONFIG["label_pad_left"]),
+                max(0.0, hit[1] - PO_VISION_CONFIG["label_pad_top"]),
+                min(1.0, hit[2] + PO_VISION_CONFIG["label_pad_right"]),
+                min(1.0, hit[3] + PO_VISION_CONFIG["label_pad_bottom"]),
+            )
+    return None
+
+# --- Learned per-vendor boxes ---
+def load_learned_boxes(path=None):
+    path = path or PO_VISION_CONFIG["learned_box_path"]
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable learned PO boxes {path}: {e}")
+        return {}
+
+def save_learned_boxes(boxes, path=None):
+    path = path or PO_VISION_CONFIG["learned_box_path"]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(boxes, f, indent=2)
+    os.replace(tmp_path, path)
+
+def learn_box(boxes, vendor_code, box):
+    """Remember a label box that produced a PO for this vendor"""
+    if not vendor_code or box is None:
+        return
+    history = boxes.setdefault(str(vendor_code).strip(), [])
+    history.append([round(v, 4) for v in box])
+    del history[:-PO_VISION_CONFIG["learned_box_history"]]
+
+def learned_box(boxes, vendor_code):
+    history = boxes.get(str(vendor_code).strip()) if vendor_code else None
+    if not history:
+        return None
+    return (min(b[0] for b in history), min(b[1] for b in history),
+            max(b[2] for b in history), max(b[3] for b in history))
+
+def choose_roi(pdf_path, vendor_code=None, boxes=None):
+    """Pick the crop for a PDF: DocTR label box, then the vendor's learned box, then the page header"""
+    learned = learned_box(boxes or {}, vendor_code)
+    label = find_label_box(load_word_boxes(pdf_path), near=learned)
+    if label:
+        return label, "label"
+    if learned:
+        return learned, "learned"
+    return (0.0, 0.0, 1.0, PO_VISION_CONFIG["header_fraction"]), "header"
+
+def roi_payload(image, box=None):
+    """
+    Crop an image to a relative box, downscale it to the pixel budget and lower JPEG
+    quality until it fits the byte budget. Returns (jpeg bytes, width, height, quality).
+    """
+    if box is not None:
+        width, height = image.size
+        image = image.crop((int(box[0] * width), int(box[1] * height),
+                            int(round(box[2] * width)), int(round(box[3] * height))))
+
+    pixels = image.size[0] * image.size[1]
+    if pixels > PO_VISION_CONFIG["max_pixels"]:
+        scale = (PO_VISION_CONFIG["max_pixels"] / pixels) ** 0.5
+        image = image.resize((max(1, int(image.size[0] * scale)), max(1, int(image.size[1] * scale))), Image.LANCZOS)
+
+    for quality in PO_VISION_CONFIG["jpeg_qualities"]:
+        data = jpeg_bytes(image, quality)
+        if len(data) <= PO_VISION_CONFIG["max_bytes"]:
+            break
+    return data, image.size[0], image.size[1], quality
+
+# --- Pixtral request ---
+def _po_messages(base64_image):
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": PO_PROMPT},
+                {"type": "image_url", "image_url": f"data:image/jpeg;base64,{base64_image}"}
+            ]
+        }
+    ]
+
+def _po_result(response):
+    result = response.choices[0].message.content.strip()
+    return "" if result.strip().upper() == "NOT FOUND" else result
+
+def extract_po_from_image(base64_image, client, model=None):
+    try:
+        response = client.chat.complete(model=model or PO_VISION_CONFIG["model"], messages=_po_messages(base64_image))
+        return _po_result(response)
+    except Exception as e:
+        return f"ERROR: {e}"
+
+async def extract_po_from_image_async(base64_image, client, model=None):
+    try:
+        response = await client.chat.complete_async(model=model or PO_VISION_CONFIG["model"], messages=_po_messages(base64_image))
+        return _po_result(response)
+    except Exception as e:
+        return f"ERROR: {e}"
+
+def _po_found(raw_po):
+    return bool(raw_po) and not raw_po.startswith("ERROR:") and raw_po.lower() not in ["not found", "not visible"]
+
+def _b64(payload):
+    return base64.b64encode(payload).decode("utf-8")
+
+def build_po_payloads(pdf_path, vendor_code=None, boxes=None, image=None):
+    """Render page one (unless given), choose the crop and encode it; the full page is encoded only on fallback"""
+    start = time.perf_counter()
+    raster_source = "given"
+    if image is None:
+        image, raster_source = render_page(pdf_path, return_source=True)
+    box, source = choose_roi(pdf_path, vendor_code, boxes)
+    payload, width, height, quality = roi_payload(image, box)
+    return {
+        "box": box,
+        "roi_source": source,
+        "roi": payload,
+        "payload_size": f"{width}x{height}",
+        "jpeg_quality": quality,
+        "pdf_path": pdf_path,
+        "raster_source": raster_source,
+        "render_ms": round((time.perf_counter() - start) * 1000),
+    }
+
+def build_po_payloads_worker(pdf_path, vendor_code=None, vendor_boxes=None):
+    """Pool entry point: learned boxes for just this vendor travel with the task"""
+    return build_po_payloads(pdf_path, vendor_code, {vendor_code: vendor_boxes} if vendor_boxes else None)
+
+def _build_po_payloads_locally(*args):
+    with _local_render:
+        return build_po_payloads_worker(*args)
+
+def full_page_payload(payloads):
+    """
+    The full-page fallback, exactly as sent before the crop was introduced: page one
+    from the raster cache (already on disk from the crop render) as a default-quality JPEG.
+    Returns (jpeg bytes, size).
+    """
+    with _local_render:
+        image = render_page(payloads["pdf_path"])
+    return jpeg_bytes(image), f"{image.size[0]}x{image.size[1]}"
+
+def _request_stats(payloads, latency, full=None):
+    fallback = full is not None
+    return {
+        "roi_source": payloads["roi_source"],
+        "payload_bytes": len(payloads["roi"]) + (len(full[0]) if fallback else 0),
+        "payload_size": full[1] if fallback else payloads["payload_size"],
+        "jpeg_quality": None if fallback else payloads["jpeg_quality"],
+        "raster_source": payloads["raster_source"],
+        "render_ms": payloads["render_ms"],
+        "latency_ms": round(latency * 1000),
+        "fallback": fallback,
+    }
+
+def request_po(payloads, client, vendor_code=None, boxes=None):
+    """
+    Ask Pixtral for the PO using the cropped region first and the full page if that finds nothing.
+    Returns (raw PO, stats) where stats records the crop source, payload bytes, latency and fallback.
+    A label crop that yields a PO is learned for the vendor when boxes is given.
+    """
+    start = time.perf_counter()
+    raw_po = extract_po_from_image(_b64(payloads["roi"]), client)
+    full = None
+    if not _po_found(raw_po):
+        full = full_page_payload(payloads)
+        raw_po = extract_po_from_image(_b64(full[0]), client)
+    elif payloads["roi_source"] == "label" and boxes is not None:
+        learn_box(boxes, vendor_code, payloads["box"])
+    return raw_po, _request_stats(payloads, time.perf_counter() - start, full)
+
+async def request_po_async(payloads, client, vendor_code=None, boxes=None):
+    """Async form of request_po for concurrent extraction"""
+    start = time.perf_counter()
+    raw_po = await extract_po_from_image_async(_b64(payloads["roi"]), client)
+    full = None
+    if not _po_found(raw_po):
+        full = await asyncio.to_thread(full_page_payload, payloads)
+        raw_po = await extract_po_from_image_async(_b64(full[0]), client)
+    elif payloads["roi_source"] == "label" and boxes is not None:
+        learn_box(boxes, vendor_code, payloads["box"])
+    return raw_po, _request_stats(payloads, time.perf_counter() - start, full)
+
+def extract_po_with_roi(pdf_path, client, vendor_code=None, boxes=None, image=None):
+    """Render, crop and request one PDF's PO; see request_po"""
+    return request_po(build_po_payloads(pdf_path, vendor_code, boxes, image), client, vendor_code, boxes)
+
+# --- Concurrent extraction ---
+def extract_pos_concurrently(pdf_paths, client, vendor_codes=None, boxes=None, processes=None, max_in_flight=None):
+    """
+    Render on a process pool while up to max_in_flight Pixtral requests run concurrently.
+    Returns [(raw PO, stats)] in the order of pdf_paths; raw PO is None when rendering failed
+    and stats["error"] says why.
+    """
+    from worker_pool import start_worker_pool, stop_worker_pool, default_processes
+
+    processes = processes or default_processes()
+    max_in_flight = max_in_flight or PO_VISION_CONFIG["max_in_flight"]
+    vendor_codes = vendor_codes or {}
+    pool = start_worker_pool(processes, main_module="po_vision")
+    try:
+        return asyncio.run(_extract_all(pdf_paths, client, vendor_codes, boxes, pool, processes, max_in_flight))
+    finally:
+        stop_worker_pool(pool)
+
+async def _extract_all(pdf_paths, client, vendor_codes, boxes, pool, processes, max_in_flight):
+    from worker_pool import pool_call, BrokenProcessPool
+
+    request_slots = asyncio.Semaphore(max_in_flight)
+    # Caps rendered payloads waiting for a request slot
+    pipeline_slots = asyncio.Semaphore(max_in_flight + 2 * processes)
+
+    async def extract_one(pdf_path):
+        vendor_code = vendor_codes.get(os.path.splitext(os.path.basename(pdf_path))[0])
+        async with pipeline_slots:
+            args = (pdf_path, vendor_code, (boxes or {}).get(str(vendor_code).strip()) if vendor_code else None)
+            try:
+                try:
+                    payloads = await pool_call(pool, build_po_payloads_worker, *args)
+                except BrokenProcessPool:
+                    # A render worker died and the pool is not restarted; render the rest in this process
+                    payloads = await asyncio.to_thread(_build_po_payloads_locally, *args)
+            except Exception as e:
+                return None, {"error": f"{type(e).__name__}: {e}"}
+            async with request_slots:
+                return await request_po_async(payloads, client, vendor_code, boxes)
+
+    return await asyncio.gather(*(extract_one(pdf_path) for pdf_path in pdf_paths))
+
+# --- Before/after report ---
+def _normalize_po(value):
+    return "".join(ch for ch in str(value).upper() if ch.isalnum())
+
+def compare_payloads(pdf_folder, approved_csv, client, vendor_codes=None):
+    """
+    Send every PDF both ways (full 200-dpi page as before, cropped ROI request now) and
+    report payload bytes, request latency and accuracy against the approved PO values.
+    """
+    import pandas as pd
+
+    approved = pd.read_csv(approved_csv, dtype=str).fillna("")
+    truth = {}
+    for _, row in approved.iterrows():
+        value = next((row.get(c, "") for c in ["PO_Number", "Job_Number", "WO_Number", "Remarks"] if row.get(c, "")), "")
+        truth[row["file_name"]] = _normalize_po(value)
+
+    boxes = load_learned_boxes()
+    totals = {"before": {"bytes": 0, "seconds": 0.0, "correct": 0}, "after": {"bytes": 0, "seconds": 0.0, "correct": 0}}
+    fallbacks = 0
+    files = [f for f in sorted(os.listdir(pdf_folder)) if f.lower().endswith(".pdf") and f in truth]
+    if not files:
+        print(f"WARNING: No PDFs in {pdf_folder} have approved PO values in {approved_csv}")
+        return
+
+    for file in files:
+        pdf_path = os.path.join(pdf_folder, file)
+        image = render_page(pdf_path)
+
+        payload = jpeg_bytes(image)
+        start = time.perf_counter()
+        before = extract_po_from_image(base64.b64encode(payload).decode("utf-8"), client)
+        totals["before"]["seconds"] += time.perf_counter() - start
+        totals["before"]["bytes"] += len(payload)
+        totals["before"]["correct"] += _normalize_po(before) == truth[file]
+
+        after, stats = extract_po_with_roi(pdf_path, client, (vendor_codes or {}).get(os.path.splitext(file)[0]), boxes, image=image)
+        totals["after"]["seconds"] += stats["latency_ms"] / 1000
+        totals["after"]["bytes"] += stats["payload_bytes"]
+        totals["after"]["correct"] += _normalize_po(after) == truth[file]
+        fallbacks += stats["fallback"]
+
+    for name, label in [("before", "Full page"), ("after", "ROI crop")]:
+        t = totals[name]
+        print(f"INFO: {label:<9}: {t['bytes'] / len(files) / 1024:8.1f} KB/request | "
+              f"{t['seconds'] * 1000 / len(files):7.0f} ms/invoice | accuracy {t['correct'] / len(files):.1%}")
+    print(f"INFO: Full-page fallbacks: {fallbacks} of {len(files)}")
+
+if __name__ == "__main__":
+    import sys
+    from mistralai import Mistral
+
+    print("=== PO Vision Payload Report ===")
+    api_key = os.environ.get("MISTRAL_API_KEY")
+    if not api_key:
+        raise ValueError("MISTRAL_API_KEY not set in environment.")
+    compare_payloads(
+        sys.argv[1] if len(sys.argv) > 1 else "data/raw_pdfs",
+        sys.argv[2] if len(sys.argv) > 2 else "outputs/excel_files/pixtral_po_results.csv",
+        Mistral(api_key=api_key),
+    )
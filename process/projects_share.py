@@ -0,0 +1,494 @@
+# Projects Share Lookups for Invoice Processing Pipeline
+# This file looks up PO and Job numbers on the projects share (\\192.168.1.130\Projects\Raj).
+# Every os call against the share is an SMB round trip, so folders are listed through the
+# shared listing cache (dir_listing.py) and all identifiers are matched against the filenames in a single pass with
+# an Aho-Corasick automaton.
+#
+# The PO PDFs on the share are also indexed: for each PDF the text following every
+# "Purchase Order"/"Job" label is kept, with its "Ordered By:" name and distribution
+# code, in data/cache/po_folder_index.json. Only PDFs whose size or mtime changed are
+# re-read, so verifying a batch is a set of index lookups instead of a crawl of the share.
+# The PDF texts themselves live in the PDF text store (pdf_text_store.py).
+
+import os
+import re
+import json
+from collections import deque
+
+from tqdm import tqdm
+
+from dir_listing import list_dir, scan_dir, invalidate, listing_stats
+from pdf_text_store import get_text, discard_text
+from worker_pool import start_worker_pool, stop_worker_pool, BrokenProcessPool
+
+PROJECTS_SHARE_CONFIG = {
+    "filename_extensions": (".pdf", ".txt"),
+    "index_path": "data/cache/po_folder_index.json",
+    "snippet_chars": 64,           # text kept after each label; longer identifiers than this cannot match
+    "save_every": 200,             # files re-read between index saves, so an interrupted refresh keeps its work
+    "pool_min_files": 16,          # fewer stale PDFs than this are read in-process
+}
+
+ID_LABEL_PATTERNS = {
+    "po": re.compile(r"Purchase Order[:\s]*", re.IGNORECASE),
+    "job": re.compile(r"Job[:\s]*", re.IGNORECASE),
+}
+ORDERED_BY_PATTERN = re.compile(r"Ordered By:\s*(.+)", re.IGNORECASE)
+DISTRIBUTION_PATTERN = re.compile(r"\d{4}\s+([EMS])\b")
+
+_round_trips = {"count": 0}
+
+def _listing_call(func, folder):
+    """List folder through the shared listing cache, counting a real listing as one SMB round trip"""
+    listings = listing_stats()["listings"]
+    try:
+        return func(folder)
+    finally:
+        _round_trips["count"] += listing_stats()["listings"] - listings
+
+def round_trips():
+    return _round_trips["count"]
+
+def scan_folder(folder, refresh=False):
+    """
+    PDF name -> (size, mtime) for a folder from the shared listing cache; None when not accessible.
+    On Windows the sizes and times come back with the SMB listing, so no per-file stat is needed.
+    """
+    if refresh and folder:
+        invalidate(folder)
+    try:
+        files = _listing_call(scan_dir, folder) if folder else None
+    except OSError:
+        files = None
+    if files is None:
+        print(f"WARNING: Directory not accessible: {folder}")
+        return None
+    return {name: version for name, version in files.items() if name.lower().endswith(".pdf")}
+
+def pdf_text(folder, name):
+    """Text of a PDF on the share from the PDF text store, using the size and mtime of this run's scan"""
+    version = (scan_folder(folder) or {}).get(name, (None, None))
+    text, source = get_text(os.path.join(folder, name), *version, return_source=True)
+    if source == "extracted":
+        _round_trips["count"] += 1
+    return text
+
+def list_folder(folder, refresh=False):
+    """Filenames in folder from the shared listing cache; None when the folder is not accessible"""
+    if refresh and folder:
+        invalidate(folder)
+    try:
+        return _listing_call(list_dir, folder) if folder else None
+    except OSError:
+        print(f"WARNING: Directory not accessible: {folder}")
+        return None
+
+# --- Aho-Corasick automaton ---
+def build_automaton(patterns):
+    """
+    Build an Aho-Corasick automaton over patterns (all non-empty strings).
+    Returns a dict of per-state transitions, failure links and the pattern indices ending at each state.
+    """
+    goto = [{}]
+    fail = [0]
+    output = [[]]
+    for index, pattern in enumerate(patterns):
+        state = 0
+        for char in pattern:
+            if char not in goto[state]:
+                goto.append({})
+                fail.append(0)
+                output.append([])
+                goto[state][char] = len(goto) - 1
+            state = goto[state][char]
+        output[state].append(index)
+
+    # Breadth-first failure links; each state also reports the patterns of its failure chain
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        for char, child in goto[state].items():
+            queue.append(child)
+            link = fail[state]
+            while link and char not in goto[link]:
+                link = fail[link]
+            fail[child] = goto[link].get(char, 0)
+            output[child] = output[child] + output[fail[child]]
+    return {"goto": goto, "fail": fail, "output": output, "patterns": list(patterns)}
+
+def scan(automaton, text):
+    """Yield (end position, pattern index) for every occurrence of every pattern in text"""
+    goto, fail, output = automaton["goto"], automaton["fail"], automaton["output"]
+    state = 0
+    for position, char in enumerate(text):
+        while state and char not in goto[state]:
+            state = fail[state]
+        state = goto[state].get(char, 0)
+        for index in output[state]:
+            yield position, index
+
+def find_in_filenames(identifiers, folder):
+    """
+    Return identifier -> first filename (in listing order) containing it, like the previous
+    per-identifier `value in filename` scan, or None. One listing and one pass over the
+    filenames serve every identifier; the pass stops once all of them are found.
+    """
+    return match_filenames(identifiers, list_folder(folder))
+
+def match_filenames(identifiers, filenames):
+    found = {identifier: None for identifier in identifiers}
+    patterns = [identifier for identifier in found if identifier]
+    if not filenames or not patterns:
+        return found
+
+    automaton = build_automaton(patterns)
+    remaining = len(patterns)
+    for filename in filenames:
+        if not filename.endswith(PROJECTS_SHARE_CONFIG["filename_extensions"]):
+            continue
+        for _, index in scan(automaton, filename):
+            if found[patterns[index]] is None:
+                found[patterns[index]] = filename
+                remaining -= 1
+        if remaining == 0:
+            break
+    return found
+
+# --- PO folder index ---
+def index_pdf_text(pdf_text):
+    """Index entry fields for one PO PDF: text after each label, Ordered By and distribution code"""
+    entry = {
+        id_type: [pdf_text[m.end():m.end() + PROJECTS_SHARE_CONFIG["snippet_chars"]].lower()
+                  for m in pattern.finditer(pdf_text)]
+        for id_type, pattern in ID_LABEL_PATTERNS.items()
+    }
+    ordered_by = ORDERED_BY_PATTERN.search(pdf_text)
+    distribution = DISTRIBUTION_PATTERN.search(pdf_text)
+    entry["ordered_by"] = ordered_by.group(1).strip() if ordered_by else ""
+    entry["distribution_code"] = distribution.group(1) if distribution else ""
+    return entry
+
+def read_index_entry(job):
+    """
+    Index entry for one (pdf_path, size, mtime), or {"error": ...}. Also the process-pool worker:
+    only the label text and extracted fields travel back to the pipeline, never the document text.
+    The text comes from the PDF text store, so each PDF version is extracted once across runs.
+    """
+    try:
+        text, source = get_text(*job, return_source=True)
+        return dict(index_pdf_text(text), text_source=source)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+def _read_entries(folder, listing, names, processes):
+    """
+    Index entries for names, in order, as a generator plus the pool reading them (None when in-process).
+    The pool reads ahead of the consumer; stopping it cancels the PDFs not yet started.
+    """
+    jobs = [(os.path.join(folder, name), *listing[name]) for name in names]
+    if processes == 1 or len(jobs) < PROJECTS_SHARE_CONFIG["pool_min_files"]:
+        return (read_index_entry(job) for job in jobs), None
+
+    pool = start_worker_pool(processes, main_module="projects_share")
+    return _pool_entries(pool, jobs), pool
+
+def _pool_entries(pool, jobs):
+    done = 0
+    try:
+        for entry in pool.map(read_index_entry, jobs):
+            yield entry
+            done += 1
+    except BrokenProcessPool as e:
+        # A reader died (e.g. fitz crashed on a PDF); the rest are left unindexed and retried next run
+        print(f"WARNING: PDF reader pool stopped, {len(jobs) - done} PDF(s) left for the next run: {e}")
+        for _ in jobs[done:]:
+            yield {"error": "PDF reader pool stopped"}
+
+def _store_entry(folder, files, name, entry, version):
+    """Put a freshly read entry in the index, replacing the stored text of the previous version"""
+    if entry.pop("text_source", None) == "extracted":
+        _round_trips["count"] += 1
+    if "error" in entry:
+        print(f"ERROR: Error processing {name}: {entry['error']}")
+        files.pop(name, None)
+        return False
+    previous = files.get(name)
+    if previous is not None:
+        discard_text(os.path.join(folder, name), previous["size"], previous["mtime"])
+    entry["size"], entry["mtime"] = version
+    files[name] = entry
+    return True
+
+def _drop_removed(folder, files, listing):
+    removed = [name for name in files if name not in listing]
+    for name in removed:
+        discard_text(os.path.join(folder, name), files[name]["size"], files[name]["mtime"])
+        del files[name]
+    return removed
+
+def load_folder_index(folder, index_path=None):
+    """The saved index entries (PDF name -> entry) for folder; missing or unreadable reads as empty"""
+    index_path = index_path or PROJECTS_SHARE_CONFIG["index_path"]
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f).get(folder, {})
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable PO folder index {index_path}: {e}")
+        return {}
+
+def save_folder_index(folder, files, index_path=None):
+    index_path = index_path or PROJECTS_SHARE_CONFIG["index_path"]
+    payload = {}
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            payload = {}
+    payload[folder] = files
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, index_path)
+
+def refresh_folder_index(folder, index_path=None, processes=None):
+    """
+    Bring the index for folder up to date and return it as a list of (PDF name, entry) in listing order.
+    PDFs are only re-read when their size or mtime changed; entries for deleted PDFs are dropped.
+    """
+    listing = scan_folder(folder, refresh=True)
+    if listing is None:
+        return []
+    files = load_folder_index(folder, index_path)
+    stale = [name for name, (size, mtime) in listing.items()
+             if name not in files or (files[name]["size"], files[name]["mtime"]) != (size, mtime)]
+    removed = _drop_removed(folder, files, listing)
+    print(f"INFO: PO folder index: {len(listing)} PDFs, {len(stale)} new or changed, {len(removed)} removed")
+
+    entries, pool = _read_entries(folder, listing, stale, processes)
+    try:
+        for count, (name, entry) in enumerate(tqdm(zip(stale, entries), desc="Indexing PO PDFs", total=len(stale)), start=1):
+            _store_entry(folder, files, name, entry, listing[name])
+            if count % PROJECTS_SHARE_CONFIG["save_every"] == 0:
+                save_folder_index(folder, files, index_path)
+    finally:
+        if pool is not None:
+            stop_worker_pool(pool)
+    if stale or removed:
+        save_folder_index(folder, files, index_path)
+    return [(name, files[name]) for name in listing if name in files]
+
+def build_identifier_trie(identifiers):
+    """Trie over lowercased identifiers; the None key of a node lists the identifiers ending there"""
+    trie = {}
+    for identifier in identifiers:
+        node = trie
+        for char in str(identifier).lower():
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(identifier)
+    return trie
+
+def match_snippet(trie, snippet):
+    """Every identifier that snippet starts with, in one walk down the trie"""
+    found = []
+    node = trie
+    for char in snippet:
+        node = node.get(char)
+        if node is None:
+            break
+        found.extend(node.get(None, ()))
+    return found
+
+def resolve_identifiers(folder, identifiers, id_types, index_path=None, processes=None):
+    """
+    Return identifier -> (PDF name, ordered_by, distribution_code), or (None, "", "", "") when no PDF has it.
+    A PDF matches when the text after one of its labels of the identifier's type starts with the identifier
+    (case-insensitive), which is what the previous per-PDF `Purchase Order[:\s]*<id>` regex checked; the
+    first matching PDF in listing order wins, whichever type matched.
+
+    PDFs are visited in listing order and each label is matched against every identifier in one trie walk.
+    A PDF is read from the share only when the walk reaches it and its index entry is missing or stale,
+    and the walk stops once every identifier is resolved, leaving later stale PDFs for a future run.
+    Stale PDFs are read ahead on a process pool (processes=1 reads in-process); stopping the walk
+    cancels the reads still outstanding.
+    """
+    results = {identifier: (None, "", "", "") for identifier in identifiers}
+    listing = scan_folder(folder, refresh=True)
+    if listing is None:
+        return results
+    files = load_folder_index(folder, index_path)
+    removed = _drop_removed(folder, files, listing)
+
+    tries = {id_type: build_identifier_trie({i for i, t in zip(identifiers, id_types) if t == id_type and i != ""})
+             for id_type in ID_LABEL_PATTERNS}
+    unresolved = {identifier for identifier in identifiers if identifier != ""}
+    searched = len(unresolved)
+    read = visited = 0
+    stale = [name for name, (size, mtime) in listing.items()
+             if name not in files or (files[name]["size"], files[name]["mtime"]) != (size, mtime)]
+    stale_set = set(stale)
+    entries, pool = _read_entries(folder, listing, stale, processes) if unresolved else (iter(()), None)
+    try:
+        for name, (size, mtime) in tqdm(listing.items(), desc="Verifying against PO PDFs", total=len(listing)):
+            if not unresolved:
+                break
+            visited += 1
+            entry = files.get(name)
+            if name in stale_set:
+                # Stale PDFs come back in listing order, so the next one read is this one
+                entry = next(entries)
+                if not _store_entry(folder, files, name, entry, (size, mtime)):
+                    continue
+                read += 1
+                if read % PROJECTS_SHARE_CONFIG["save_every"] == 0:
+                    save_folder_index(folder, files, index_path)
+
+            for id_type, trie in tries.items():
+                for snippet in entry[id_type]:
+                    for identifier in match_snippet(trie, snippet):
+                        if identifier in unresolved:
+                            unresolved.discard(identifier)
+                            results[identifier] = (name, entry["ordered_by"], entry["distribution_code"])
+    finally:
+        if pool is not None:
+            stop_worker_pool(pool)
+
+    if read or removed:
+        save_folder_index(folder, files, index_path)
+    print(f"INFO: PO folder index: {visited} of {len(listing)} PDFs visited, {read} of {len(stale)} new or changed indexed, "
+          f"{searched - len(unresolved)} of {searched} identifiers resolved")
+    return results
+
+def benchmark_identifier_search(pdf_count=2000, identifier_count=300, seed=0):
+    """
+    Time the previous per-PDF, per-identifier regex search against the trie walk over index entries,
+    on synthetic PO texts (text extraction is the same for both and left out)
+    """
+    import time
+    import random
+
+    rng = random.Random(seed)
+    texts = [
+        f"PURCHASE ORDER\nPurchase Order: {rng.randint(1000, 99999)}\nJob: {rng.randint(10, 30)}.{rng.randint(10, 99)}\n"
+        f"Ordered By: {rng.choice(['Rakesh', 'Niraj', 'Mukesh'])}\n" + "Line item description 12.50\n" * 40
+        + f"{rng.randint(1000, 9999)} {rng.choice('EMS')}\n"
+        for _ in range(pdf_count)
+    ]
+    identifiers = [str(rng.randint(1000, 99999)) for _ in range(identifier_count // 2)]
+    identifiers += [f"{rng.randint(10, 30)}.{rng.randint(10, 99)}" for _ in range(identifier_count - len(identifiers))]
+    id_types = ["po"] * (identifier_count // 2) + ["job"] * (identifier_count - identifier_count // 2)
+
+    start = time.perf_counter()
+    expected = {identifier: None for identifier in identifiers}
+    for position, text in enumerate(texts):
+        for identifier, id_type in zip(identifiers, id_types):
+            if expected[identifier] is not None:
+                continue
+            pattern = re.compile(rf"{'Purchase Order' if id_type == 'po' else 'Job'}[:\s]*{re.escape(identifier)}", re.IGNORECASE)
+            if pattern.search(text):
+                expected[identifier] = position
+    regex_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    entries = [index_pdf_text(text) for text in texts]
+    index_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tries = {id_type: build_identifier_trie({i for i, t in zip(identifiers, id_types) if t == id_type})
+             for id_type in ID_LABEL_PATTERNS}
+    actual = {identifier: None for identifier in identifiers}
+    unresolved = set(identifiers)
+    for position, entry in enumerate(entries):
+        if not unresolved:
+            break
+        for id_type, trie in tries.items():
+            for snippet in entry[id_type]:
+                for identifier in match_snippet(trie, snippet):
+                    if identifier in unresolved:
+                        unresolved.discard(identifier)
+                        actual[identifier] = position
+    trie_seconds = time.perf_counter() - start
+
+    print(f"INFO: {pdf_count} PDFs x {identifier_count} identifiers: "
+          f"{sum(expected[i] == actual[i] for i in identifiers)} of {identifier_count} identical, "
+          f"{sum(v is not None for v in actual.values())} found")
+    print(f"INFO: Per-identifier regex: {regex_seconds:.2f} s; index entries {index_seconds:.2f} s "
+          f"(once per PDF version) + trie walk {trie_seconds:.3f} s")
+
+def benchmark_workers(folder, worker_counts=(1, 2, 4, 8)):
+    """Time reading every PDF in folder into index entries with each worker count; the index is not touched"""
+    import time
+
+    listing = scan_folder(folder) or {}
+    names = sorted(listing)
+    if not names:
+        return
+    baseline = None
+    for processes in worker_counts:
+        # Measure extraction, not the text store
+        for name in names:
+            discard_text(os.path.join(folder, name), *listing[name])
+        start = time.perf_counter()
+        entries, pool = _read_entries(folder, listing, names, processes)
+        try:
+            errors = sum("error" in entry for entry in entries)
+        finally:
+            if pool is not None:
+                stop_worker_pool(pool)
+        seconds = time.perf_counter() - start
+        baseline = baseline or seconds
+        print(f"INFO: {processes} worker(s): {len(names)} PDFs in {seconds:.2f} s "
+              f"({len(names) / seconds:.1f} PDFs/s, {baseline / seconds:.1f}x){f', {errors} failed' if errors else ''}")
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import random
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark":
+        print("=== PO Identifier Search Benchmark ===")
+        benchmark_identifier_search()
+        sys.exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--benchmark-workers":
+        print("=== PO PDF Reading Speedup by Worker Count ===")
+        benchmark_workers(sys.argv[2])
+        sys.exit(0)
+
+    if len(sys.argv) > 2 and sys.argv[1] == "--refresh":
+        # Read every new or changed PDF now (e.g. overnight) rather than on demand during verification
+        print("=== PO Folder Index Refresh ===")
+        refresh_folder_index(sys.argv[2])
+        sys.exit(0)
+
+    print("=== Projects Share Filename Lookup ===")
+    if len(sys.argv) > 1:
+        folder = sys.argv[1]
+        identifiers = sys.argv[2:]
+        start = time.perf_counter()
+        for identifier, filename in find_in_filenames(identifiers, folder).items():
+            print(f"INFO: {identifier}: {filename or 'not found'}")
+        print(f"INFO: {round_trips()} SMB round trip(s) in {time.perf_counter() - start:.2f} s "
+              f"(per-identifier listing: {2 * len(identifiers)})")
+        sys.exit(0)
+
+    # Synthetic check against the per-identifier substring scan
+    rng = random.Random(0)
+    filenames = [f"PO {rng.randint(1000, 99999)} - {rng.choice(['Job', 'WO'])} {rng.randint(10, 30)}.{rng.randint(10, 999)}"
+                 f"{rng.choice(['.pdf', '.txt', '.xlsx'])}" for _ in range(5000)]
+    identifiers = [str(rng.randint(1000, 99999)) for _ in range(300)] + [f"24.{rng.randint(10, 99)}" for _ in range(50)]
+
+    start = time.perf_counter()
+    expected = {
+        identifier: next((f for f in filenames if f.endswith((".pdf", ".txt")) and identifier in f), None)
+        for identifier in identifiers
+    }
+    naive_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = match_filenames(identifiers, filenames)
+    automaton_seconds = time.perf_counter() - start
+    print(f"INFO: {sum(expected[i] == actual[i] for i in identifiers)} of {len(identifiers)} identifiers identical; "
+          f"substring scan {naive_seconds:.2f} s, automaton {automaton_seconds:.2f} s")
@@ -0,0 +1,351 @@
+# Reference Data Loader for Invoice Processing Pipeline
+# This file loads the reference workbooks and CSVs the pipeline reads (Project List,
+# Routing_Code.xls, GL_Item_Code.csv, the tax code table and Vendor Folder Mapping.xlsx)
+# once per process. Each parsed frame is also kept on disk under data/cache/reference,
+# keyed by the file's content hash, so an unchanged workbook is not parsed again on the
+# next run. The cache is Feather when pyarrow is installed and pickle otherwise.
+# Vendor_List.csv keeps its own cache in vendor_index.py (it also holds the match index).
+#
+# Lookup helpers hand out the dicts the pipeline needs (job -> PM, (PM, distribution) ->
+# routing code, GL -> item code, tax % -> tax code, vendor code -> folder).
+
+import os
+import time
+import pickle
+import hashlib
+
+import pandas as pd
+
+from po_extraction import normalize_numbers
+
+try:
+    import pyarrow  # noqa: F401  (only needed for the Feather cache)
+    FEATHER_AVAILABLE = True
+except ImportError:
+    FEATHER_AVAILABLE = False
+
+REFERENCE_DATA_CONFIG = {
+    "cache_folder": "data/cache/reference",
+    # Source name -> default path (relative to process/) and pandas reader arguments
+    "sources": {
+        "project_list": {"path": None, "read": {}},   # network or mirror path, passed by the caller
+        "routing_codes": {"path": "data/Routing_Code.xls", "read": {}},
+        "gl_item_codes": {"path": "data/GL_Item_Code.csv", "read": {"sep": ",", "header": 0}},
+        "tax_codes": {"path": "outputs/excel_files/filtered_tax_percentages_with_codes.xlsx", "read": {}},
+        "vendor_folders": {"path": "../Vendor Folder Mapping.xlsx", "read": {}},
+    },
+}
+
+_frames = {}        # (name, abs path) -> {"stat": (size, mtime_ns), "sha256", "frame"}
+_lookups = {}       # (builder, name, abs path, sha256) -> dict
+_load_times = {}    # name -> {"path", "source", "seconds"}
+
+def content_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def _source_path(name, path):
+    path = path or REFERENCE_DATA_CONFIG["sources"][name]["path"]
+    if path is None:
+        raise ValueError(f"No default path for reference source '{name}'")
+    return path
+
+def _read_source(name, path):
+    read_kwargs = REFERENCE_DATA_CONFIG["sources"][name]["read"]
+    if path.lower().endswith(".csv"):
+        frame = pd.read_csv(path, **read_kwargs)
+    else:
+        frame = pd.read_excel(path, **read_kwargs)
+    # Normalized header: string names without stray spaces or newlines
+    frame.columns = [str(c).strip() for c in frame.columns]
+    return frame
+
+def _cache_file(name, digest):
+    extension = "feather" if FEATHER_AVAILABLE else "pkl"
+    return os.path.join(REFERENCE_DATA_CONFIG["cache_folder"], f"{name}-{digest[:16]}.{extension}")
+
+def _load_cached(name, digest):
+    for extension in ("feather", "pkl"):
+        path = os.path.join(REFERENCE_DATA_CONFIG["cache_folder"], f"{name}-{digest[:16]}.{extension}")
+        if not os.path.exists(path):
+            continue
+        try:
+            if extension == "feather":
+                if FEATHER_AVAILABLE:
+                    return pd.read_feather(path)
+            else:
+                with open(path, "rb") as f:
+                    return pickle.load(f)
+        except Exception as e:
+            print(f"WARNING: Ignoring unreadable reference cache {path}: {e}")
+    return None
+
+def _save_cached(name, digest, frame):
+    path = _cache_file(name, digest)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            if not FEATHER_AVAILABLE:
+                raise ValueError("pyarrow not installed")
+            frame.to_feather(tmp_path)
+        except Exception:
+            # Mixed-type object columns do not fit Feather; pickle keeps them as parsed
+            path = os.path.splitext(path)[0] + ".pkl"
+            with open(tmp_path, "wb") as f:
+                pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"WARNING: Could not write reference cache {path}: {e}")
+        return
+    # Drop caches of earlier versions of this source
+    prefix = f"{name}-"
+    for file_name in os.listdir(os.path.dirname(path)):
+        old = os.path.join(os.path.dirname(path), file_name)
+        if file_name.startswith(prefix) and old != path and not file_name.endswith(".tmp"):
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+def load_reference(name, path=None, rebuild=False):
+    """
+    Parsed frame of a reference source, read at most once per process and from the disk cache
+    while the file's content hash is unchanged. Returns a copy the caller may modify.
+    """
+    path = _source_path(name, path)
+    key = (name, os.path.abspath(path))
+    start = time.perf_counter()
+    stat = os.stat(path)
+    stat_key = (stat.st_size, stat.st_mtime_ns)
+
+    memo = _frames.get(key)
+    if memo and memo["stat"] == stat_key and not rebuild:
+        source = "memory"
+    else:
+        digest = content_hash(path)
+        frame = None if rebuild else _load_cached(name, digest)
+        source = "cache"
+        if frame is None:
+            frame = _read_source(name, path)
+            _save_cached(name, digest, frame)
+            source = "parsed"
+        memo = {"stat": stat_key, "sha256": digest, "frame": frame}
+        _frames[key] = memo
+
+    seconds = time.perf_counter() - start
+    if source != "memory" or name not in _load_times:
+        _load_times[name] = {"path": path, "source": source, "seconds": seconds}
+    return memo["frame"].copy()
+
+def _lookup(builder, name, path):
+    """Memoize a lookup dict built from a reference frame, per content hash"""
+    frame = load_reference(name, path)
+    path = _source_path(name, path)
+    key = (builder.__name__, name, os.path.abspath(path), _frames[(name, os.path.abspath(path))]["sha256"])
+    if key not in _lookups:
+        _lookups[key] = builder(frame)
+    return _lookups[key]
+
+# --- Lookup builders ---
+def find_column(frame, names, ignore_spaces=True):
+    """First column whose lowercased (and, by default, space-free) name is in names"""
+    return next((c for c in frame.columns if (c.lower().replace(" ", "") if ignore_spaces else c.lower()) in names), None)
+
+def _project_managers(df_pm):
+    job_no_col = find_column(df_pm, ["jobno.", "jobno", "job#", "jobnumber"])
+    pm_col = find_column(df_pm, ["pm", "projectmgr.", "projectmgr", "project manager"], ignore_spaces=False)
+    if job_no_col is None or pm_col is None:
+        raise ValueError("Could not find 'Job No.' and 'PM' columns in Projects list file.")
+    jobs = normalize_numbers(df_pm[job_no_col], decimals=2)
+    pms = df_pm[pm_col].astype(str).str.strip().str.title()
+    return dict(zip(jobs, pms))
+
+def project_managers(path):
+    """Job No. (xx.xx) -> PM first name from the Project List"""
+    return _lookup(_project_managers, "project_list", path)
+
+def _routing_codes(df_routing):
+    ordered_by = df_routing["Ordered By"].astype(str).str.strip().str.upper()
+    distribution = df_routing["Distribution"].astype(str).str.strip().str.upper()
+    codes = df_routing["Code"].astype(str).str.strip()
+    return {
+        (o, d): c
+        for o, d, c in zip(ordered_by, distribution, codes)
+        if o and d and c
+    }
+
+def routing_codes(path=None):
+    """(ORDERED BY, DISTRIBUTION) -> routing code"""
+    return _lookup(_routing_codes, "routing_codes", path)
+
+def _gl_item_codes(gl_item_df):
+    # Robust to a single-column CSV
+    if gl_item_df.shape[1] == 1:
+        gl_item_df = gl_item_df.iloc[:, 0].str.split(",", expand=True)
+        gl_item_df.columns = ["G/L Code", "Item_Code"]
+    return dict(zip(gl_item_df["G/L Code"].astype(str).str.strip(), gl_item_df["Item_Code"].astype(str).str.strip()))
+
+def gl_item_codes(path=None):
+    """G/L Code -> Item_Code"""
+    return _lookup(_gl_item_codes, "gl_item_codes", path)
+
+def _tax_codes(tax_code_df):
+    lookup = {}
+    for percent, code in zip(tax_code_df["Tax %"].round(4), tax_code_df["Tax Code"]):
+        lookup.setdefault(percent, code)   # first row wins, as with .iloc[0] on the filtered frame
+    return lookup
+
+def tax_codes(path=None):
+    """Tax % (rounded to 4 places) -> Tax Code"""
+    return _lookup(_tax_codes, "tax_codes", path)
+
+def _vendor_folders(vendor_df):
+    codes = vendor_df["vendor_code"].astype(str).str.strip()
+    folders = vendor_df["folder_name"].astype(str).str.strip()
+    return {
+        code: folder
+        for code, folder in zip(codes, folders)
+        if code and folder and code != "nan" and folder != "nan"
+    }
+
+def vendor_folders(path=None):
+    """vendor_code -> network folder name"""
+    return _lookup(_vendor_folders, "vendor_folders", path)
+
+# --- Joins onto the PO results ---
+def assign_ordered_by(df_po, pm_names):
+    """
+    ordered_by for each row of df_po: the PM of its Job_Number (already normalized to xx.xx)
+    through a left join, or the existing ordered_by when the job is not in pm_names
+    """
+    pms = pd.DataFrame({"Job_Number": list(pm_names), "_pm": list(pm_names.values())}, dtype=object)
+    jobs = pd.DataFrame({"Job_Number": df_po["Job_Number"].to_numpy(dtype=object)})
+    joined = jobs.merge(pms, on="Job_Number", how="left")
+    return pd.Series(joined["_pm"].to_numpy(dtype=object), index=df_po.index).fillna(df_po["ordered_by"]).fillna("")
+
+def assign_routing_codes(df_po, routing):
+    """
+    routing_code for each row of df_po from its (ordered_by, distribution_code) through a left join
+    on the routing lookup; "" when either is blank or the pair is not listed
+    """
+    ordered_by = df_po["ordered_by"].map(str).str.strip().str.upper().to_numpy(dtype=object)
+    distribution = df_po["distribution_code"].map(str).str.strip().str.upper().to_numpy(dtype=object)
+    codes = pd.DataFrame(
+        [(o, d, c) for (o, d), c in routing.items()],
+        columns=["_ordered_by", "_distribution", "routing_code"],
+        dtype=object,
+    )
+    keys = pd.DataFrame({"_ordered_by": ordered_by, "_distribution": distribution}, dtype=object)
+    joined = keys.merge(codes, on=["_ordered_by", "_distribution"], how="left")
+    blank = (ordered_by == "") | (distribution == "")
+    routing_code = joined["routing_code"].fillna("").where(~blank, "")
+    return pd.Series(routing_code.to_numpy(dtype=object), index=df_po.index, dtype=object)
+
+# --- Reporting ---
+def report_reference_loads():
+    """Per-source load time in this process and where it came from (parsed, cache or memory)"""
+    for name, entry in _load_times.items():
+        print(f"INFO: Reference {name}: {entry['seconds'] * 1000:.1f} ms ({entry['source']}) from {entry['path']}")
+
+def report_cold_warm(paths=None):
+    """Load every source that exists with a cold cache, then a warm one, then from memory"""
+    paths = paths or {}
+    for name in REFERENCE_DATA_CONFIG["sources"]:
+        path = paths.get(name) or REFERENCE_DATA_CONFIG["sources"][name]["path"]
+        if not path or not os.path.exists(path):
+            print(f"WARNING: Reference {name} not found, skipped: {path}")
+            continue
+        timings = []
+        try:
+            for rebuild in (True, False):
+                _frames.clear()
+                start = time.perf_counter()
+                load_reference(name, path, rebuild=rebuild)
+                timings.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            load_reference(name, path)
+            timings.append((time.perf_counter() - start) * 1000)
+        except Exception as e:
+            print(f"WARNING: Reference {name} could not be loaded: {e}")
+            continue
+        print(f"INFO: Reference {name}: cold {timings[0]:.1f} ms, warm (disk cache) {timings[1]:.1f} ms, "
+              f"in-process {timings[2]:.2f} ms")
+
+def benchmark_assignment(count=100000, seed=0):
+    """
+    Time PM and routing assignment over count synthetic PO rows: the former per-row helpers
+    and iterrows() loop against normalize_numbers and the joins, and check the CSVs match
+    """
+    import io
+    import random
+
+    rng = random.Random(seed)
+    pms = ["Rakesh", "Arvind", "Mukesh", "Niraj", "Jignesh", "Dana"]
+    jobs = [f"{rng.randint(10, 40)}.{rng.randint(0, 999):02d}" for _ in range(600)]
+    pm_names = {job: rng.choice(pms) for job in jobs}
+    routing = {(pm.upper(), d): f"R{i}{j}" for i, pm in enumerate(pms[:5]) for j, d in enumerate(["SHOP", "FIELD", "OFFICE"])}
+    raw_jobs = [rng.choice([rng.choice(jobs), float(rng.choice(jobs)), f"{rng.randint(1000, 9999)}.0", "", "nan", "24.6", None])
+                for _ in range(count)]
+    df_po = pd.DataFrame({
+        "Job_Number": pd.Series(raw_jobs, dtype=object),
+        "ordered_by": [rng.choice(["", "Someone", None]) for _ in range(count)],
+        "distribution_code": [rng.choice(["shop", "Field ", "", None, "other"]) for _ in range(count)],
+    })
+
+    # Former form: clean_number, format_job_number, dict map and an iterrows() routing loop
+    def clean_number(val):
+        try:
+            return str(int(float(val))) if float(val).is_integer() else str(val)
+        except (TypeError, ValueError):
+            return str(val)
+
+    def format_job_number(val):
+        try:
+            return f"{float(val):.2f}"
+        except (TypeError, ValueError):
+            return str(val)
+
+    start = time.perf_counter()
+    old = df_po.copy()
+    old["Job_Number"] = old["Job_Number"].apply(clean_number)
+    old["Job_Number"] = old["Job_Number"].astype(str).str.strip().str.replace(r"\.0$", "", regex=True)
+    old["Job_Number"] = old["Job_Number"].apply(format_job_number)
+    old["ordered_by"] = old["Job_Number"].map(pm_names).fillna(old["ordered_by"]).fillna("")
+    codes = []
+    for _, row in old.iterrows():
+        ordered_by = str(row["ordered_by"]).strip().upper()
+        distribution_code = str(row["distribution_code"]).strip().upper()
+        codes.append(routing.get((ordered_by, distribution_code), "") if ordered_by and distribution_code else "")
+    old["routing_code"] = codes
+    old_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    new = df_po.copy()
+    new["Job_Number"] = normalize_numbers(normalize_numbers(new["Job_Number"]), decimals=2)
+    new["ordered_by"] = assign_ordered_by(new, pm_names)
+    new["routing_code"] = assign_routing_codes(new, routing)
+    new_seconds = time.perf_counter() - start
+
+    old_csv, new_csv = io.StringIO(), io.StringIO()
+    old.to_csv(old_csv, index=False)
+    new.to_csv(new_csv, index=False)
+    identical = old_csv.getvalue() == new_csv.getvalue()
+    print(f"INFO: PM/routing assignment over {count} rows: row loops {old_seconds:.2f} s, "
+          f"joins {new_seconds:.3f} s ({old_seconds / new_seconds:.0f}x); CSV {'identical' if identical else 'DIFFERS'}")
+    return identical
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "--benchmark-assignment":
+        print("=== PM / Routing Assignment Benchmark ===")
+        sys.exit(0 if benchmark_assignment(int(sys.argv[2]) if len(sys.argv) > 2 else 100000) else 1)
+
+    print("=== Reference Data Load Times ===")
+    print(f"INFO: Cache format: {'Feather' if FEATHER_AVAILABLE else 'pickle (pyarrow not installed)'}")
+    # Optional: python reference_data.py "<Project List path>"
+    report_cold_warm({"project_list": sys.argv[1]} if len(sys.argv) > 1 else None)
+
+    from vendor_index import report_cache_timing
+    report_cache_timing()
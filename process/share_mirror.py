@@ -0,0 +1,191 @@
+# Network Share Mirror for Invoice Processing Pipeline
+# This file keeps a local copy of the network folders and files the pipeline reads:
+# the projects PO folder (\\192.168.1.130\Projects\Raj) and the Project List workbook.
+# Each sync copies only files whose size or mtime changed and removes files deleted on
+# the share, so the pipeline reads from local disk instead of paying SMB latency per file.
+# The accounting share is not mirrored: the pipeline only writes there.
+#
+# Mirror layout: data/mirror/<target>/... plus data/mirror/mirror_state.json with the
+# last sync time and counts per target (network_config.get_mirror_status reads it).
+
+import os
+import json
+import time
+import shutil
+from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from network_config import get_network_path, get_project_list_path, is_server_reachable
+
+SHARE_MIRROR_CONFIG = {
+    "mirror_folder": "data/mirror",
+    "state_file": "mirror_state.json",
+    "max_age_seconds": 6 * 3600,       # an older mirror is reported stale and not used
+    "sync_wait_seconds": 120,          # readers fall back to the share if a sync runs longer
+}
+
+_sync_future = None
+
+def mirror_targets():
+    """Target name -> (network source, "dir" or "file")"""
+    return {
+        "projects_folder": (get_network_path(), "dir"),
+        "project_list": (get_project_list_path(), "file"),
+    }
+
+def mirror_path(name, source, kind, mirror_folder=None):
+    """Local path of a mirrored target; a file keeps its name inside the target folder"""
+    target_folder = os.path.join(mirror_folder or SHARE_MIRROR_CONFIG["mirror_folder"], name)
+    if kind == "file":
+        return os.path.join(target_folder, os.path.basename(source.rstrip("\\/").replace("\\", "/")))
+    return target_folder
+
+def _state_path(mirror_folder=None):
+    return os.path.join(mirror_folder or SHARE_MIRROR_CONFIG["mirror_folder"], SHARE_MIRROR_CONFIG["state_file"])
+
+def load_mirror_state(mirror_folder=None):
+    path = _state_path(mirror_folder)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"WARNING: Ignoring unreadable mirror state {path}: {e}")
+        return {}
+
+def _save_mirror_state(state, mirror_folder=None):
+    path = _state_path(mirror_folder)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+def _source_files(source, kind):
+    """Name -> (size, mtime) of the files to mirror from source"""
+    if kind == "file":
+        stat = os.stat(source)
+        return {os.path.basename(source.rstrip("\\/").replace("\\", "/")): (stat.st_size, int(stat.st_mtime))}
+    with os.scandir(source) as entries:
+        return {entry.name: (entry.stat().st_size, int(entry.stat().st_mtime)) for entry in entries if entry.is_file()}
+
+def sync_target(name, source, kind, mirror_folder=None):
+    """
+    Bring one mirrored target up to date with its source and return the sync counts.
+    Files are copied with their mtime (shutil.copy2), so an unchanged file is recognised on the next sync.
+    """
+    start = time.perf_counter()
+    local = mirror_path(name, source, kind, mirror_folder)
+    local_folder = os.path.dirname(local) if kind == "file" else local
+    source_folder = os.path.dirname(source.rstrip("\\/")) if kind == "file" else source
+    os.makedirs(local_folder, exist_ok=True)
+
+    files = _source_files(source, kind)
+    copied = deleted = copied_bytes = 0
+    for file_name, (size, mtime) in files.items():
+        local_file = os.path.join(local_folder, file_name)
+        if os.path.exists(local_file):
+            stat = os.stat(local_file)
+            if (stat.st_size, int(stat.st_mtime)) == (size, mtime):
+                continue
+        tmp_file = f"{local_file}.{os.getpid()}.tmp"
+        shutil.copy2(os.path.join(source_folder, file_name), tmp_file)
+        os.replace(tmp_file, local_file)
+        copied += 1
+        copied_bytes += size
+
+    for file_name in os.listdir(local_folder):
+        if file_name not in files and not file_name.endswith(".tmp"):
+            os.remove(os.path.join(local_folder, file_name))
+            deleted += 1
+
+    return {
+        "files": len(files),
+        "copied": copied,
+        "deleted": deleted,
+        "bytes": copied_bytes,
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+
+def sync_mirror(targets=None, mirror_folder=None):
+    """Sync every target that is reachable; returns target name -> counts, or None for a target that failed"""
+    targets = targets or mirror_targets()
+    state = load_mirror_state(mirror_folder)
+    results = {}
+    for name, (source, kind) in targets.items():
+        if source.startswith("\\\\") and not is_server_reachable(source[2:].split("\\")[0]):
+            print(f"WARNING: Mirror sync of {name} skipped, server not reachable: {source}")
+            results[name] = None
+            continue
+        try:
+            counts = sync_target(name, source, kind, mirror_folder)
+        except OSError as e:
+            print(f"WARNING: Mirror sync of {name} from {source} failed: {e}")
+            results[name] = None
+            continue
+        state[name] = dict(counts, source=source, kind=kind, synced_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        results[name] = counts
+        print(f"INFO: Mirror {name}: {counts['copied']} of {counts['files']} file(s) copied "
+              f"({counts['bytes'] / 1024 / 1024:.1f} MB), {counts['deleted']} deleted, in {counts['seconds']:.1f} s")
+    _save_mirror_state(state, mirror_folder)
+    return results
+
+def start_mirror_sync(background=True, targets=None, mirror_folder=None):
+    """Start a sync (on a daemon thread by default); mirrored() waits for it before answering"""
+    global _sync_future
+    if background:
+        from approval_gate import run_in_background
+
+        _sync_future = run_in_background(lambda: sync_mirror(targets, mirror_folder), name="share-mirror")
+    else:
+        from concurrent.futures import Future
+
+        _sync_future = Future()
+        _sync_future.set_result(sync_mirror(targets, mirror_folder))
+    return _sync_future
+
+def mirror_status(mirror_folder=None):
+    """Target name -> last sync time, age in seconds, local path and whether it is fresh enough to read from"""
+    status = {}
+    for name, entry in load_mirror_state(mirror_folder).items():
+        age = time.time() - datetime.strptime(entry["synced_at"], "%Y-%m-%d %H:%M:%S").timestamp()
+        status[name] = {
+            "synced_at": entry["synced_at"],
+            "age_seconds": int(age),
+            "fresh": age <= SHARE_MIRROR_CONFIG["max_age_seconds"],
+            "files": entry["files"],
+            "path": mirror_path(name, entry["source"], entry["kind"], mirror_folder),
+        }
+    return status
+
+def mirrored(name, fallback, mirror_folder=None):
+    """
+    The mirror's copy of a target when it is fresh, else fallback (normally the network path).
+    Waits up to sync_wait_seconds for a sync started with start_mirror_sync, so readers never
+    see a half-synced mirror; a sync still running after that (a slow share) returns fallback.
+    """
+    if _sync_future is not None:
+        try:
+            _sync_future.result(timeout=SHARE_MIRROR_CONFIG["sync_wait_seconds"])
+        except FutureTimeoutError:
+            print(f"WARNING: Mirror sync still running after {SHARE_MIRROR_CONFIG['sync_wait_seconds']} s, "
+                  f"reading {name} from {fallback}")
+            return fallback
+        except Exception as e:
+            print(f"WARNING: Mirror sync failed: {e}")
+    status = mirror_status(mirror_folder).get(name)
+    return status["path"] if status and status["fresh"] else fallback
+
+if __name__ == "__main__":
+    import sys
+
+    print("=== Share Mirror Sync ===")
+    if len(sys.argv) > 1:
+        # A local folder standing in for the projects share, e.g. to test delta sync
+        sync_mirror({"projects_folder": (sys.argv[1], "dir")}, sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        sync_mirror()
+    for name, status in mirror_status(sys.argv[2] if len(sys.argv) > 2 else None).items():
+        print(f"INFO: {name}: synced {status['synced_at']} ({status['age_seconds']} s ago), "
+              f"{status['files']} file(s), {'fresh' if status['fresh'] else 'stale'}")
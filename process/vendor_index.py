@@ -0,0 +1,303 @@
+# Vendor Index for Invoice Processing Pipeline
+# This file contains the vendor-matching text helpers and the address-token
+# blocking index used to skip vendors that cannot match an OCR document
+
+import os
+import re
+import json
+import time
+import pickle
+import hashlib
+
+# Blocking settings
+VENDOR_INDEX_CONFIG = {
+    "vendor_csv": "data/Vendor_List.csv",
+    "cache_path": "data/cache/vendor_index.pkl",
+    "company_address_blocks": ["535 railroad ave", "535 railroad avenue"],
+    "min_number_length": 2,        # "94" or "99a" is kept, "2" (as in "Ste. 2") is not
+    "min_word_length": 3,
+    "max_word_share": 0.05,        # words used by more than 5% of vendor addresses are not discriminative
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# --- Text helpers shared by the pipeline and the blocking report ---
+def normalize_digits(text):
+    return re.sub(r'\D+', '', str(text))
+
+def extract_contact_numbers(text):
+    return re.findall(r'\b\d{10,}\b', normalize_digits(text))
+
+def remove_company_address(text):
+    for block in VENDOR_INDEX_CONFIG["company_address_blocks"]:
+        text = text.replace(block, "")
+    return text
+
+def address_tokens(text):
+    """Split lowercased text into the same alphanumeric tokens fuzz.token_set_ratio compares"""
+    return set(TOKEN_PATTERN.findall(str(text).lower()))
+
+def _is_number_token(token):
+    return any(ch.isdigit() for ch in token) and len(token) >= VENDOR_INDEX_CONFIG["min_number_length"]
+
+def build_vendor_index(vendor_df):
+    """
+    Build the blocking index for a prepared vendor DataFrame.
+    Returns a dict with:
+    - token_index: discriminative address token -> list of row positions
+    - phone_map: normalized contact digits -> list of row positions
+    - unblocked: row positions with an address but no discriminative token (always scored)
+    - size: number of vendor rows
+    """
+    addresses = [str(a).lower() for a in vendor_df["Vendor_Address"].tolist()]
+    contacts = [normalize_digits(c) for c in vendor_df["Vendor_Contact"].tolist()]
+
+    row_tokens = [address_tokens(a) if a.strip() else set() for a in addresses]
+    addressed = sum(1 for tokens in row_tokens if tokens)
+
+    # Document frequency decides which words are rare enough to block on
+    word_df = {}
+    for tokens in row_tokens:
+        for token in tokens:
+            if not _is_number_token(token):
+                word_df[token] = word_df.get(token, 0) + 1
+    max_word_df = max(1, int(addressed * VENDOR_INDEX_CONFIG["max_word_share"]))
+
+    token_index = {}
+    unblocked = []
+    for pos, tokens in enumerate(row_tokens):
+        if not tokens:
+            continue
+        keys = [
+            t for t in tokens
+            if _is_number_token(t)
+            or (len(t) >= VENDOR_INDEX_CONFIG["min_word_length"] and word_df.get(t, 0) <= max_word_df)
+        ]
+        if not keys:
+            unblocked.append(pos)
+            continue
+        for key in keys:
+            token_index.setdefault(key, []).append(pos)
+
+    phone_map = {}
+    for pos, contact in enumerate(contacts):
+        if contact:
+            phone_map.setdefault(contact, []).append(pos)
+
+    return {
+        "token_index": token_index,
+        "phone_map": phone_map,
+        "unblocked": unblocked,
+        "size": len(addresses),
+    }
+
+def candidate_rows(index, normalized_txt, txt_digits):
+    """
+    Return the sorted row positions worth scoring for one OCR document.
+    normalized_txt must already be lowercased and passed through remove_company_address.
+    """
+    candidates = set(index["unblocked"])
+
+    token_index = index["token_index"]
+    for token in address_tokens(normalized_txt):
+        rows = token_index.get(token)
+        if rows:
+            candidates.update(rows)
+
+    # Contact matching is a substring test against the document digits, so check every known number
+    candidates.update(phone_rows(index, txt_digits))
+
+    return sorted(candidates)
+
+def match_vendor_fuzzy(txt_file, normalized_txt, txt_digits, vendor_df, rows=None):
+    """
+    Score vendor rows against one OCR document and return the best match, or None.
+    A vendor matches on an address token-set score of 80+ or on its phone number;
+    rows limits scoring to the given row positions (e.g. from candidate_rows).
+    """
+    from fuzzywuzzy import fuzz
+
+    best_match = None
+    best_score = 0
+
+    frame = vendor_df if rows is None else vendor_df.iloc[rows]
+    for _, row in frame.iterrows():
+        contact = normalize_digits(row['Vendor_Contact'])
+        address = str(row['Vendor_Address']).lower()
+
+        contact_matched = any(contact in c for c in txt_digits) if contact else False
+        address_score = fuzz.token_set_ratio(address, normalized_txt) if address else 0
+        address_matched = address_score >= 80
+
+        if address_matched or contact_matched:
+            combined_score = address_score + (10 if contact_matched else 0)
+
+            if combined_score > best_score:
+                best_score = combined_score
+                best_match = {
+                    "TXT_File": txt_file,
+                    "Vendor_Code": row['Vendor_Code'],
+                    "Vendor_Name": row['Vendor_Name'],
+                    "Vendor_Contact": row['Vendor_Contact'],
+                    "Vendor_Address": row['Vendor_Address'],
+                    "Address_Match_Score": address_score,
+                    "Matched_Contact": contact if contact_matched else "",
+                    "Matched_By": "contact + address" if (contact_matched and address_matched)
+                                  else "address only" if address_matched else "contact only"
+                }
+
+    return best_match
+
+def phone_rows(index, txt_digits):
+    """Row positions whose contact number appears in the document digits"""
+    rows = set()
+    if txt_digits:
+        for contact, positions in index["phone_map"].items():
+            if any(contact in c for c in txt_digits):
+                rows.update(positions)
+    return rows
+
+def prepare_match_df(vendor_df):
+    """Prepare a raw vendor frame the way the matching step expects"""
+    match_df = vendor_df.dropna(subset=['Vendor_Name']).copy()
+    match_df['Vendor_Contact'] = match_df['Vendor_Contact'].fillna("")
+    match_df['Vendor_Address'] = match_df['Vendor_Address'].fillna("")
+    return match_df.reset_index(drop=True)
+
+def load_vendor_list(csv_path=None):
+    """Load Vendor_List.csv prepared the way the matching step expects"""
+    return load_vendor_data(csv_path)["match_df"]
+
+# --- Persisted vendor cache ---
+# Holds the raw vendor frame (GL enrichment), the matching frame, the phone map, the token index
+# and the TF-IDF matrix; bump the version when the cached structures change
+VENDOR_CACHE_VERSION = 2
+_loaded_vendor_data = {}
+
+def file_signature(path):
+    """Size, mtime and content hash of a file; any change invalidates derived caches"""
+    stat = os.stat(path)
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+
+def _build_vendor_data(csv_path):
+    import pandas as pd
+    from vendor_tfidf import build_tfidf_matrix
+
+    vendor_df = pd.read_csv(csv_path)
+    vendor_df["Vendor_Code"] = vendor_df["Vendor_Code"].astype(str).str.strip()
+    match_df = prepare_match_df(vendor_df)
+    return {
+        "vendor_df": vendor_df,
+        "match_df": match_df,
+        "index": build_vendor_index(match_df),
+        "tfidf": build_tfidf_matrix(match_df),
+    }
+
+def load_vendor_data(csv_path=None, cache_path=None, rebuild=False):
+    """
+    Return vendor data for csv_path, loading it from the binary cache when the CSV is unchanged.
+    The cache is rebuilt automatically when the CSV's size, mtime or content hash changes.
+    Returns a dict with vendor_df, match_df, index (see build_vendor_index) and tfidf
+    (see vendor_tfidf.build_tfidf_matrix).
+    """
+    csv_path = csv_path or VENDOR_INDEX_CONFIG["vendor_csv"]
+    cache_path = cache_path or VENDOR_INDEX_CONFIG["cache_path"]
+    signature = dict(file_signature(csv_path), version=VENDOR_CACHE_VERSION)
+
+    # Matching and GL enrichment both ask for the vendor list; parse it once per process
+    memo = _loaded_vendor_data.get(os.path.abspath(csv_path))
+    if memo and memo["signature"] == signature and not rebuild:
+        return memo["data"]
+
+    data = None
+    if not rebuild and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("signature") == signature:
+                data = cached["data"]
+        except Exception as e:
+            print(f"WARNING: Ignoring unreadable vendor cache {cache_path}: {e}")
+
+    if data is None:
+        data = _build_vendor_data(csv_path)
+        try:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "wb") as f:
+                pickle.dump({"signature": signature, "data": data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            print(f"WARNING: Could not write vendor cache {cache_path}: {e}")
+
+    _loaded_vendor_data[os.path.abspath(csv_path)] = {"signature": signature, "data": data}
+    return data
+
+def report_cache_timing(csv_path=None, cache_path=None):
+    """Report vendor data load time with a cold cache versus a warm one"""
+    start = time.perf_counter()
+    load_vendor_data(csv_path, cache_path, rebuild=True)
+    cold_ms = (time.perf_counter() - start) * 1000
+
+    _loaded_vendor_data.clear()
+    start = time.perf_counter()
+    load_vendor_data(csv_path, cache_path)
+    warm_ms = (time.perf_counter() - start) * 1000
+
+    print(f"INFO: Vendor data load (cold, CSV parse + index build): {cold_ms:.1f} ms")
+    print(f"INFO: Vendor data load (warm, binary cache): {warm_ms:.1f} ms")
+
+def report_blocking(ocr_folder, approval_status_path, csv_path=None):
+    """
+    Report pruning ratio and recall of the blocking stage on approved history.
+    Recall counts approved matches whose vendor survives blocking for its OCR file.
+    """
+    vendor_df = load_vendor_list(csv_path)
+    index = build_vendor_index(vendor_df)
+    codes = vendor_df["Vendor_Code"].tolist()
+
+    with open(approval_status_path, "r", encoding="utf-8") as f:
+        approved = {m["TXT_File"]: str(m["Vendor_Code"]).strip() for m in json.load(f).get("approved_matches", [])}
+
+    scored = 0
+    documents = 0
+    kept = 0
+    checked = 0
+    for txt_file in sorted(os.listdir(ocr_folder)):
+        if not txt_file.endswith(".txt"):
+            continue
+        with open(os.path.join(ocr_folder, txt_file), "r", encoding="utf-8") as f:
+            txt_content = f.read()
+        rows = candidate_rows(index, remove_company_address(txt_content.lower()), extract_contact_numbers(txt_content))
+        documents += 1
+        scored += len(rows)
+
+        if txt_file in approved and approved[txt_file] in codes:
+            checked += 1
+            if any(codes[pos] == approved[txt_file] for pos in rows):
+                kept += 1
+            else:
+                print(f"WARNING: Blocking dropped approved vendor {approved[txt_file]} for {txt_file}")
+
+    total = documents * index["size"]
+    print(f"INFO: Vendors in index: {index['size']} ({len(index['token_index'])} tokens, {len(index['unblocked'])} always scored)")
+    print(f"INFO: Documents: {documents}")
+    if total:
+        print(f"INFO: Pruning ratio: {1 - scored / total:.1%} ({scored} of {total} vendor comparisons scored)")
+    if checked:
+        print(f"INFO: Recall on approved history: {kept / checked:.1%} ({kept} of {checked})")
+    else:
+        print("WARNING: No approved matches with OCR text available to measure recall")
+
+if __name__ == "__main__":
+    import sys
+
+    print("=== Vendor Cache Timing ===")
+    report_cache_timing()
+
+    print("\n=== Vendor Blocking Report ===")
+    ocr_folder = sys.argv[1] if len(sys.argv) > 1 else "data/OCR_text_Test"
+    approval_status_path = sys.argv[2] if len(sys.argv) > 2 else "outputs/excel_files/approval_status.json"
+    report_blocking(ocr_folder, approval_status_path)
@@ -0,0 +1,216 @@
+# Vendor Matching Scaling Benchmark
+# Generates synthetic vendor masters and noisy OCR invoices, then times the
+# "Match Vendors from .txt" loop against the blocked and TF-IDF matchers
+#
+# Usage: python vendor_match_benchmark.py [--sizes 500 2000 10000 50000] [--invoices 20]
+
+import os
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+from vendor_index import (
+    extract_contact_numbers, remove_company_address, build_vendor_index,
+    candidate_rows, match_vendor_fuzzy
+)
+from vendor_tfidf import build_tfidf_matrix, tfidf_candidates
+
+BENCHMARK_CONFIG = {
+    "sizes": [500, 2000, 10000, 50000],
+    "invoices": 20,
+    "full_loop_max_rows": 10000,   # the unblocked loop is skipped above this size
+    "memory_invoices": 3,          # invoices matched while tracing peak memory
+    "output_json": "outputs/benchmarks/vendor_matching.json",
+    "seed": 42,
+}
+
+STREET_WORDS = [
+    "Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Washington", "Lake", "Hill", "Park",
+    "Sunset", "Valley", "Mission", "Industrial", "Commerce", "Harbor", "Bay", "Canyon", "Ridge", "Mill",
+    "Willow", "Atlantic", "Pacific", "Galaxy", "Aviation", "Davidson", "Vernon", "Puente", "Shoreline", "Airport",
+]
+STREET_TYPES = ["St.", "Ave.", "Blvd.", "Dr.", "Way", "Ct.", "Rd.", "Street", "Avenue", "Drive"]
+CITIES = [
+    ("San Francisco", "CA", "941"), ("Oakland", "CA", "946"), ("Hayward", "CA", "945"), ("San Jose", "CA", "951"),
+    ("Los Angeles", "CA", "900"), ("Pasadena", "CA", "911"), ("Chicago", "IL", "606"), ("Dallas", "TX", "752"),
+    ("Brisbane", "CA", "940"), ("Concord", "CA", "945"), ("Roseville", "CA", "956"), ("Corona", "CA", "928"),
+]
+NAME_WORDS = [
+    "Pacific", "Bay", "Golden", "State", "Valley", "Summit", "Allied", "United", "Western", "Metro",
+    "Precision", "Supply", "Electric", "Mechanical", "Plumbing", "Steel", "Industrial", "Equipment", "Air", "Fluid",
+]
+NAME_SUFFIXES = ["Inc.", "LLC", "Co.", "Corp.", "Supply", "Distributors", "Sales"]
+OCR_CONFUSIONS = {"0": "O", "O": "0", "1": "l", "l": "1", "5": "S", "S": "5", "8": "B", "B": "8", "e": "c", "rn": "m"}
+
+def synthetic_vendor_master(rows, rng):
+    """Vendor_List-shaped frame with random names, addresses and (for some vendors) phone numbers"""
+    records = []
+    for i in range(rows):
+        city, state, zip_prefix = rng.choice(CITIES)
+        address = (f"{rng.randint(1, 9999)} {rng.choice(STREET_WORDS)} {rng.choice(STREET_TYPES)}\n"
+                   f"{city}, {state} {zip_prefix}{rng.randint(0, 99):02d}")
+        if rng.random() < 0.15:
+            address = f"P.O. Box {rng.randint(100, 999999)}\n{city}, {state} {zip_prefix}{rng.randint(0, 99):02d}"
+        phone = f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}" if rng.random() < 0.3 else ""
+        records.append({
+            "Vendor_Code": f"V{i:06d}",
+            "Vendor_Name": f"{rng.choice(NAME_WORDS)} {rng.choice(NAME_WORDS)} {rng.choice(NAME_SUFFIXES)}",
+            "Vendor_Contact": phone,
+            "Vendor_Address": address if rng.random() < 0.9 else "",
+        })
+    return pd.DataFrame(records)
+
+def _ocr_noise(text, rng, rate=0.03):
+    """Apply OCR-style character confusions, dropped punctuation and broken spacing"""
+    out = []
+    i = 0
+    while i < len(text):
+        pair = text[i:i + 2]
+        if pair in OCR_CONFUSIONS and rng.random() < rate:
+            out.append(OCR_CONFUSIONS[pair])
+            i += 2
+            continue
+        ch = text[i]
+        if ch in OCR_CONFUSIONS and rng.random() < rate:
+            out.append(OCR_CONFUSIONS[ch])
+        elif ch in ".,#" and rng.random() < 0.3:
+            pass
+        elif ch == " " and rng.random() < rate:
+            out.append("  ")
+        else:
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+def synthetic_invoice(vendor, rng):
+    """OCR-like invoice text for one vendor, including our own bill-to address"""
+    phone = ""
+    digits = "".join(ch for ch in vendor["Vendor_Contact"] if ch.isdigit())
+    if digits and rng.random() < 0.7:
+        phone = rng.choice([
+            vendor["Vendor_Contact"],
+            f"{digits[:3]}.{digits[3:6]}.{digits[6:]}",
+            f"{digits[:3]}-{digits[3:6]}-{digits[6:]}",
+        ])
+    lines = [
+        "--- Page 1 ---",
+        _ocr_noise(vendor["Vendor_Name"], rng),
+        *[_ocr_noise(line, rng) for line in vendor["Vendor_Address"].splitlines()],
+        f"Phone: {phone}" if phone else "",
+        f"INVOICE {rng.randint(100000, 999999)}",
+        f"Invoice Date {rng.randint(1, 12):02d}/{rng.randint(1, 28):02d}/25",
+        "Bill To: 535 Railroad Ave",
+        "Suisun City, CA 94585",
+        f"Customer PO: {rng.randint(1000, 9999)}",
+    ]
+    for seq in range(rng.randint(2, 12)):
+        qty = rng.randint(1, 50)
+        price = rng.uniform(1, 500)
+        lines.append(f"{seq + 1} PART-{rng.randint(1000, 99999)} Widget {qty} EA {price:.2f} {qty * price:,.2f}")
+    subtotal = rng.uniform(100, 20000)
+    lines += [f"Subtotal {subtotal:,.2f}", f"Sales Tax {subtotal * 0.0925:,.2f}", f"Total Due {subtotal * 1.0925:,.2f}"]
+    return "\n".join(line for line in lines if line)
+
+def _run_matcher(name, vendor_df, documents):
+    """Build the matcher's structures and match every document; returns (build seconds, match seconds, codes)"""
+    start = time.perf_counter()
+    index = build_vendor_index(vendor_df) if name != "full" else None
+    matrix = build_tfidf_matrix(vendor_df) if name == "tfidf" else None
+    build_seconds = time.perf_counter() - start
+
+    codes = []
+    start = time.perf_counter()
+    for txt_file, normalized_txt, txt_digits in documents:
+        if name == "full":
+            rows = None
+        elif name == "blocked":
+            rows = candidate_rows(index, normalized_txt, txt_digits)
+        else:
+            rows = tfidf_candidates(matrix, index, normalized_txt, txt_digits)
+        match = match_vendor_fuzzy(txt_file, normalized_txt, txt_digits, vendor_df, rows)
+        codes.append(match["Vendor_Code"] if match else "")
+    return build_seconds, time.perf_counter() - start, codes
+
+def benchmark_size(rows, invoices, full_loop_max_rows, memory_invoices, rng):
+    vendor_df = synthetic_vendor_master(rows, rng)
+    picks = rng.sample(range(rows), min(invoices, rows))
+
+    documents = []
+    truth = []
+    for pos in picks:
+        text = synthetic_invoice(vendor_df.iloc[pos], rng)
+        documents.append((f"synthetic_{pos}.txt", remove_company_address(text.lower()), extract_contact_numbers(text)))
+        truth.append(vendor_df.iloc[pos]["Vendor_Code"])
+
+    matchers = ["blocked", "tfidf"]
+    if rows <= full_loop_max_rows:
+        matchers.insert(0, "full")
+
+    result = {"vendors": rows, "invoices": len(documents), "matchers": {}}
+    reference = None
+    for name in matchers:
+        build_seconds, match_seconds, codes = _run_matcher(name, vendor_df, documents)
+
+        tracemalloc.start()
+        _run_matcher(name, vendor_df, documents[:memory_invoices])
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if name == "full":
+            reference = codes
+        stats = {
+            "build_seconds": round(build_seconds, 4),
+            "total_seconds": round(build_seconds + match_seconds, 4),
+            "ms_per_invoice": round(match_seconds * 1000 / max(len(documents), 1), 2),
+            "peak_memory_mb": round(peak / 1024 / 1024, 2),
+            "accuracy": round(sum(1 for c, t in zip(codes, truth) if c == t) / max(len(truth), 1), 4),
+        }
+        if reference is not None:
+            stats["agreement_with_full"] = round(sum(1 for c, r in zip(codes, reference) if c == r) / max(len(codes), 1), 4)
+        result["matchers"][name] = stats
+        print(f"INFO: {rows:>6} vendors | {name:<7} | {stats['ms_per_invoice']:>9.2f} ms/invoice | "
+              f"total {stats['total_seconds']:>8.2f} s | peak {stats['peak_memory_mb']:>7.2f} MB | "
+              f"accuracy {stats['accuracy']:.1%}"
+              + (f" | agreement {stats['agreement_with_full']:.1%}" if "agreement_with_full" in stats else ""))
+    return result
+
+def append_results(results, output_json):
+    """Append this run to the JSON history file so results can be tracked over time"""
+    history = []
+    if os.path.exists(output_json):
+        try:
+            with open(output_json, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except Exception as e:
+            print(f"WARNING: Starting a new benchmark history, could not read {output_json}: {e}")
+    history.append(results)
+    os.makedirs(os.path.dirname(output_json) or ".", exist_ok=True)
+    with open(output_json, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vendor matching scaling benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=BENCHMARK_CONFIG["sizes"])
+    parser.add_argument("--invoices", type=int, default=BENCHMARK_CONFIG["invoices"])
+    parser.add_argument("--full-loop-max-rows", type=int, default=BENCHMARK_CONFIG["full_loop_max_rows"])
+    parser.add_argument("--output", default=BENCHMARK_CONFIG["output_json"])
+    parser.add_argument("--seed", type=int, default=BENCHMARK_CONFIG["seed"])
+    args = parser.parse_args()
+
+    print("=== Vendor Matching Scaling Benchmark ===")
+    rng = random.Random(args.seed)
+    results = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "seed": args.seed,
+        "sizes": [
+            benchmark_size(rows, args.invoices, args.full_loop_max_rows, BENCHMARK_CONFIG["memory_invoices"], rng)
+            for rows in args.sizes
+        ],
+    }
+    append_results(results, args.output)
+    print(f"SUCCESS: Benchmark results appended to {args.output}")
@@ -0,0 +1,147 @@
+# Vendor Memo for Invoice Processing Pipeline
+# This file remembers which vendors a human approved for a given letterhead,
+# so repeat vendors are matched without fuzzy scoring. Vendors printing from the same
+# invoice template share a letterhead, so each letterhead keeps a list of vendors and
+# one is only used when its phone number or its address numbers (street number, ZIP)
+# appear in the document.
+
+import os
+import re
+import json
+import hashlib
+from datetime import datetime
+
+from vendor_index import VENDOR_INDEX_CONFIG, normalize_digits, remove_company_address, address_tokens
+
+VENDOR_MEMO_CONFIG = {
+    "memo_path": "data/cache/vendor_memo.json",
+    "letterhead_lines": 8,         # first N normalized lines of the OCR text
+    "min_letterhead_lines": 3,     # fewer lines than this is too little to fingerprint
+    "max_vendors_per_letterhead": 10,   # most recently approved vendors kept per letterhead
+}
+
+PAGE_MARKER = re.compile(r"^-+\s*page\s+\d+\s*-+$")
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+def letterhead_fingerprint(txt_content):
+    """
+    Fingerprint the letterhead region of an invoice's OCR text.
+    Only alphabetic words are kept, so invoice numbers, dates and amounts
+    printed in the header do not change the fingerprint between invoices.
+    Returns None when the text has too few usable lines.
+    """
+    lines = []
+    for line in remove_company_address(str(txt_content).lower()).splitlines():
+        line = line.strip()
+        if not line or PAGE_MARKER.match(line):
+            continue
+        words = WORD_PATTERN.findall(line)
+        if words:
+            lines.append(" ".join(words))
+        if len(lines) >= VENDOR_MEMO_CONFIG["letterhead_lines"]:
+            break
+
+    if len(lines) < VENDOR_MEMO_CONFIG["min_letterhead_lines"]:
+        return None
+    return hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+def vendor_signature(address, contact):
+    """Hash of a vendor's address and contact; a change expires memo entries for that vendor"""
+    address_words = " ".join(re.findall(r"[a-z0-9]+", str(address).lower()))
+    return hashlib.sha1(f"{address_words}|{normalize_digits(contact)}".encode("utf-8")).hexdigest()
+
+def load_memo(memo_path=None):
+    """Load the memo; a missing or unreadable file starts an empty memo"""
+    memo_path = memo_path or VENDOR_MEMO_CONFIG["memo_path"]
+    if not os.path.exists(memo_path):
+        return {}
+    try:
+        with open(memo_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"WARNING: Ignoring unreadable vendor memo {memo_path}: {e}")
+        return {}
+
+def save_memo(memo, memo_path=None):
+    memo_path = memo_path or VENDOR_MEMO_CONFIG["memo_path"]
+    os.makedirs(os.path.dirname(memo_path) or ".", exist_ok=True)
+    tmp_path = memo_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(memo, f, indent=2)
+    os.replace(tmp_path, memo_path)
+
+def vendor_rows_by_code(vendor_df):
+    """Map Vendor_Code to its first row in the matching frame"""
+    rows = {}
+    for _, row in vendor_df.iterrows():
+        rows.setdefault(str(row["Vendor_Code"]).strip(), row)
+    return rows
+
+def vendor_in_document(row, normalized_txt, txt_digits):
+    """
+    True when the vendor's contact number is among the document's digits, or every number
+    in its address (street number, ZIP) is among the document's tokens
+    """
+    contact = normalize_digits(row["Vendor_Contact"])
+    if contact and any(contact in digits for digits in txt_digits):
+        return True
+    numbers = {
+        token for token in address_tokens(row["Vendor_Address"])
+        if any(ch.isdigit() for ch in token) and len(token) >= VENDOR_INDEX_CONFIG["min_number_length"]
+    }
+    return bool(numbers) and numbers <= address_tokens(normalized_txt)
+
+def _memo_entries(memo, fingerprint):
+    """The vendor entries remembered for a letterhead, newest first; older memos hold a single entry"""
+    entries = memo.get(fingerprint) or []
+    return [entries] if isinstance(entries, dict) else entries
+
+def lookup_vendor(memo, fingerprint, vendor_rows, normalized_txt, txt_digits):
+    """
+    Return (vendor row, memo entry) for the first vendor remembered for a letterhead whose
+    phone or address numbers are in the document, or (None, None).
+    Entries whose vendor disappeared or whose address/contact changed are expired.
+    Vendors not in the document (others on the same invoice template) are kept; when none
+    is in the document, the document is scored.
+    """
+    if not fingerprint or fingerprint not in memo:
+        return None, None
+
+    entries = []
+    for entry in _memo_entries(memo, fingerprint):
+        row = vendor_rows.get(entry.get("Vendor_Code", ""))
+        if row is None or vendor_signature(row["Vendor_Address"], row["Vendor_Contact"]) != entry.get("Vendor_Signature"):
+            print(f"INFO: Expired vendor memo entry for {entry.get('Vendor_Code', '')} (vendor details changed)")
+            continue
+        entries.append((row, entry))
+    if entries:
+        memo[fingerprint] = [entry for _, entry in entries]
+    else:
+        del memo[fingerprint]
+
+    for row, entry in entries:
+        if vendor_in_document(row, normalized_txt, txt_digits):
+            return row, entry
+    if entries:
+        codes = ", ".join(entry.get("Vendor_Code", "") for _, entry in entries)
+        print(f"INFO: Letterhead remembered for {codes}, but no phone/address of theirs is in the document")
+    return None, None
+
+def remember_vendor(memo, fingerprint, vendor_code, vendor_rows, address_score=""):
+    """
+    Record a human-approved vendor for a letterhead, ahead of the other vendors remembered
+    for it (a re-approved vendor replaces its old entry); unknown vendor codes are not remembered
+    """
+    vendor_code = str(vendor_code).strip()
+    row = vendor_rows.get(vendor_code)
+    if not fingerprint or row is None:
+        return False
+    entry = {
+        "Vendor_Code": vendor_code,
+        "Vendor_Signature": vendor_signature(row["Vendor_Address"], row["Vendor_Contact"]),
+        "Address_Match_Score": address_score,
+        "Approved_At": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    others = [e for e in _memo_entries(memo, fingerprint) if e.get("Vendor_Code") != vendor_code]
+    memo[fingerprint] = ([entry] + others)[:VENDOR_MEMO_CONFIG["max_vendors_per_letterhead"]]
+    return True
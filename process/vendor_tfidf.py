@@ -0,0 +1,152 @@
+# Vendor TF-IDF Matcher for Invoice Processing Pipeline
+# This file embeds vendor names and addresses as character n-gram TF-IDF vectors
+# and shortlists vendors for an OCR document with one sparse matrix-vector product
+
+import os
+import re
+import math
+import time
+
+import numpy as np
+
+from vendor_index import extract_contact_numbers, remove_company_address, phone_rows, match_vendor_fuzzy
+
+VENDOR_TFIDF_CONFIG = {
+    "ngram": 3,
+    "top_k": 10,
+}
+
+NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+def char_ngrams(text, n=None):
+    """Character n-grams of lowercased text with punctuation collapsed to single spaces"""
+    n = n or VENDOR_TFIDF_CONFIG["ngram"]
+    text = " " + NON_ALNUM.sub(" ", str(text).lower()).strip() + " "
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+def build_tfidf_matrix(vendor_df):
+    """
+    Build the vendor n-gram matrix in compressed sparse column form.
+    Each vendor row is Vendor_Name + Vendor_Address, weighted by sublinear tf * smoothed idf
+    and L1-normalized, so a vendor's score is the idf-weighted share of its n-grams found
+    in the document.
+    Returns a dict with vocab (n-gram -> column), col_ptr, row_idx, values and size.
+    """
+    texts = (vendor_df["Vendor_Name"].fillna("").astype(str) + " " +
+             vendor_df["Vendor_Address"].fillna("").astype(str)).tolist()
+
+    vocab = {}
+    row_counts = []
+    doc_freq = []
+    for text in texts:
+        counts = {}
+        for gram in char_ngrams(text):
+            col = vocab.setdefault(gram, len(vocab))
+            counts[col] = counts.get(col, 0) + 1
+        for col in counts:
+            if col == len(doc_freq):
+                doc_freq.append(0)
+            doc_freq[col] += 1
+        row_counts.append(counts)
+
+    n_rows = len(texts)
+    idf = [math.log((1 + n_rows) / (1 + df)) + 1 for df in doc_freq]
+
+    # Collect (column, row, weight) triples, then sort by column for CSC layout
+    cols, rows, weights = [], [], []
+    for row, counts in enumerate(row_counts):
+        row_weights = {col: (1 + math.log(count)) * idf[col] for col, count in counts.items()}
+        total = sum(row_weights.values()) or 1.0
+        for col, weight in row_weights.items():
+            cols.append(col)
+            rows.append(row)
+            weights.append(weight / total)
+
+    cols = np.asarray(cols, dtype=np.int32)
+    order = np.argsort(cols, kind="stable")
+    col_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cols, minlength=len(vocab)), out=col_ptr[1:])
+
+    return {
+        "vocab": vocab,
+        "col_ptr": col_ptr,
+        "row_idx": np.asarray(rows, dtype=np.int32)[order],
+        "values": np.asarray(weights, dtype=np.float32)[order],
+        "size": n_rows,
+    }
+
+def score_document(matrix, normalized_txt):
+    """Score every vendor against a document: sparse matrix times the document's binary n-gram vector"""
+    vocab = matrix["vocab"]
+    cols = np.fromiter({vocab[g] for g in char_ngrams(normalized_txt) if g in vocab}, dtype=np.int64)
+    if cols.size == 0:
+        return np.zeros(matrix["size"], dtype=np.float64)
+
+    # Gather the nonzeros of the selected columns without a Python loop
+    starts = matrix["col_ptr"][cols]
+    lengths = matrix["col_ptr"][cols + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    nonzero = offsets + np.arange(lengths.sum())
+
+    return np.bincount(matrix["row_idx"][nonzero], weights=matrix["values"][nonzero], minlength=matrix["size"])
+
+def top_k_rows(scores, k=None):
+    """Row positions of the k best-scoring vendors (positive scores only), best first"""
+    k = min(k or VENDOR_TFIDF_CONFIG["top_k"], scores.size)
+    if k == 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[scores[top] > 0]
+    return top[np.argsort(-scores[top], kind="stable")].tolist()
+
+def tfidf_candidates(matrix, index, normalized_txt, txt_digits, k=None):
+    """
+    Shortlist for the fuzzy rerank: the TF-IDF top-k plus any vendor whose phone number
+    appears in the document. Returned in row order so the rerank breaks ties like the full loop.
+    """
+    candidates = set(top_k_rows(score_document(matrix, normalized_txt), k))
+    candidates.update(phone_rows(index, txt_digits))
+    return sorted(candidates)
+
+def benchmark_against_fuzzy(ocr_folder, csv_path=None):
+    """Compare the TF-IDF shortlist + rerank against the full fuzz.token_set_ratio loop"""
+    from vendor_index import load_vendor_data
+
+    data = load_vendor_data(csv_path)
+    vendor_df = data["match_df"]
+
+    documents = []
+    for txt_file in sorted(os.listdir(ocr_folder)):
+        if txt_file.endswith(".txt"):
+            with open(os.path.join(ocr_folder, txt_file), "r", encoding="utf-8") as f:
+                txt_content = f.read()
+            documents.append((txt_file, remove_company_address(txt_content.lower()), extract_contact_numbers(txt_content)))
+    if not documents:
+        print(f"WARNING: No OCR text files found in {ocr_folder}")
+        return
+
+    start = time.perf_counter()
+    fuzzy = [match_vendor_fuzzy(name, txt, digits, vendor_df) for name, txt, digits in documents]
+    fuzzy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tfidf = [
+        match_vendor_fuzzy(name, txt, digits, vendor_df, tfidf_candidates(data["tfidf"], data["index"], txt, digits))
+        for name, txt, digits in documents
+    ]
+    tfidf_seconds = time.perf_counter() - start
+
+    agree = sum(
+        1 for a, b in zip(fuzzy, tfidf)
+        if (a and a["Vendor_Code"]) == (b and b["Vendor_Code"])
+    )
+    print(f"INFO: Documents: {len(documents)}, vendors: {len(vendor_df)}")
+    print(f"INFO: Full fuzzy loop: {fuzzy_seconds * 1000 / len(documents):.1f} ms/invoice ({fuzzy_seconds:.2f} s total)")
+    print(f"INFO: TF-IDF + rerank: {tfidf_seconds * 1000 / len(documents):.1f} ms/invoice ({tfidf_seconds:.2f} s total)")
+    print(f"INFO: Agreement: {agree / len(documents):.1%} ({agree} of {len(documents)})")
+
+if __name__ == "__main__":
+    import sys
+
+    print("=== Vendor TF-IDF Benchmark ===")
+    benchmark_against_fuzzy(sys.argv[1] if len(sys.argv) > 1 else "data/OCR_text_Test")
@@ -0,0 +1,64 @@
+# Worker Pools for Invoice Processing Pipeline
+# The pipeline runs as a top-level script, so a spawned worker process (the default on
+# Windows) would re-run the whole script while importing __main__. This file starts
+# process pools whose workers import a helper module as __main__ instead.
+#
+# Pools are concurrent.futures.ProcessPoolExecutor with every worker started up front.
+# Unlike multiprocessing.Pool, the executor never replaces a worker that dies (e.g. on a
+# PDF that crashes fitz); pending and later calls fail with BrokenProcessPool instead,
+# so no worker is ever started after __main__ has been restored.
+
+import os
+import sys
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool  # noqa: F401  (re-exported for callers)
+
+WORKER_POOL_CONFIG = {
+    "max_processes": 8,
+    "start_timeout_seconds": 120,      # for every worker of a new pool to start
+}
+
+def default_processes():
+    return max(1, min(WORKER_POOL_CONFIG["max_processes"], (os.cpu_count() or 2) - 1))
+
+def _wait_for_pool(barrier):
+    """Worker initializer: no worker takes a call (and goes idle) before all of them have started"""
+    barrier.wait()
+
+def _started():
+    return os.getpid()
+
+def start_worker_pool(processes=None, main_module="worker_pool"):
+    """
+    Start a ProcessPoolExecutor with all its workers, each importing main_module as __main__.
+    A spawning executor starts a worker on submit only while none is idle. Workers wait at a
+    barrier until every one of them is up, so none is idle during the startup submits and each
+    submit starts one; the worker count is checked before __main__ is restored.
+    """
+    processes = processes or default_processes()
+    context = multiprocessing.get_context()
+    barrier = context.Barrier(processes, timeout=WORKER_POOL_CONFIG["start_timeout_seconds"])
+    original_main = sys.modules["__main__"]
+    sys.modules["__main__"] = importlib.import_module(main_module)
+    try:
+        pool = ProcessPoolExecutor(processes, mp_context=context, initializer=_wait_for_pool, initargs=(barrier,))
+        started = [pool.submit(_started) for _ in range(processes)]
+        if len(pool._processes) != processes:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise RuntimeError(f"Worker pool started {len(pool._processes)} of {processes} workers")
+    finally:
+        sys.modules["__main__"] = original_main
+    for future in started:
+        future.result()
+    return pool
+
+def stop_worker_pool(pool):
+    """Cancel the calls not yet started and let the workers exit after their current call"""
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def pool_call(pool, func, *args):
+    """Run func(*args) on the pool and await its result from asyncio"""
+    return asyncio.wrap_future(pool.submit(func, *args))
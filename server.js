@@ -5,6 +5,7 @@ import path from 'path';
 import fs from 'fs';
 import { fileURLToPath } from 'url';
 import { spawn } from 'child_process';
+import http from 'http';
 import XLSX from 'xlsx';
 import { PDFDocument } from 'pdf-lib';
 import Imap from 'imap';
@@ -25,6 +26,82 @@ app.use(express.json());
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+// Wake the Python pipeline's approval gate immediately (it falls back to polling the approval files)
+const APPROVAL_NOTIFY_PORT = process.env.APPROVAL_NOTIFY_PORT || 8765;
+function notifyApprovalGate(gate) {
+  const request = http.request({
+    host: '127.0.0.1',
+    port: APPROVAL_NOTIFY_PORT,
+    path: `/notify/${gate}`,
+    method: 'POST',
+    timeout: 1000
+  });
+  request.on('error', (error) => {
+    console.log(`Approval gate '${gate}' not notified (${error.message}); pipeline will pick up the file change`);
+  });
+  request.on('timeout', () => request.destroy());
+  request.end();
+}
+
+// Per-invoice approval records shared with the pipeline (see process/approval_records.py)
+const approvalRecordsDir = path.join(__dirname, 'process', 'outputs', 'excel_files', 'approvals');
+const APPROVAL_STATUSES = ['pending', 'approved', 'rejected', 'deferred'];
+
+function readApprovalRecords(gate) {
+  const recordsPath = path.join(approvalRecordsDir, `${gate}.json`);
+  if (!fs.existsSync(recordsPath)) {
+    return null;
+  }
+  try {
+    return JSON.parse(fs.readFileSync(recordsPath, 'utf-8'));
+  } catch (error) {
+    console.error(`Error reading ${gate} approval records:`, error);
+    return null;
+  }
+}
+
+// Apply decisions ({ key, status, data }) to existing records and optionally settle every other pending invoice
+function writeApprovalDecisions(gate, decisions, settlePendingAs = null) {
+  const payload = readApprovalRecords(gate);
+  if (!payload) {
+    console.log(`No ${gate} approval records to update`);
+    return null;
+  }
+  const now = new Date().toISOString().replace('T', ' ').slice(0, 19);
+  decisions.forEach(({ key, status, data }) => {
+    const record = payload.records[key];
+    if (!record) {
+      console.log(`Skipping ${gate} decision for unknown invoice ${key}`);
+      return;
+    }
+    record.status = status;
+    if (data) {
+      record.data = data;
+    }
+    record.updated_at = now;
+  });
+  if (settlePendingAs) {
+    Object.values(payload.records).forEach((record) => {
+      if (record.status === 'pending') {
+        record.status = settlePendingAs;
+        record.updated_at = now;
+      }
+    });
+  }
+  const recordsPath = path.join(approvalRecordsDir, `${gate}.json`);
+  fs.writeFileSync(recordsPath + '.tmp', JSON.stringify(payload, null, 2));
+  fs.renameSync(recordsPath + '.tmp', recordsPath);
+  return payload.records;
+}
+
+function countApprovalStatuses(records) {
+  const counts = Object.fromEntries(APPROVAL_STATUSES.map((status) => [status, 0]));
+  Object.values(records || {}).forEach((record) => {
+    counts[record.status] = (counts[record.status] || 0) + 1;
+  });
+  return counts;
+}
+
 // Ensure uploads directory exists
 const uploadsDir = path.join(__dirname, 'uploads');
 if (!fs.existsSync(uploadsDir)) {
@@ -900,6 +977,17 @@ app.post('/api/approve-vendors', async (req, res) => {
     };
 
     fs.writeFileSync(approvalStatusPath, JSON.stringify(approvalStatus, null, 2));
+
+    // Batch approval decides every invoice: listed matches are approved, the rest rejected
+    try {
+      writeApprovalDecisions(
+        'vendor',
+        approvedMatches.map((match) => ({ key: match.TXT_File, status: 'approved', data: match })),
+        'rejected'
+      );
+    } catch (error) {
+      console.error('Error writing vendor approval records:', error);
+    }
     
          // Update the CSV file with the edited data
      if (approvedMatches.length > 0) {
@@ -972,6 +1060,8 @@ app.post('/api/approve-vendors', async (req, res) => {
     } else {
       console.log('No approval flag found to remove');
     }
+
+    notifyApprovalGate('vendor');
     
     console.log('Approval status written successfully');
 
@@ -1228,6 +1318,13 @@ app.post('/api/approve-po-matches', async (req, res) => {
       console.log('Updated pixtral_po_results.csv with edited PO data');
     }
     
+    // Batch approval releases every PO; edits are already written to the CSV above
+    try {
+      writeApprovalDecisions('po', [], 'approved');
+    } catch (error) {
+      console.error('Error writing PO approval records:', error);
+    }
+
     // Remove the approval flag to indicate approval is complete
     const poApprovalFlagPath = path.join(__dirname, 'process', 'outputs', 'excel_files', 'po_approval_needed.flag');
     const lastPOContentHashPath = path.join(__dirname, 'process', 'outputs', 'excel_files', 'last_po_content_hash.txt');
@@ -1251,6 +1348,8 @@ app.post('/api/approve-po-matches', async (req, res) => {
     } else {
       console.log('WARNING: PO approval flag file not found at:', poApprovalFlagPath);
     }
+
+    notifyApprovalGate('po');
     
     // Clear the content hash to allow fresh data for next processing
     if (fs.existsSync(lastPOContentHashPath)) {
@@ -1275,6 +1374,107 @@ app.post('/api/approve-po-matches', async (req, res) => {
   }
 });
 
+// Record approval decisions for individual invoices so they continue without waiting for the batch
+app.post('/api/approve-invoices', async (req, res) => {
+  try {
+    const { gate, decisions } = req.body;
+
+    if (!['vendor', 'po'].includes(gate) || !Array.isArray(decisions)) {
+      return res.status(400).json({
+        success: false,
+        message: 'Expected a gate (vendor or po) and a decisions array'
+      });
+    }
+    const invalid = decisions.find((d) => !d || !d.key || !['approved', 'rejected', 'deferred'].includes(d.status));
+    if (invalid) {
+      return res.status(400).json({
+        success: false,
+        message: `Invalid decision: ${JSON.stringify(invalid)}`
+      });
+    }
+
+    const open = readApprovalRecords(gate);
+    if (!open) {
+      return res.status(404).json({
+        success: false,
+        message: `No ${gate} approvals are open`
+      });
+    }
+    const unknown = decisions.filter((d) => !Object.prototype.hasOwnProperty.call(open.records, d.key));
+    if (unknown.length > 0) {
+      return res.status(400).json({
+        success: false,
+        message: `No open ${gate} approval for: ${unknown.map((d) => d.key).join(', ')}`
+      });
+    }
+
+    const records = writeApprovalDecisions(gate, decisions);
+    if (!records) {
+      return res.status(404).json({
+        success: false,
+        message: `No ${gate} approvals are open`
+      });
+    }
+
+    const counts = countApprovalStatuses(records);
+    console.log(`Recorded ${decisions.length} ${gate} decision(s); ${counts.pending} invoice(s) still waiting`);
+
+    // Once nothing is pending the batch dialog no longer needs to be shown
+    if (counts.pending === 0) {
+      const flagName = gate === 'vendor' ? 'approval_needed.flag' : 'po_approval_needed.flag';
+      const flagPath = path.join(__dirname, 'process', 'outputs', 'excel_files', flagName);
+      if (fs.existsSync(flagPath)) {
+        try {
+          fs.unlinkSync(flagPath);
+          console.log(`Removed ${gate} approval flag - all invoices decided`);
+        } catch (error) {
+          console.error(`Error removing ${gate} approval flag:`, error);
+        }
+      }
+    }
+
+    notifyApprovalGate(gate);
+
+    res.json({
+      success: true,
+      counts,
+      message: `Recorded ${decisions.length} ${gate} decision(s)`
+    });
+  } catch (error) {
+    console.error('Error recording invoice approvals:', error);
+    res.status(500).json({
+      success: false,
+      message: 'Failed to record invoice approvals'
+    });
+  }
+});
+
+// Live count of invoices waiting at each approval gate
+app.get('/api/approval-queue', (req, res) => {
+  try {
+    const gates = {};
+    ['vendor', 'po'].forEach((gate) => {
+      const payload = readApprovalRecords(gate);
+      if (payload) {
+        gates[gate] = {
+          createdAt: payload.created_at,
+          counts: countApprovalStatuses(payload.records),
+          waiting: Object.entries(payload.records)
+            .filter(([, record]) => record.status === 'pending')
+            .map(([key]) => key)
+        };
+      }
+    });
+    res.json({ success: true, gates });
+  } catch (error) {
+    console.error('Error reading approval queue:', error);
+    res.status(500).json({
+      success: false,
+      message: 'Failed to read approval queue'
+    });
+  }
+});
+
 // Manual escape endpoint to remove PO approval flag if stuck
 app.post('/api/force-remove-po-flag', async (req, res) => {
   try {